@@ -2,10 +2,15 @@
 Batch processing API endpoints
 Upload and process multiple files at once
 """
-from fastapi import APIRouter, File, UploadFile, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, File, UploadFile, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.utils.database import get_db
 from app.models.db import Media
+from starlette.concurrency import run_in_threadpool
+from app.utils.upload_stream import save_upload
+from app.api.upload import register_upload
+from app.services.embedding_index import embedding_index
+from app.services.storage_service import delete_media_files
 from typing import List
 import os
 from uuid import uuid4
@@ -14,6 +19,7 @@ from datetime import datetime
 router = APIRouter()
 
 STORAGE_PATH = os.getenv("STORAGE_PATH", "./storage")
+MAX_BATCH_FILES = 20
 
 # Simple in-memory batch job tracking (use Redis/Celery for production)
 batch_jobs = {}
@@ -21,59 +27,40 @@ batch_jobs = {}
 @router.post("/batch/upload")
 async def batch_upload(
     files: List[UploadFile] = File(...),
-    background_tasks: BackgroundTasks = None,
     db: Session = Depends(get_db)
 ):
     """
     Upload multiple files in batch
     Returns batch job ID for tracking
     """
-    if len(files) > 20:
-        raise HTTPException(status_code=400, detail="Maximum 20 files per batch")
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_BATCH_FILES} files per batch")
     
     batch_id = str(uuid4())
     uploaded_media = []
     
     for file in files:
+        media_id = str(uuid4())
+        temp_path = os.path.join(STORAGE_PATH, f"temp_{media_id}")
+        
         try:
-            # Generate unique ID
-            media_id = str(uuid4())
+            _, file_hash = await save_upload(file, temp_path)
             
-            # Save file
-            file_extension = os.path.splitext(file.filename)[1]
-            file_path = os.path.join(STORAGE_PATH, f"{media_id}{file_extension}")
-            
-            content = await file.read()
-            with open(file_path, "wb") as f:
-                f.write(content)
-            
-            # Get file size
-            file_size = len(content)
-            
-            # Create media record (minimal metadata for now)
-            media = Media(
-                id=media_id,
-                filename=file.filename,
-                media_type="unknown",  # Will be detected during processing
-                size_bytes=file_size
-            )
-            
-            db.add(media)
-            uploaded_media.append({
-                "media_id": media_id,
-                "filename": file.filename,
-                "status": "pending"
-            })
+            # Same path as single uploads: validation, reuse of identical files, queueing
+            uploaded_media.append(await run_in_threadpool(
+                register_upload, db, media_id, temp_path, file.filename, file_hash
+            ))
             
         except Exception as e:
+            db.rollback()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             uploaded_media.append({
                 "filename": file.filename,
                 "status": "failed",
                 "error": str(e)
             })
     
-    db.commit()
-    
     # Store batch job
     batch_jobs[batch_id] = {
         "id": batch_id,
@@ -83,13 +70,10 @@ async def batch_upload(
         "status": "processing"
     }
     
-    # TODO: Add background processing task
-    # background_tasks.add_task(process_batch, batch_id, uploaded_media, db)
-    
     return {
         "batch_id": batch_id,
         "total_files": len(files),
-        "uploaded": len([f for f in uploaded_media if f.get("status") == "pending"]),
+        "uploaded": len([f for f in uploaded_media if f.get("status") != "failed"]),
         "failed": len([f for f in uploaded_media if f.get("status") == "failed"]),
         "files": uploaded_media
     }
@@ -127,12 +111,10 @@ async def delete_batch(
             media = db.query(Media).filter(Media.id == media_id).first()
             if media:
                 db.delete(media)
+            embedding_index.delete_media(media_id)
             
-            # Delete file (if exists)
-            for ext in ['.jpg', '.png', '.mp4', '.mp3', '.wav']:
-                file_path = os.path.join(STORAGE_PATH, f"{media_id}{ext}")
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+            # Delete the upload and everything generated for it (scratch, reports)
+            delete_media_files(db, media_id)
     
     db.commit()
     
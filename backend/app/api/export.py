@@ -12,13 +12,13 @@ from app.services.report_service import (
     generate_json_report,
     generate_markdown_report
 )
+from app.services.storage_service import report_path, get_cached_report, store_report
+import hashlib
+import json
 import os
-from datetime import datetime
 
 router = APIRouter()
 
-STORAGE_PATH = os.getenv("STORAGE_PATH", "./storage")
-
 @router.get("/export/{media_id}/pdf")
 async def export_pdf(
     media_id: str,
@@ -57,14 +57,20 @@ async def export_pdf(
         "height": media.height
     }
     
-    # Generate PDF
-    pdf_filename = f"report_{media_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    pdf_path = os.path.join(STORAGE_PATH, pdf_filename)
-    
-    try:
-        generate_pdf_report(media_data, analysis, chat_dicts, pdf_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
+    # Reuse the PDF generated for this exact analysis and chat history
+    fingerprint = hashlib.sha256(
+        json.dumps([media_data, analysis, chat_dicts], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+    pdf_path = get_cached_report(db, report_path(media_id, fingerprint, "pdf"))
+    
+    if pdf_path is None:
+        pdf_path = report_path(media_id, fingerprint, "pdf")
+        os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+        try:
+            generate_pdf_report(media_data, analysis, chat_dicts, pdf_path)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
+        store_report(db, media_id, pdf_path)
     
     return FileResponse(
         pdf_path,
@@ -0,0 +1,55 @@
+"""
+Job queue API endpoints
+Queue depth and per-job state for analysis jobs
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.utils.database import get_db
+from app.models.jobs import Job
+from app.services.job_queue import get_queue_stats, serialize_job, retry_job
+from typing import Optional
+
+router = APIRouter()
+
+@router.get("/jobs/stats")
+async def queue_stats(db: Session = Depends(get_db)):
+    """Queue depth per status and worker pool size"""
+    return get_queue_stats(db)
+
+@router.get("/jobs")
+async def list_jobs(
+    status: Optional[str] = None,
+    media_id: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+    db: Session = Depends(get_db)
+):
+    """List jobs, newest first"""
+    query = db.query(Job)
+    if status:
+        query = query.filter(Job.status == status)
+    if media_id:
+        query = query.filter(Job.media_id == media_id)
+    
+    jobs = query.order_by(Job.created_at.desc()).limit(limit).offset(offset).all()
+    return [serialize_job(job) for job in jobs]
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, db: Session = Depends(get_db)):
+    """Get state of a single job"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return serialize_job(job)
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_failed_job(job_id: str, db: Session = Depends(get_db)):
+    """Requeue a failed job"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "failed":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    
+    retry_job(db, job)
+    return serialize_job(job)
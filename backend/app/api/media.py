@@ -6,6 +6,7 @@ from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from app.utils.database import get_db
 from app.models.db import Media, Analysis, Report
+from app.services.storage_service import get_media_path
 import os
 
 router = APIRouter()
@@ -83,13 +84,14 @@ async def download_media(
     if not media:
         raise HTTPException(status_code=404, detail="Media not found")
     
-    # Find file (try different extensions)
-    file_path = None
-    for ext in ['.jpg', '.png', '.gif', '.mp4', '.mp3', '.wav', '.mov', '.avi']:
-        candidate = os.path.join(STORAGE_PATH, f"{media_id}{ext}")
-        if os.path.exists(candidate):
-            file_path = candidate
-            break
+    # Tracked upload path (falls back to trying common extensions)
+    file_path = get_media_path(db, media_id)
+    if not file_path:
+        for ext in ['.jpg', '.png', '.gif', '.mp4', '.mp3', '.wav', '.mov', '.avi']:
+            candidate = os.path.join(STORAGE_PATH, f"{media_id}{ext}")
+            if os.path.exists(candidate):
+                file_path = candidate
+                break
     
     if not file_path or not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
@@ -0,0 +1,246 @@
+"""
+Resumable upload API endpoints
+Create session -> PUT byte ranges (in any order, in parallel) -> finalize
+"""
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from app.utils.database import get_db
+from app.utils.file_validation import MAX_RESUMABLE_FILE_SIZE
+from app.utils.upload_stream import UPLOAD_CHUNK_SIZE, hash_file, merge_ranges, missing_ranges
+from app.models.ingest import UploadSession, UploadChunk
+from app.api.upload import register_upload
+from typing import Optional
+import os
+import re
+from uuid import uuid4
+
+router = APIRouter()
+
+STORAGE_PATH = os.getenv("STORAGE_PATH", "./storage")
+STAGING_PATH = os.path.join(STORAGE_PATH, "uploads")
+os.makedirs(STAGING_PATH, exist_ok=True)
+
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+class CreateUploadRequest(BaseModel):
+    filename: str
+    size: int
+
+class CompleteUploadRequest(BaseModel):
+    sha256: Optional[str] = None  # Optional end-to-end integrity check
+
+def get_session(db: Session, upload_id: str) -> UploadSession:
+    """Fetch an active upload session or raise 404/409"""
+    session = db.query(UploadSession).filter(UploadSession.id == upload_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session.status != "active":
+        raise HTTPException(status_code=409, detail=f"Upload session is {session.status}")
+    return session
+
+def get_received_ranges(db: Session, upload_id: str) -> list:
+    """Merged [start, end) ranges already stored for a session"""
+    chunks = db.query(UploadChunk.start, UploadChunk.end).filter(
+        UploadChunk.upload_id == upload_id
+    ).all()
+    return merge_ranges([(c.start, c.end) for c in chunks])
+
+def allocate_staging_file(path: str, size: int):
+    """Create the staging file at its final size so ranges can be written at any offset"""
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+def write_range(f, offset: int, data: bytes):
+    """Write one buffered piece of a range"""
+    f.seek(offset)
+    f.write(data)
+
+def sync_and_close(f):
+    """Make written bytes durable before the range is recorded"""
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+@router.post("/uploads")
+async def create_upload(
+    request: CreateUploadRequest,
+    db: Session = Depends(get_db)
+):
+    """Start a resumable upload session"""
+    if request.size <= 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    if request.size > MAX_RESUMABLE_FILE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large. Max size: {MAX_RESUMABLE_FILE_SIZE / 1024 / 1024}MB"
+        )
+    
+    upload_id = str(uuid4())
+    staging_path = os.path.join(STAGING_PATH, f"{upload_id}.part")
+    await run_in_threadpool(allocate_staging_file, staging_path, request.size)
+    
+    session = UploadSession(
+        id=upload_id,
+        filename=request.filename,
+        total_size=request.size,
+        staging_path=staging_path
+    )
+    db.add(session)
+    db.commit()
+    
+    return {
+        "upload_id": upload_id,
+        "size": request.size,
+        "chunk_size": UPLOAD_CHUNK_SIZE * 8,  # Suggested range size per PUT
+        "status": "active"
+    }
+
+@router.put("/uploads/{upload_id}")
+async def upload_range(
+    upload_id: str,
+    request: Request,
+    content_range: str = Header(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload one byte range, e.g. header `Content-Range: bytes 0-8388607/2147483648`
+    Ranges may arrive in any order and concurrently
+    """
+    session = get_session(db, upload_id)
+    
+    match = CONTENT_RANGE_PATTERN.match(content_range.strip())
+    if not match:
+        raise HTTPException(status_code=400, detail="Invalid Content-Range header")
+    
+    start, last, total = (int(g) for g in match.groups())
+    if total != session.total_size or start > last or last >= total:
+        raise HTTPException(status_code=416, detail="Range does not fit the upload")
+    
+    expected = last - start + 1
+    received = 0
+    buffer = bytearray()
+    
+    f = await run_in_threadpool(open, session.staging_path, "r+b")
+    try:
+        # Buffer up to one chunk, then write it off the event loop
+        async for piece in request.stream():
+            received += len(piece)
+            if received > expected:
+                raise HTTPException(status_code=400, detail="Body larger than Content-Range")
+            buffer.extend(piece)
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                await run_in_threadpool(write_range, f, start + received - len(buffer), bytes(buffer))
+                buffer.clear()
+        
+        if buffer:
+            await run_in_threadpool(write_range, f, start + received - len(buffer), bytes(buffer))
+    finally:
+        await run_in_threadpool(sync_and_close, f)
+    
+    if received != expected:
+        raise HTTPException(status_code=400, detail="Body shorter than Content-Range")
+    
+    # Record the range only after it is on disk
+    db.add(UploadChunk(upload_id=upload_id, start=start, end=last + 1))
+    db.commit()
+    
+    ranges = get_received_ranges(db, upload_id)
+    return {
+        "upload_id": upload_id,
+        "bytes_received": sum(end - begin for begin, end in ranges),
+        "size": session.total_size
+    }
+
+@router.get("/uploads/{upload_id}")
+async def get_upload_status(
+    upload_id: str,
+    db: Session = Depends(get_db)
+):
+    """Get received and missing ranges so a client can resume"""
+    session = db.query(UploadSession).filter(UploadSession.id == upload_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    
+    ranges = get_received_ranges(db, upload_id)
+    return {
+        "upload_id": upload_id,
+        "filename": session.filename,
+        "size": session.total_size,
+        "status": session.status,
+        "media_id": session.media_id,
+        "bytes_received": sum(end - start for start, end in ranges),
+        "received_ranges": [[start, end - 1] for start, end in ranges],
+        "missing_ranges": [[start, end - 1] for start, end in missing_ranges(ranges, session.total_size)]
+    }
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    request: CompleteUploadRequest = None,
+    db: Session = Depends(get_db)
+):
+    """Validate the assembled file and queue it for processing"""
+    session = get_session(db, upload_id)
+    
+    ranges = get_received_ranges(db, upload_id)
+    if missing_ranges(ranges, session.total_size):
+        raise HTTPException(status_code=409, detail="Upload is incomplete")
+    
+    # Only one /complete call may finalize a session; concurrent ones get 409
+    claimed = db.query(UploadSession).filter(
+        UploadSession.id == upload_id,
+        UploadSession.status == "active"
+    ).update({"status": "finalizing"}, synchronize_session=False)
+    db.commit()
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Upload session is already being finalized")
+    db.refresh(session)
+    
+    try:
+        file_hash = await run_in_threadpool(hash_file, session.staging_path)
+        if request and request.sha256 and request.sha256.lower() != file_hash:
+            raise HTTPException(status_code=400, detail="Checksum mismatch")
+        
+        result = await run_in_threadpool(
+            register_upload, db, upload_id, session.staging_path, session.filename, file_hash,
+            MAX_RESUMABLE_FILE_SIZE
+        )
+    except ValueError as e:
+        # Validation error - the assembled file is unusable
+        db.rollback()
+        discard_session(db, session)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        # Let the client fix the problem (e.g. resend a checksum) and retry,
+        # unless the staged file was already moved to storage
+        db.rollback()
+        session.status = "active" if os.path.exists(session.staging_path) else "aborted"
+        db.commit()
+        raise
+    
+    session.status = "finalized"
+    session.media_id = result["media_id"]
+    db.query(UploadChunk).filter(UploadChunk.upload_id == upload_id).delete()
+    db.commit()
+    
+    return result
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(
+    upload_id: str,
+    db: Session = Depends(get_db)
+):
+    """Abort a resumable upload and delete its staging file"""
+    session = get_session(db, upload_id)
+    discard_session(db, session)
+    return {"message": "Upload aborted"}
+
+def discard_session(db: Session, session: UploadSession):
+    """Mark a session aborted and remove its staged bytes"""
+    if os.path.exists(session.staging_path):
+        os.remove(session.staging_path)
+    session.status = "aborted"
+    db.query(UploadChunk).filter(UploadChunk.upload_id == session.id).delete()
+    db.commit()
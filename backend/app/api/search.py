@@ -0,0 +1,135 @@
+"""
+Search API endpoints
+Text and similarity search over CLIP embeddings of images and video keyframes
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.utils.database import get_db
+from app.models.db import Media
+from app.services.embedding_index import embedding_index
+from app.services.image_service import embed_query, query_cache_stats
+from typing import Dict, List, Optional
+import numpy as np
+
+router = APIRouter()
+
+# Rows fetched per requested result - a video contributes several keyframes
+ROWS_PER_RESULT = 5
+# Upper bound on rows fetched when videos with many matching keyframes crowd out results
+MAX_SEARCH_ROWS = 20000
+# Matching timestamps reported per video
+MAX_TIMESTAMPS = 5
+
+def group_hits(db: Session, hits: List[Dict], k: int) -> List[Dict]:
+    """Collapse keyframe hits into one result per media item, best score first"""
+    grouped: Dict[str, Dict] = {}
+    for hit in sorted(hits, key=lambda h: -h["score"]):
+        entry = grouped.setdefault(hit["media_id"], {"media_id": hit["media_id"], "score": hit["score"], "timestamps": []})
+        timestamp = hit["timestamp"]
+        if timestamp is not None and timestamp not in entry["timestamps"] and len(entry["timestamps"]) < MAX_TIMESTAMPS:
+            entry["timestamps"].append(timestamp)
+
+    # Attach metadata, skipping media deleted since they were indexed
+    media = {
+        m.id: m for m in db.query(Media).filter(Media.id.in_(list(grouped))).all()
+    } if grouped else {}
+
+    results = []
+    for media_id, entry in grouped.items():
+        if media_id not in media:
+            continue
+        entry["filename"] = media[media_id].filename
+        entry["media_type"] = media[media_id].media_type
+        results.append(entry)
+        if len(results) == k:
+            break
+    return results
+
+async def search_media(db: Session, queries: np.ndarray, k: int, exclude_media: Optional[str] = None,
+                       media_type: Optional[str] = None) -> List[Dict]:
+    """
+    Top-k media items for the query vectors
+    A media_type filter is applied inside the index scan; if keyframes of the same
+    videos fill the fetched rows, more rows are fetched until k items are found
+    """
+    allowed = None
+    if media_type:
+        allowed = {row[0] for row in db.query(Media.id).filter(Media.media_type == media_type).all()}
+        if not allowed:
+            return []
+
+    rows = k * ROWS_PER_RESULT
+    while True:
+        hits = await run_in_threadpool(embedding_index.search, queries, rows, exclude_media, allowed)
+        results = group_hits(db, [hit for query_hits in hits for hit in query_hits], k)
+        exhausted = all(len(query_hits) < rows for query_hits in hits)
+        if len(results) >= k or exhausted or rows >= MAX_SEARCH_ROWS:
+            return results
+        rows = min(rows * 4, MAX_SEARCH_ROWS)
+
+@router.get("/search")
+async def search_text(
+    q: str,
+    k: int = 10,
+    media_type: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Find images and video moments matching a text description ("a dog on a beach")
+    Returns: matching media with cosine score and matching keyframe timestamps
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    if not 1 <= k <= 100:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 100")
+
+    try:
+        # One text encode (skipped for cached queries) plus one matrix product
+        query = await run_in_threadpool(embed_query, q)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Query encoding failed: {str(e)}")
+    return {
+        "query": q,
+        "results": await search_media(db, query[None, :], k, media_type=media_type)
+    }
+
+@router.get("/search/similar")
+async def search_similar(
+    media_id: str,
+    k: int = 10,
+    timestamp: Optional[float] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Find images/videos that look like a media item (or one moment of a video)
+    Returns: matching media with cosine score and matching keyframe timestamps
+    """
+    if not 1 <= k <= 100:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 100")
+
+    media = db.query(Media).filter(Media.id == media_id).first()
+    if not media:
+        raise HTTPException(status_code=404, detail="Media not found")
+
+    vectors, timestamps = await run_in_threadpool(embedding_index.get_media_vectors, media_id)
+    if not len(vectors):
+        raise HTTPException(status_code=400, detail="Media has no embeddings yet (still processing, or not an image/video)")
+
+    if timestamp is not None and timestamps[0] is not None:
+        # Query with the keyframe closest to the requested moment
+        nearest = min(range(len(timestamps)), key=lambda i: abs(timestamps[i] - timestamp))
+        vectors = vectors[nearest:nearest + 1]
+
+    # Every keyframe is a query; all are scored in one matrix product
+    return {
+        "media_id": media_id,
+        "results": await search_media(db, vectors, k, exclude_media=media_id)
+    }
+
+@router.get("/search/stats")
+async def search_stats():
+    """Size of the embedding index, whether approximate search is active, and query cache hits"""
+    stats = await run_in_threadpool(embedding_index.stats)
+    stats["query_cache"] = query_cache_stats()
+    return stats
@@ -0,0 +1,59 @@
+"""
+System API endpoints
+Operational statistics for the processing pipeline
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.utils.database import get_db
+from app.services.dedup_service import get_dedup_stats
+from app.services.model_registry import registry
+from app.services.job_queue import get_worker_models, get_worker_stats
+from app.services.model_server import MODEL_SERVER_ADDRESS, uses_model_server, model_status as model_server_status, batching_stats as model_server_batching_stats
+from app.services.batching import get_batching_stats
+from app.services.storage_service import get_storage_usage
+from starlette.concurrency import run_in_threadpool
+
+router = APIRouter()
+
+@router.get("/stats/dedup")
+async def dedup_stats(db: Session = Depends(get_db)):
+    """Deduplication hit rate and analysis time saved"""
+    return get_dedup_stats(db)
+
+@router.get("/models")
+async def model_status(db: Session = Depends(get_db)):
+    """Resident models, their memory and load times - for this API process, each worker and the model server"""
+    status = {
+        "budget_mb": round(registry.budget_bytes / 1024 / 1024, 1) or None,
+        "api": registry.status(),
+        "workers": get_worker_models(db)
+    }
+    
+    if uses_model_server():
+        try:
+            status["model_server"] = await run_in_threadpool(model_server_status)
+        except Exception as e:
+            status["model_server"] = {"address": MODEL_SERVER_ADDRESS, "error": str(e)}
+    
+    return status
+
+@router.get("/stats/batching")
+async def batching_stats(db: Session = Depends(get_db)):
+    """Achieved micro-batch sizes and throughput per batcher (e.g. BLIP captioning)"""
+    stats = {
+        "api": get_batching_stats(),
+        "workers": get_worker_stats(db, "batching")
+    }
+    
+    if uses_model_server():
+        try:
+            stats["model_server"] = await run_in_threadpool(model_server_batching_stats)
+        except Exception as e:
+            stats["model_server"] = {"address": MODEL_SERVER_ADDRESS, "error": str(e)}
+    
+    return stats
+
+@router.get("/storage/usage")
+async def storage_usage(db: Session = Depends(get_db)):
+    """Disk usage by category (uploads, scratch, reports, index...) against the storage quota"""
+    return await run_in_threadpool(get_storage_usage, db)
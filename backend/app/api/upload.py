@@ -1,17 +1,21 @@
 """
 Upload API endpoint
 """
-from fastapi import APIRouter, File, UploadFile, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, File, UploadFile, Depends, HTTPException
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from app.utils.database import get_db
-from app.utils.file_validation import validate_file
+from app.utils.file_validation import validate_file, MAX_FILE_SIZE
 from app.models.db import Media
-from app.services.orchestrator import start_processing
+from app.services.job_queue import enqueue_job
 import os
 import shutil
 from uuid import uuid4
-from PIL import Image
-from app.utils.ffmpeg import get_audio_duration, extract_video_metadata
+from app.utils.probe import probe_media, save_probe, load_probe
+from app.utils.upload_stream import save_upload
+from app.services.dedup_service import get_analysis_key, find_reusable_media, record_content, clone_analysis
+from app.services.embedding_index import embedding_index
+from app.services.storage_service import track, remove_path
 
 router = APIRouter()
 
@@ -21,12 +25,11 @@ os.makedirs(STORAGE_PATH, exist_ok=True)
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None,
     db: Session = Depends(get_db)
 ):
     """
     Upload media file (image, audio, or video)
-    Validates file, saves to storage, creates DB record, starts processing
+    Validates file, saves to storage, creates DB record, queues processing
     """
     # Generate unique ID
     media_id = str(uuid4())
@@ -35,102 +38,114 @@ async def upload_file(
     temp_path = os.path.join(STORAGE_PATH, f"temp_{media_id}")
     
     try:
-        # Save uploaded file
-        print(f"DEBUG: Saving file {file.filename} to {temp_path}")
-        with open(temp_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        file_size_bytes = os.path.getsize(temp_path)
-        print(f"DEBUG: File saved. Size: {file_size_bytes} bytes")
+        # Copy the spooled upload to disk in chunks, hashing it on the way
+        file_size_bytes, file_hash = await save_upload(file, temp_path)
 
-        # Validate file
-        print("DEBUG: Starting validation...")
-        media_type, file_size = validate_file(temp_path)
-        print(f"DEBUG: Validation successful. Type: {media_type}")
+        # Sniffing, probing, moving and DB commits block; keep them off the event loop
+        return await run_in_threadpool(register_upload, db, media_id, temp_path, file.filename, file_hash)
         
-        # Move to permanent location
-        file_extension = os.path.splitext(file.filename)[1]
-        final_path = os.path.join(STORAGE_PATH, f"{media_id}{file_extension}")
+    except ValueError as e:
+        # Validation error
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    except Exception as e:
+        # Other errors
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+def register_upload(
+    db: Session,
+    media_id: str,
+    temp_path: str,
+    filename: str,
+    file_hash: str,
+    max_size: int = MAX_FILE_SIZE
+) -> dict:
+    """
+    Validate a fully received file, move it to storage, create the DB record
+    and queue it for processing (or reuse an identical file's analysis)
+    Raises: ValueError if the file is invalid
+    """
+    # Validate file
+    media_type, file_size = validate_file(temp_path, max_size=max_size)
+    
+    # Move to permanent location
+    file_extension = os.path.splitext(filename)[1]
+    final_path = os.path.join(STORAGE_PATH, f"{media_id}{file_extension}")
+    
+    # Look for an identical file analyzed with the same models/parameters
+    analysis_key = get_analysis_key(media_type)
+    source = find_reusable_media(db, file_hash, analysis_key)
+    
+    if source:
+        print(f"♻️ Upload {media_id} is identical to media {source.media_id}, reusing its analysis")
+        store_duplicate(temp_path, source.file_path, final_path)
+        probe = load_probe(db, source.media_id)
+    else:
+        probe = None
         shutil.move(temp_path, final_path)
-        
-        # Extract metadata based on media type
-        duration = None
-        width = None
-        height = None
-        
-        if media_type == "image":
-            img = Image.open(final_path)
-            width, height = img.size
-            img.close()
-        elif media_type == "audio":
-            duration = get_audio_duration(final_path)
-        elif media_type == "video":
-            duration, width, height = extract_video_metadata(final_path)
-        elif media_type == "text":
-            # Text files don't have duration/dimensions
-            pass
+    
+    try:
+        if probe is None:
+            # Single probe pass - persisted so analysis never re-probes the file
+            probe = probe_media(final_path, media_type)
         
         # Create media record
         media = Media(
             id=media_id,
-            filename=file.filename,
+            filename=filename,
             media_type=media_type,
             size_bytes=file_size,
-            duration=duration,
-            width=width,
-            height=height
+            duration=probe.get("duration"),
+            width=probe.get("width"),
+            height=probe.get("height")
         )
         
         db.add(media)
+        track(db, final_path, "media", media_id)
+        save_probe(db, media_id, probe)
+        record_content(db, media_id, file_hash, analysis_key, final_path, source)
+        if source:
+            # Link existing results and skip the model pipeline entirely
+            clone_analysis(db, source.media_id, media_id)
         db.commit()
-        
-        # Start background processing
-        if background_tasks:
-            background_tasks.add_task(
-                run_async_processing,
-                media_id=media_id,
-                file_path=final_path,
-                storage_dir=STORAGE_PATH
-            )
-        
-        
+    except Exception:
+        # Nothing references the stored file until the commit; don't leave it behind
+        db.rollback()
+        remove_path(final_path)
+        raise
+    
+    if source:
+        try:
+            embedding_index.copy_media(source.media_id, media_id)
+        except Exception as e:
+            print(f"Embedding copy failed for {media_id}: {e}")
         return {
             "media_id": media_id,
-            "filename": file.filename,
+            "filename": filename,
             "media_type": media_type,
-            "status": "processing"
+            "status": "completed",
+            "deduplicated_from": source.media_id
         }
-        
-    except ValueError as e:
-        # Validation error
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        raise HTTPException(status_code=400, detail=str(e))
     
-    except Exception as e:
-        # Other errors
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
-
-# Helper function for async processing
-import asyncio
-from app.utils.database import SessionLocal
-
-def run_async_processing(media_id, file_path, storage_dir):
-    """Wrapper to run async processing in background task"""
-    # Create new session for background task
-    db = SessionLocal()
+    # Queue for the worker pool
+    job = enqueue_job(db, media_id, final_path, STORAGE_PATH)
     
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    return {
+        "media_id": media_id,
+        "job_id": job.id,
+        "filename": filename,
+        "media_type": media_type,
+        "status": "processing"
+    }
+
+def store_duplicate(temp_path: str, source_path: str, final_path: str):
+    """Store a duplicate upload as a hard link to the existing file (falls back to a copy)"""
     try:
-        loop.run_until_complete(
-            start_processing(db, media_id, file_path, storage_dir)
-        )
-    except Exception as e:
-        print(f"Background processing failed: {e}")
-    finally:
-        db.close()
-        loop.close()
+        os.link(source_path, final_path)
+        os.remove(temp_path)
+    except OSError:
+        shutil.move(temp_path, final_path)
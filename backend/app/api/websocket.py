@@ -16,7 +16,7 @@ async def websocket_endpoint(websocket: WebSocket, media_id: str):
         ws = new WebSocket('ws://localhost:8000/ws/{media_id}')
         ws.onmessage = (event) => {
             const data = JSON.parse(event.data)
-            // Handle: progress, analysis_complete, error
+            // Handle: progress, transcript_partial, analysis_complete, error
         }
     """
     await manager.connect(websocket, media_id)
@@ -5,8 +5,15 @@ Multi-Modal AI Inspector Backend
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.utils.database import init_db
-from app.api import upload, ask, media, export, websocket, batch
+from app.api import upload, resumable, ask, media, export, websocket, batch, jobs, system, search
+from app.services.job_queue import worker_pool, pool_leader, relay_job_events, run_pool_supervisor
+from app.services.model_registry import registry, PRELOAD_API_MODELS
+from app.services.model_server import uses_model_server
+from app.services.storage_service import run_sweeper, sweeper_leader
+from app.utils.file_validation import MAX_FILE_SIZE
+from app.utils.upload_stream import UploadSizeLimitMiddleware, MULTIPART_OVERHEAD
 import os
+import asyncio
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -22,6 +29,17 @@ app = FastAPI(
     version="2.0.0"
 )
 
+# Reject oversized uploads before Starlette spools them to disk
+# Added before CORS so CORS wraps it and 413 responses reach the browser
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/upload": MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+        "/batch/upload": batch.MAX_BATCH_FILES * (MAX_FILE_SIZE + MULTIPART_OVERHEAD),
+    },
+    max_file_size=MAX_FILE_SIZE,
+)
+
 # CORS middleware
 cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
 app.add_middleware(
@@ -34,11 +52,35 @@ app.add_middleware(
 
 # Include routers
 app.include_router(upload.router, tags=["Upload"])
+app.include_router(resumable.router, tags=["Upload"])
 app.include_router(ask.router, tags=["Chat"])
 app.include_router(media.router, tags=["Media"])
 app.include_router(export.router, tags=["Export"])
 app.include_router(websocket.router, tags=["WebSocket"])
 app.include_router(batch.router, tags=["Batch"])
+app.include_router(jobs.router, tags=["Jobs"])
+app.include_router(system.router, tags=["System"])
+app.include_router(search.router, tags=["Search"])
+
+@app.on_event("startup")
+async def start_workers():
+    """Start the analysis worker pool (in one process only) and relay its WebSocket events"""
+    app.state.pool_supervisor = asyncio.create_task(run_pool_supervisor())
+    app.state.event_relay = asyncio.create_task(relay_job_events())
+    app.state.storage_sweeper = asyncio.create_task(run_sweeper())
+    # Warm chat models (PRELOAD_API_MODELS, e.g. llm) without delaying startup
+    if not uses_model_server():
+        asyncio.get_running_loop().run_in_executor(None, registry.preload, PRELOAD_API_MODELS)
+
+@app.on_event("shutdown")
+async def stop_workers():
+    """Stop workers - interrupted jobs are recovered by heartbeat timeout"""
+    app.state.pool_supervisor.cancel()
+    app.state.event_relay.cancel()
+    app.state.storage_sweeper.cancel()
+    worker_pool.stop()
+    pool_leader.release()
+    sweeper_leader.release()
 
 from fastapi import Request
 from fastapi.responses import JSONResponse
@@ -0,0 +1,49 @@
+"""
+Ingest tables - content hashes and upload bookkeeping
+"""
+from sqlalchemy import Column, String, Integer, Float, DateTime, JSON
+from datetime import datetime
+from app.models.db import Base
+
+class ContentIndex(Base):
+    """Maps each stored media file to its content hash and analysis fingerprint"""
+    __tablename__ = "content_index"
+
+    media_id = Column(String, primary_key=True)
+    content_hash = Column(String, index=True, nullable=False)
+    analysis_key = Column(String, index=True, nullable=False)
+    file_path = Column(String, nullable=False)
+    reused_from = Column(String, nullable=True)  # media_id whose analysis was reused
+    processing_seconds = Column(Float, nullable=True)  # Set once analysis completes
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class UploadSession(Base):
+    """Resumable upload in progress - chunks are appended to a staging file"""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True)
+    filename = Column(String, nullable=False)
+    total_size = Column(Integer, nullable=False)
+    staging_path = Column(String, nullable=False)
+    status = Column(String, default="active")  # active, finalizing, finalized, aborted
+    media_id = Column(String, nullable=True)  # Set on finalize
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UploadChunk(Base):
+    """Byte range durably written to an upload session's staging file"""
+    __tablename__ = "upload_chunks"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    upload_id = Column(String, index=True, nullable=False)
+    start = Column(Integer, nullable=False)  # Inclusive
+    end = Column(Integer, nullable=False)  # Exclusive
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class MediaProbe(Base):
+    """Metadata extracted once at upload and shared by the analysis pipeline"""
+    __tablename__ = "media_probes"
+
+    media_id = Column(String, primary_key=True)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
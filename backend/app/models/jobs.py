@@ -0,0 +1,69 @@
+"""
+Job queue tables - durable analysis jobs and cross-process progress events
+"""
+from sqlalchemy import Column, String, Integer, DateTime, Text, JSON
+from datetime import datetime
+from app.models.db import Base
+
+class Job(Base):
+    """Analysis job pulled by the worker pool"""
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)
+    media_id = Column(String, index=True, nullable=False)
+    file_path = Column(String, nullable=False)
+    storage_dir = Column(String, nullable=False)
+    status = Column(String, index=True, default="queued")  # queued, running, completed, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    worker_id = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class JobEvent(Base):
+    """WebSocket message emitted by a worker process, relayed by the API process"""
+    __tablename__ = "job_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    media_id = Column(String, index=True, nullable=False)
+    message = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class MediaWatcher(Base):
+    """Media with WebSocket clients connected to an API process, so workers know whether to stream"""
+    __tablename__ = "media_watchers"
+
+    server_id = Column(String, primary_key=True)  # hostname:pid of the API process
+    media_id = Column(String, primary_key=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class StageCheckpoint(Base):
+    """Output of a completed analysis stage, so a retried job can resume"""
+    __tablename__ = "stage_checkpoints"
+
+    media_id = Column(String, primary_key=True)
+    stage = Column(String, primary_key=True)
+    analysis_key = Column(String, nullable=False)  # Checkpoints from other model versions are ignored
+    payload = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class WorkerModel(Base):
+    """Model resident in a worker process, reported by its model registry"""
+    __tablename__ = "worker_models"
+
+    worker_id = Column(String, primary_key=True)
+    name = Column(String, primary_key=True)
+    status = Column(JSON)  # ModelEntry.to_dict()
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class WorkerStat(Base):
+    """Named stats snapshot from a worker process (e.g. micro-batching throughput)"""
+    __tablename__ = "worker_stats"
+
+    worker_id = Column(String, primary_key=True)
+    name = Column(String, primary_key=True)
+    payload = Column(JSON)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,17 @@
+"""
+Storage tables - files and directories on disk owned by the storage manager
+"""
+from sqlalchemy import Column, String, Integer, DateTime
+from datetime import datetime
+from app.models.db import Base
+
+class StorageArtifact(Base):
+    """A file or directory created for a media item (upload, scratch dir, generated report)"""
+    __tablename__ = "storage_artifacts"
+
+    path = Column(String, primary_key=True)
+    media_id = Column(String, index=True, nullable=True)
+    category = Column(String, index=True, nullable=False)  # media, scratch, report
+    size_bytes = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)  # LRU eviction order
@@ -1,90 +1,204 @@
 """
 Audio analysis service using Whisper
+Audio is decoded once to 16 kHz samples shared by voice activity detection and
+Whisper; only detected speech is transcribed, and long recordings are split at
+pauses and transcribed in parallel processes
 """
-import whisper
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+import time
 import os
-from typing import Dict, List
-from transformers import pipeline
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import numpy as np
+from app.services.model_registry import registry
+from app.services.model_server import remote_op, uses_model_server
+from app.utils.audio import SAMPLE_RATE, detect_speech, join_speech, plan_chunks, stitch_transcripts, to_original_time
+from app.utils.ffmpeg import decode_audio, load_pcm
 
-# Global model instance (lazy loaded)
-_whisper_model = None
-_sentiment_analyzer = None
+# Audio longer than this is transcribed in chunks by TRANSCRIBE_WORKERS processes
+LONG_AUDIO_SEC = float(os.getenv("LONG_AUDIO_SEC", "600"))
+# Target chunk length; each cut is moved to the quietest point within AUDIO_CHUNK_SEARCH_SEC
+AUDIO_CHUNK_SEC = float(os.getenv("AUDIO_CHUNK_SEC", "300"))
+AUDIO_CHUNK_SEARCH_SEC = float(os.getenv("AUDIO_CHUNK_SEARCH_SEC", "15"))
+# Length of the windows transcripts are streamed in (and of the first parallel chunk)
+STREAM_WINDOW_SEC = float(os.getenv("TRANSCRIPT_STREAM_WINDOW_SEC", "25"))
+# Each transcription process holds its own Whisper model; 1 = never chunk
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Voice activity pre-pass: silence and music are not sent to Whisper
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() == "true"
+# Decoded samples (raw float32) in a job's scratch directory
+PCM_CACHE_NAME = "audio.f32"
 
 def get_whisper_model():
-    """Lazy load Whisper model"""
-    global _whisper_model
-    if _whisper_model is None:
-        model_size = os.getenv("WHISPER_MODEL", "small")
-        print(f"Loading Whisper model: {model_size}")
-        _whisper_model = whisper.load_model(model_size)
-    return _whisper_model
+    """Whisper model from the shared registry (loaded on first use)"""
+    return registry.get("whisper")
 
-def get_sentiment_analyzer():
-    """Lazy load sentiment analyzer"""
-    global _sentiment_analyzer
-    if _sentiment_analyzer is None:
-        print("Loading sentiment analyzer")
-        _sentiment_analyzer = pipeline(
-            "sentiment-analysis",
-            model="distilbert-base-uncased-finetuned-sst-2-english"
-        )
-    return _sentiment_analyzer
+def decode_pcm(media_path: str, work_dir: str) -> Dict:
+    """
+    Decode a file's audio once into a PCM cache file in work_dir
+    VAD and transcription memory-map it instead of decoding the file again
+    Returns: dict with path (of the cache file) and duration
+    """
+    path = os.path.join(work_dir, PCM_CACHE_NAME)
+    samples = decode_audio(media_path, SAMPLE_RATE, cache_path=path)
+    return {"path": path, "duration": round(len(samples) / SAMPLE_RATE, 2)}
+
+def load_samples(audio: Union[str, np.ndarray]) -> np.ndarray:
+    """16 kHz samples given as an array, a PCM cache file (see decode_pcm) or any media file"""
+    if isinstance(audio, np.ndarray):
+        return audio
+    if audio.endswith(PCM_CACHE_NAME):
+        return load_pcm(audio)
+    return decode_audio(audio, SAMPLE_RATE)
 
-def analyze_audio(audio_path: str) -> Dict:
+def detect_voice_activity(audio: Union[str, np.ndarray]) -> Dict:
     """
-    Transcribe audio using Whisper and analyze sentiment
-    Returns: dict with transcript, segments, language, sentiment
+    Speech regions of audio (samples or a path, see load_samples)
+    Returns: dict with intervals ([start, end] seconds), speech_seconds, speech_ratio, duration
     """
-    model = get_whisper_model()
+    speech = detect_speech(load_samples(audio))
+    print(f"🗣️ {speech['speech_seconds']}s of speech in {len(speech['intervals'])} regions (ratio {speech['speech_ratio']})")
+    return speech
+
+@remote_op("transcribe")
+def transcribe_audio(audio: Union[str, np.ndarray], speech_intervals: Optional[List[List[float]]] = None,
+                     on_segments: Optional[Callable[[List[Dict]], None]] = None,
+                     watched: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Transcribe audio (samples or a path, see load_samples) using Whisper
+    With speech_intervals (from detect_voice_activity) only those regions are
+    transcribed, and an empty list skips Whisper entirely
+    on_segments receives each batch of segments as soon as it is transcribed
+    (see transcribe_samples for watched)
+    Returns: dict with transcript, segments, language, word_count
+    """
+    if speech_intervals is not None and not speech_intervals:
+        print("🔇 No speech detected, skipping transcription")
+        return stitch_transcripts([])
     
-    # Transcribe
-    result = model.transcribe(audio_path, verbose=False)
+    # Whisper accepts the 16 kHz samples directly (a writable copy of a mapped cache)
+    samples = load_samples(audio)
+    if speech_intervals is None:
+        return transcribe_samples(np.array(samples, dtype=np.float32), on_segments, watched)
     
-    text = result["text"]
-    segments = result.get("segments", [])
-    language = result.get("language", "unknown")
+    # Speech regions are joined and transcribed together, then mapped back to the recording
+    joined, timeline = join_speech(samples, speech_intervals)
     
-    # Analyze sentiment on full text
-    sentiment = analyze_sentiment(text)
+    def remap(segments: List[Dict]) -> List[Dict]:
+        return [
+            dict(seg, start=round(to_original_time(seg["start"], timeline), 2),
+                 end=round(to_original_time(seg["end"], timeline), 2))
+            for seg in segments
+        ]
     
-    # Format segments
-    formatted_segments = [
-        {
-            "text": seg["text"],
-            "start": seg["start"],
-            "end": seg["end"]
-        }
-        for seg in segments
-    ]
+    on_joined_segments = (lambda segments: on_segments(remap(segments))) if on_segments else None
+    result = transcribe_samples(joined, on_joined_segments, watched)
+    result["segments"] = remap(result["segments"])
+    return result
+
+def stream_transcription(audio: Union[str, np.ndarray], speech_intervals: Optional[List[List[float]]],
+                         on_segments: Callable[[List[Dict]], None],
+                         watched: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    transcribe_audio reporting segments while it runs
+    The model server only returns whole results, so there they arrive as one batch
+    """
+    if uses_model_server():
+        result = transcribe_audio(audio, speech_intervals)
+        on_segments(result["segments"])
+        return result
+    return transcribe_audio(audio, speech_intervals, on_segments, watched)
+
+def transcribe_samples(audio: np.ndarray, on_segments: Optional[Callable[[List[Dict]], None]] = None,
+                       watched: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Transcribe 16 kHz samples: in parallel chunks when long, otherwise in one pass
+    While a client is watching (watched() is asked before each window, None = always)
+    the audio is transcribed in short consecutive windows so on_segments gets text
+    early; once nobody watches, the rest is transcribed in one pass
+    """
+    streaming = on_segments is not None and (watched is None or watched())
+    if len(audio) / SAMPLE_RATE > LONG_AUDIO_SEC and TRANSCRIBE_WORKERS > 1:
+        return transcribe_chunked(audio, on_segments, streaming)
     
-    return {
-        "transcript": text,
-        "segments": formatted_segments,
-        "language": language,
-        "sentiment": sentiment,
-        "word_count": len(text.split())
-    }
+    model = get_whisper_model()
+    results = []
+    previous_text = ""
+    done = 0
+    # Windows cut at pauses; each is prompted with the previous text, as Whisper
+    # conditions on it internally
+    windows = plan_chunks(audio, STREAM_WINDOW_SEC, STREAM_WINDOW_SEC / 5) if streaming else []
+    for start, end in windows:
+        if start > 0 and watched is not None and not watched():
+            break
+        result = model.transcribe(audio[start:end], verbose=False, initial_prompt=previous_text[-200:] or None)
+        results.append((start / SAMPLE_RATE, result))
+        previous_text += result["text"]
+        emit_segments(on_segments, results[-1])
+        done = end
+    
+    if done < len(audio) or not results:
+        result = model.transcribe(audio[done:], verbose=False, initial_prompt=previous_text[-200:] or None)
+        results.append((done / SAMPLE_RATE, result))
+        emit_segments(on_segments, results[-1])
+    return stitch_transcripts(results)
 
-def analyze_sentiment(text: str) -> Dict:
-    """Analyze sentiment of text"""
-    if not text.strip():
-        return {"label": "neutral", "score": 0.0}
+def transcribe_chunked(audio: np.ndarray, on_segments: Optional[Callable[[List[Dict]], None]] = None,
+                       head_chunk: bool = False) -> Dict:
+    """
+    Split audio at pauses into ~AUDIO_CHUNK_SEC chunks, transcribe them in a pool of
+    TRANSCRIBE_WORKERS processes and stitch the segments back on the global timeline
+    Chunks are reported to on_segments in order as they finish; with head_chunk (a
+    client is watching) a short first chunk gets the first text out quickly
+    """
+    chunks = plan_chunks(audio, AUDIO_CHUNK_SEC, AUDIO_CHUNK_SEARCH_SEC,
+                         first_chunk_seconds=STREAM_WINDOW_SEC if head_chunk else 0)
+    workers = min(TRANSCRIBE_WORKERS, len(chunks))
+    # CPU threads are divided between the processes instead of oversubscribing
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"🎙️ Transcribing {len(audio) / SAMPLE_RATE:.0f}s of audio as {len(chunks)} chunks on {workers} processes")
     
-    analyzer = get_sentiment_analyzer()
+    started = time.time()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_transcribe_worker,
+        initargs=(threads, os.getpid())
+    ) as pool:
+        futures = [pool.submit(_transcribe_chunk, audio[start:end]) for start, end in chunks]
+        results = []
+        for (start, _), future in zip(chunks, futures):
+            results.append((start / SAMPLE_RATE, future.result()))
+            emit_segments(on_segments, results[-1])
     
-    # Truncate if too long (512 tokens max for most models)
-    words = text.split()[:100]
-    truncated_text = " ".join(words)
+    print(f"✅ Chunked transcription finished in {time.time() - started:.1f}s")
+    return stitch_transcripts(results)
+
+def emit_segments(on_segments: Optional[Callable[[List[Dict]], None]], chunk_result: Tuple[float, Dict]):
+    """Report one chunk's segments on the global timeline"""
+    if on_segments is None:
+        return
+    segments = stitch_transcripts([chunk_result])["segments"]
+    if segments:
+        on_segments(segments)
+
+def _init_transcribe_worker(threads: int, parent_pid: int):
+    """Transcription process setup: limit torch threads, exit if the parent dies, load Whisper"""
+    import torch
+    torch.set_num_threads(threads)
     
-    try:
-        result = analyzer(truncated_text)[0]
-        return {
-            "label": result["label"].lower(),
-            "score": round(result["score"], 3)
-        }
-    except Exception as e:
-        print(f"Sentiment analysis failed: {e}")
-        return {"label": "unknown", "score": 0.0}
+    def watch_parent():
+        while os.getppid() == parent_pid:
+            time.sleep(5)
+        os._exit(1)
+    
+    threading.Thread(target=watch_parent, daemon=True).start()
+    get_whisper_model()
+
+def _transcribe_chunk(audio: np.ndarray) -> Dict:
+    """Transcribe one chunk in a pool process (timestamps relative to the chunk)"""
+    return get_whisper_model().transcribe(audio, verbose=False)
 
 def extract_keywords(text: str, top_n: int = 10) -> List[str]:
     """Simple keyword extraction from transcript"""
@@ -0,0 +1,131 @@
+"""
+Dynamic micro-batching
+Collects items submitted from concurrent jobs/threads for a few milliseconds and
+runs them through the model as one batch, then hands each caller its own result
+"""
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+import threading
+import queue
+import time
+
+class MicroBatcher:
+    """
+    Batches calls to fn(items) -> results (same length, same order)
+    A batch is dispatched when max_batch_size items are waiting or max_wait_ms
+    has passed since the first of them arrived
+    """
+
+    def __init__(self, name: str, fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait_ms: float = 10):
+        self.name = name
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.pending: "queue.Queue" = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+        # Stats
+        self.batches = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.largest_batch = 0
+        self.batch_sizes: Dict[int, int] = {}
+
+        _batchers[name] = self
+
+    def submit(self, item: Any) -> Future:
+        """Queue an item; the Future resolves to its result"""
+        self._ensure_thread()
+        future = Future()
+        self.pending.put((item, future, time.perf_counter()))
+        return future
+
+    def run(self, item: Any) -> Any:
+        """Process one item (blocking), batched with whatever else is in flight"""
+        return self.submit(item).result()
+
+    def map(self, items: List[Any]) -> List[Any]:
+        """Process several items (blocking); they fill batches together"""
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def stats(self) -> Dict:
+        """Achieved batch sizes and throughput, for tuning the batch window"""
+        with self.lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+                "largest_batch": self.largest_batch,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "avg_wait_ms": round(self.wait_seconds / self.items * 1000, 1) if self.items else 0,
+                "items_per_second": round(self.items / self.busy_seconds, 2) if self.busy_seconds else 0
+            }
+
+    def _ensure_thread(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._loop, name=f"batcher-{self.name}", daemon=True)
+                self.thread.start()
+
+    def _collect(self) -> List:
+        """Block for the first item, then gather more until the batch is full or the window closes"""
+        batch = [self.pending.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                # Window closed - still take anything already queued
+                try:
+                    batch.append(self.pending.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _, _ in batch]
+            started = time.perf_counter()
+
+            try:
+                results = self.fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                print(f"Batch {self.name} ({len(items)} items) failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                self._record(batch, started)
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def _record(self, batch: List, started: float):
+        with self.lock:
+            size = len(batch)
+            self.batches += 1
+            self.items += size
+            self.busy_seconds += time.perf_counter() - started
+            self.wait_seconds += sum(started - queued_at for _, _, queued_at in batch)
+            self.largest_batch = max(self.largest_batch, size)
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+
+_batchers: Dict[str, MicroBatcher] = {}
+
+def get_batching_stats() -> Dict[str, Dict]:
+    """Stats for every batcher in this process"""
+    return {name: batcher.stats() for name, batcher in _batchers.items()}
@@ -0,0 +1,155 @@
+"""
+Content-addressed deduplication service
+Reuses prior analysis results when an identical file is uploaded again
+"""
+from app.models.db import Analysis, TranscriptSegment, Report
+from app.models.ingest import ContentIndex
+from app.services import tagging_service
+from app.utils import keyframes
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
+import hashlib
+import json
+import os
+
+# Bump when analysis logic changes in a way that invalidates stored results
+ANALYSIS_VERSION = "6"
+
+def get_analysis_params() -> Dict:
+    """Settings that affect analysis output, read from the services that use them"""
+    # Imported here so the content index can be used without loading torch/ffmpeg
+    from app.services import audio_service, image_service, object_detection_service, video_service
+
+    return {
+        "video_max_frames": video_service.MAX_ANALYZED_FRAMES,
+        "video_scanned_frames": video_service.MAX_SCANNED_FRAMES,
+        "scene_change_threshold": keyframes.SCENE_CHANGE_THRESHOLD,
+        "keyframe_duplicate_distance": keyframes.DUPLICATE_HASH_DISTANCE,
+        "detection_confidence": object_detection_service.DETECTION_CONFIDENCE,
+        "caption_max_length": image_service.CAPTION_MAX_LENGTH,
+        "tag_prompt": tagging_service.TAG_PROMPT,
+        "tag_top_k": tagging_service.TAG_TOP_K,
+        "tag_min_score": tagging_service.TAG_MIN_SCORE,
+        "voice_activity_detection": audio_service.VAD_ENABLED,
+    }
+
+def get_model_versions() -> Dict[str, str]:
+    """Models that contribute to an analysis payload"""
+    return {
+        "blip": os.getenv("BLIP_MODEL", "Salesforce/blip-image-captioning-base"),
+        "clip": "openai/clip-vit-base-patch32",
+        "whisper": os.getenv("WHISPER_MODEL", "small"),
+        "yolo": os.getenv("YOLO_MODEL", "yolov8n.pt"),
+        "sentiment": "distilbert-base-uncased-finetuned-sst-2-english",
+        "llm": os.getenv("LLM_MODEL", "facebook/opt-1.3b"),
+    }
+
+def get_analysis_key(media_type: str) -> str:
+    """Fingerprint of everything besides file content that determines the analysis result"""
+    fingerprint = {
+        "version": ANALYSIS_VERSION,
+        "media_type": media_type,
+        "models": get_model_versions(),
+        "params": get_analysis_params(),
+        "tag_vocabulary": tagging_service.vocabulary_digest(),
+    }
+    encoded = json.dumps(fingerprint, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+def find_reusable_media(db: Session, content_hash: str, analysis_key: str) -> Optional[ContentIndex]:
+    """Find a previously analyzed file with identical content and analysis fingerprint"""
+    candidates = db.query(ContentIndex).filter(
+        ContentIndex.content_hash == content_hash,
+        ContentIndex.analysis_key == analysis_key,
+        ContentIndex.processing_seconds.isnot(None)
+    ).order_by(ContentIndex.created_at.desc()).all()
+
+    for candidate in candidates:
+        # Only reuse sources whose file and successful analysis still exist
+        if not os.path.exists(candidate.file_path):
+            continue
+        has_analysis = db.query(Analysis).filter(
+            Analysis.media_id == candidate.media_id,
+            Analysis.stage != "error"
+        ).first()
+        if has_analysis:
+            return candidate
+
+    return None
+
+def record_content(db: Session, media_id: str, content_hash: str, analysis_key: str,
+                   file_path: str, source: Optional[ContentIndex] = None) -> ContentIndex:
+    """Register a stored file in the content index"""
+    entry = ContentIndex(
+        media_id=media_id,
+        content_hash=content_hash,
+        analysis_key=analysis_key,
+        file_path=file_path,
+        reused_from=source.media_id if source else None,
+        # Reused entries inherit the source's cost so they can serve as sources themselves
+        processing_seconds=source.processing_seconds if source else None
+    )
+    db.add(entry)
+    return entry
+
+def clone_analysis(db: Session, source_media_id: str, target_media_id: str):
+    """Link a new media record to the results of an identical, already analyzed file"""
+    source_analysis = db.query(Analysis).filter(
+        Analysis.media_id == source_media_id,
+        Analysis.stage != "error"
+    ).order_by(Analysis.created_at.desc()).first()
+
+    if source_analysis:
+        db.add(Analysis(
+            media_id=target_media_id,
+            stage=source_analysis.stage,
+            payload=source_analysis.payload
+        ))
+
+    source_report = db.query(Report).filter(
+        Report.media_id == source_media_id
+    ).order_by(Report.created_at.desc()).first()
+
+    if source_report:
+        db.add(Report(media_id=target_media_id, summary=source_report.summary))
+
+    segments = db.query(TranscriptSegment).filter(
+        TranscriptSegment.media_id == source_media_id
+    ).order_by(TranscriptSegment.start_sec).all()
+
+    for seg in segments:
+        db.add(TranscriptSegment(
+            media_id=target_media_id,
+            text=seg.text,
+            start_sec=seg.start_sec,
+            end_sec=seg.end_sec,
+            speaker=seg.speaker
+        ))
+
+def mark_processed(db: Session, media_id: str, processing_seconds: float):
+    """Record how long the model pipeline took, making the file reusable"""
+    entry = db.query(ContentIndex).filter(ContentIndex.media_id == media_id).first()
+    if entry:
+        entry.processing_seconds = processing_seconds
+
+def get_dedup_stats(db: Session) -> Dict:
+    """Hit rate and processing time saved by deduplication"""
+    total = db.query(func.count(ContentIndex.media_id)).scalar() or 0
+    hits = db.query(ContentIndex).filter(ContentIndex.reused_from.isnot(None)).all()
+
+    # Time saved is what the source file originally took to analyze
+    source_ids = {hit.reused_from for hit in hits}
+    source_seconds = dict(
+        db.query(ContentIndex.media_id, ContentIndex.processing_seconds)
+        .filter(ContentIndex.media_id.in_(source_ids)).all()
+    ) if source_ids else {}
+    saved_seconds = sum(source_seconds.get(hit.reused_from) or 0.0 for hit in hits)
+
+    return {
+        "uploads": total,
+        "hits": len(hits),
+        "misses": total - len(hits),
+        "hit_rate": round(len(hits) / total, 3) if total else 0.0,
+        "processing_seconds_saved": round(saved_seconds, 1)
+    }
@@ -0,0 +1,493 @@
+"""
+CLIP embedding index
+Unit-normalized embeddings of analyzed images and video keyframes, stored as an
+append-only float16 matrix (memory-mapped for search) plus a JSON-lines ID map.
+Search is a chunked brute-force matrix product; past EMBEDDING_IVF_MIN_VECTORS
+an inverted-file (IVF) index, trained in the background, narrows it to the
+nearest clusters. Files are only ever appended to; compaction writes a new
+generation of them and switches to it with an atomic rename
+"""
+from app.utils.file_lock import file_lock, LeaderLock
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+import threading
+import shutil
+import json
+import re
+import os
+
+STORAGE_PATH = os.getenv("STORAGE_PATH", "./storage")
+CLIP_MODEL = "openai/clip-vit-base-patch32"
+
+# Rows scored per matrix product (bounds memory for the float32 copy of a chunk)
+SEARCH_CHUNK_ROWS = 65536
+
+# Approximate search kicks in at this many vectors (0 = always brute force)
+IVF_MIN_VECTORS = int(os.getenv("EMBEDDING_IVF_MIN_VECTORS", "200000"))
+IVF_NPROBE = int(os.getenv("EMBEDDING_IVF_NPROBE", "8"))
+# Retrain once vectors added since training exceed this share of the trained set
+IVF_RETRAIN_RATIO = 0.2
+# Deleted rows are compacted away once they make up this share of the index
+COMPACT_DELETED_RATIO = 0.25
+COMPACT_MIN_DELETED = 1000
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Unit-normalize rows so dot products are cosine similarities"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k highest scores per row, best first"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+def spherical_kmeans(vectors: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity; returns unit centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_clusters(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = np.linalg.norm(sums, axis=1) == 0
+        # Re-seed empty clusters with random vectors
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+def assign_clusters(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid per row, in chunks"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SEARCH_CHUNK_ROWS):
+        chunk = np.asarray(vectors[start:start + SEARCH_CHUNK_ROWS], dtype=np.float32)
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+class EmbeddingIndex:
+    """
+    On-disk index shared by all processes: workers append, the API searches
+    Files of a generation: vectors.f16 (rows x dim float16), ids.jsonl (one entry
+    per row), deleted.jsonl (removed row numbers), ivf.npz (optional clustering).
+    Generation 0 lives in the index directory, later ones in gen-N/; CURRENT names
+    the live one. Processes that still map an older generation keep reading it
+    until their next refresh
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.current_path = os.path.join(directory, "CURRENT")
+        self.lock_path = os.path.join(directory, ".lock")
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.RLock()
+        self.dim = None
+        self.generation = None
+        self._rebuild: Optional[threading.Thread] = None
+        self._set_generation(self._read_generation())
+
+    def _set_generation(self, generation: int):
+        """Point at a generation's files and forget everything read from the previous one"""
+        self.generation = generation
+        gen_dir = self.generation_dir(generation)
+        self.vectors_path = os.path.join(gen_dir, "vectors.f16")
+        self.ids_path = os.path.join(gen_dir, "ids.jsonl")
+        self.deleted_path = os.path.join(gen_dir, "deleted.jsonl")
+        self.ivf_path = os.path.join(gen_dir, "ivf.npz")
+        self.ids: List[Dict] = []
+        self.rows_by_media: Dict[str, List[int]] = {}
+        self.deleted: set = set()
+        self._ids_offset = 0
+        self._deleted_offset = 0
+        self._matrix = None
+        self._ivf = None
+
+    def generation_dir(self, generation: int) -> str:
+        return self.directory if generation == 0 else os.path.join(self.directory, f"gen-{generation}")
+
+    def _read_generation(self) -> int:
+        try:
+            with open(self.current_path) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    # --- Writing (serialized across processes by the file lock, taken before self.lock) ---
+
+    def add(self, media_id: str, vectors: np.ndarray, timestamps: Optional[List[Optional[float]]] = None):
+        """Append embeddings for a media item (one per image/keyframe)"""
+        vectors = normalize(vectors).astype(np.float16)
+        if timestamps is None:
+            timestamps = [None] * len(vectors)
+        if len(timestamps) != len(vectors):
+            raise ValueError("One timestamp per vector is required")
+
+        with file_lock(self.lock_path):
+            with self.lock:
+                self._refresh()
+                rows = 0 if self._matrix is None else self._matrix.shape[0]
+            if rows > len(self.ids):
+                # A crashed writer appended vectors without their ID entries. The file may be
+                # mapped by other processes, so it is rewritten as a new generation, not truncated
+                self._compact_locked()
+
+            with self.lock:
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                    with open(self.meta_path, "w") as f:
+                        json.dump({"dim": self.dim, "model": CLIP_MODEL}, f)
+                elif vectors.shape[1] != self.dim:
+                    raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {vectors.shape[1]}")
+
+                with open(self.vectors_path, "ab") as f:
+                    f.write(vectors.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                with open(self.ids_path, "a") as f:
+                    for timestamp in timestamps:
+                        f.write(json.dumps({"media_id": media_id, "timestamp": timestamp}) + "\n")
+
+                self._refresh()
+
+    def delete_media(self, media_id: str) -> int:
+        """Exclude a media item's embeddings from search; returns rows removed"""
+        with file_lock(self.lock_path):
+            with self.lock:
+                self._refresh()
+                rows = self._media_rows(media_id)
+                if rows:
+                    with open(self.deleted_path, "a") as f:
+                        for row in rows:
+                            f.write(f"{row}\n")
+                    self._refresh()
+                deleted, count = len(self.deleted), self.count
+
+            if deleted >= COMPACT_MIN_DELETED and deleted > COMPACT_DELETED_RATIO * count:
+                self._compact_locked()
+            return len(rows)
+
+    def copy_media(self, source_media_id: str, media_id: str) -> int:
+        """Index a duplicate upload under its own ID using the source's embeddings"""
+        vectors, timestamps = self.get_media_vectors(source_media_id)
+        if len(vectors):
+            self.add(media_id, vectors, timestamps)
+        return len(vectors)
+
+    def compact(self) -> int:
+        """Rewrite the index without deleted rows; returns rows dropped"""
+        with file_lock(self.lock_path):
+            return self._compact_locked()
+
+    def _compact_locked(self) -> int:
+        """
+        Copy live rows into the next generation and switch CURRENT to it (file lock held)
+        Searches continue on the current mapping meanwhile; the generation before the
+        previous one is removed, as no process can still be reading it
+        """
+        with self.lock:
+            self._refresh()
+            generation = self.generation
+            matrix = self._matrix
+            count = self.count
+            ids = self.ids[:count]
+            keep = np.array([row for row in range(count) if row not in self.deleted], dtype=np.int64)
+
+        new_generation = generation + 1
+        gen_dir = self.generation_dir(new_generation)
+        shutil.rmtree(gen_dir, ignore_errors=True)
+        os.makedirs(gen_dir)
+
+        with open(os.path.join(gen_dir, "vectors.f16"), "wb") as f:
+            for start in range(0, len(keep), SEARCH_CHUNK_ROWS):
+                f.write(np.asarray(matrix[keep[start:start + SEARCH_CHUNK_ROWS]], dtype=np.float16).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(os.path.join(gen_dir, "ids.jsonl"), "w") as f:
+            for row in keep.tolist():
+                f.write(json.dumps(ids[row]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        temp_path = self.current_path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(str(new_generation))
+        os.replace(temp_path, self.current_path)
+        self._remove_generation(generation - 1)
+
+        with self.lock:
+            self._refresh()
+        dropped = count - len(keep)
+        print(f"🗜️ Compacted embedding index: {len(keep)} rows kept, {dropped} dropped (generation {new_generation})")
+        return dropped
+
+    def _remove_generation(self, generation: int):
+        if generation < 0:
+            return
+        if generation > 0:
+            shutil.rmtree(self.generation_dir(generation), ignore_errors=True)
+            return
+        for name in ("vectors.f16", "ids.jsonl", "deleted.jsonl", "ivf.npz"):
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # --- Reading ---
+
+    def get_media_vectors(self, media_id: str) -> Tuple[np.ndarray, List[Optional[float]]]:
+        """Stored embeddings (float32) and timestamps of one media item"""
+        with self.lock:
+            self._refresh()
+            rows = self._media_rows(media_id)
+            if not rows:
+                return np.zeros((0, self.dim or 0), dtype=np.float32), []
+            vectors = np.asarray(self._matrix[rows], dtype=np.float32)
+            return vectors, [self.ids[row]["timestamp"] for row in rows]
+
+    def search(self, queries: np.ndarray, k: int = 10, exclude_media: Optional[str] = None,
+               allowed_media: Optional[Set[str]] = None) -> List[List[Dict]]:
+        """
+        Top-k rows by cosine similarity for each query vector
+        allowed_media restricts hits to those media IDs inside the scan, so filtering
+        never leaves fewer than k hits
+        Returns: per query, [{"media_id", "timestamp", "score"}] best first
+        """
+        queries = normalize(queries)
+
+        with self.lock:
+            self._refresh()
+            count = self.count
+            if count == 0:
+                return [[] for _ in queries]
+
+            # Deleted/excluded rows never score
+            excluded = np.zeros(count, dtype=bool)
+            excluded[[row for row in self.deleted if row < count]] = True
+            if exclude_media:
+                excluded[self._media_rows(exclude_media)] = True
+            if allowed_media is not None:
+                allowed = np.zeros(count, dtype=bool)
+                for media_id in allowed_media:
+                    allowed[self._media_rows(media_id)] = True
+                excluded |= ~allowed
+
+            if IVF_MIN_VECTORS and count >= IVF_MIN_VECTORS:
+                hits = self._search_ivf(queries, k, excluded)
+            else:
+                hits = self._search_brute_force(queries, k, excluded)
+
+            return [
+                [
+                    {**self.ids[row], "score": round(float(score), 4)}
+                    for row, score in zip(rows.tolist(), scores.tolist())
+                    if np.isfinite(score)
+                ]
+                for rows, scores in hits
+            ]
+
+    @property
+    def count(self) -> int:
+        """Rows with both a vector and an ID entry"""
+        rows = 0 if self._matrix is None else self._matrix.shape[0]
+        return min(rows, len(self.ids))
+
+    def stats(self) -> Dict:
+        with self.lock:
+            self._refresh()
+            self._load_ivf()
+            return {
+                "vectors": self.count,
+                "deleted": len(self.deleted),
+                "dim": self.dim,
+                "model": CLIP_MODEL,
+                "size_mb": round(os.path.getsize(self.vectors_path) / 1024 / 1024, 1) if os.path.exists(self.vectors_path) else 0,
+                "approximate": bool(IVF_MIN_VECTORS and self.count >= IVF_MIN_VECTORS and self._ivf),
+                "ivf_clusters": len(self._ivf["centroids"]) if self._ivf else None,
+                "ivf_rebuilding": self.rebuilding,
+                "generation": self.generation
+            }
+
+    # --- Approximate search ---
+
+    def build_ivf(self) -> int:
+        """
+        Cluster current vectors (~sqrt(n) clusters) for approximate search; returns clusters
+        Trains on a snapshot without holding the index lock, so searches and adds continue
+        """
+        with self.lock:
+            self._refresh()
+            count = self.count
+            matrix = self._matrix
+            ivf_path = self.ivf_path
+        clusters = int(min(4096, max(16, np.sqrt(count))))
+        if count < clusters:
+            return 0
+
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(count, min(count, clusters * 64), replace=False))
+        sample = normalize(np.asarray(matrix[sample_rows], dtype=np.float32))
+        centroids = spherical_kmeans(sample, clusters)
+        assignments = assign_clusters(matrix[:count], centroids)
+
+        # Written into the snapshot's generation; a compacted index ignores it
+        temp_path = ivf_path + ".tmp.npz"
+        np.savez(temp_path, centroids=centroids, assignments=assignments)
+        os.replace(temp_path, ivf_path)
+        print(f"🔎 Built IVF index: {count} vectors in {clusters} clusters")
+        return clusters
+
+    @property
+    def rebuilding(self) -> bool:
+        return self._rebuild is not None and self._rebuild.is_alive()
+
+    def rebuild_ivf_in_background(self):
+        """Start an IVF build on a thread unless one is running (in any process on this index)"""
+        if self.rebuilding:
+            return
+        self._rebuild = threading.Thread(target=self._rebuild_ivf, daemon=True)
+        self._rebuild.start()
+
+    def wait_for_rebuild(self, timeout: Optional[float] = None):
+        if self._rebuild is not None:
+            self._rebuild.join(timeout)
+
+    def _rebuild_ivf(self):
+        builder = LeaderLock(os.path.join(self.directory, ".ivf-build.lock"))
+        if not builder.acquire():
+            # Another process is training; its ivf.npz is picked up when written
+            return
+        try:
+            self.build_ivf()
+        except Exception as e:
+            print(f"IVF build failed: {e}")
+        finally:
+            builder.release()
+
+    def _load_ivf(self):
+        if not os.path.exists(self.ivf_path):
+            self._ivf = None
+            return
+        mtime = os.path.getmtime(self.ivf_path)
+        if self._ivf is None or self._ivf["mtime"] != mtime:
+            with np.load(self.ivf_path) as data:
+                self._ivf = {"centroids": data["centroids"], "assignments": data["assignments"], "mtime": mtime}
+
+    def _search_ivf(self, queries: np.ndarray, k: int, excluded: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+        self._load_ivf()
+        trained = 0 if self._ivf is None else len(self._ivf["assignments"])
+        if trained == 0 or self.count - trained > IVF_RETRAIN_RATIO * trained:
+            self.rebuild_ivf_in_background()
+        if trained == 0 or trained > self.count:
+            # Exact scan until the first clustering is ready
+            return self._search_brute_force(queries, k, excluded)
+
+        centroids = self._ivf["centroids"]
+        assignments = self._ivf["assignments"]
+        probes = top_k(queries @ centroids.T, min(IVF_NPROBE, len(centroids)))
+        # Rows added after training (a stale clustering, being retrained) are always scanned
+        tail = np.arange(trained, self.count)
+
+        hits = []
+        for query, clusters in zip(queries, probes):
+            candidates = np.concatenate([np.flatnonzero(np.isin(assignments, clusters)), tail])
+            candidates = candidates[~excluded[candidates]]
+            scores = np.asarray(self._matrix[candidates], dtype=np.float32) @ query
+            best = top_k(scores[None, :], k)[0]
+            hits.append((candidates[best], scores[best]))
+        return hits
+
+    def _search_brute_force(self, queries: np.ndarray, k: int, excluded: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+
+        for start in range(0, self.count, SEARCH_CHUNK_ROWS):
+            chunk = np.asarray(self._matrix[start:min(start + SEARCH_CHUNK_ROWS, self.count)], dtype=np.float32)
+            scores = queries @ chunk.T  # (queries, chunk rows)
+            scores[:, excluded[start:start + len(chunk)]] = -np.inf
+            chunk_best = top_k(scores, k)
+
+            # Merge with the best rows of earlier chunks
+            rows = np.concatenate([best_rows, chunk_best + start], axis=1)
+            merged = np.concatenate([best_scores, np.take_along_axis(scores, chunk_best, axis=1)], axis=1)
+            keep = top_k(merged, k)
+            best_rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores = np.take_along_axis(merged, keep, axis=1)
+
+        return list(zip(best_rows, best_scores))
+
+    # --- Sync with files written by other processes ---
+
+    def _media_rows(self, media_id: str) -> List[int]:
+        count = self.count
+        return [row for row in self.rows_by_media.get(media_id, []) if row < count and row not in self.deleted]
+
+    def _add_id(self, line: str):
+        entry = json.loads(line)
+        self.rows_by_media.setdefault(entry["media_id"], []).append(len(self.ids))
+        self.ids.append(entry)
+
+    def _refresh(self):
+        if self.dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+
+        generation = self._read_generation()
+        if generation != self.generation:
+            # Compacted by some process: row numbers changed, reload from the new files
+            self._set_generation(generation)
+
+        self._ids_offset = self._read_lines(self.ids_path, self._ids_offset, self._add_id)
+        self._deleted_offset = self._read_lines(self.deleted_path, self._deleted_offset, lambda line: self.deleted.add(int(line)))
+
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return
+        rows = os.path.getsize(self.vectors_path) // (self.dim * 2)
+        if rows == 0:
+            self._matrix = None
+        elif self._matrix is None or self._matrix.shape[0] != rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(rows, self.dim))
+
+    def _read_lines(self, path: str, offset: int, handle) -> int:
+        """Consume complete lines appended since offset; returns the new offset"""
+        if not os.path.exists(path):
+            return offset
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                handle(line.decode("utf-8"))
+        return offset + end
+
+def index_directory(model_name: str = CLIP_MODEL) -> str:
+    """One index per CLIP model - embeddings from different models are not comparable"""
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+    return os.getenv("EMBEDDING_INDEX_DIR", os.path.join(STORAGE_PATH, "index", slug))
+
+# Global index instance
+embedding_index = EmbeddingIndex(index_directory())
+
+def index_media(media_id: str, embeddings: Optional[Dict]):
+    """Add an analyzed media item's embed stage output to the index (replacing older entries)"""
+    if not embeddings or not embeddings.get("vectors"):
+        return
+    try:
+        embedding_index.delete_media(media_id)
+        embedding_index.add(media_id, np.asarray(embeddings["vectors"], dtype=np.float32), embeddings["timestamps"])
+    except Exception as e:
+        # Search is best-effort - never fail an analysis over it
+        print(f"Embedding indexing failed for {media_id}: {e}")
+
+if __name__ == "__main__":
+    # Maintenance, e.g. from a cron job: drop deleted rows, then retrain the IVF index
+    print(f"{embedding_index.compact()} deleted rows compacted")
+    print(f"{embedding_index.build_ivf()} clusters built")
@@ -1,100 +1,184 @@
 """
 Image analysis service using BLIP and CLIP
 """
-from transformers import BlipProcessor, BlipForConditionalGeneration, CLIPProcessor, CLIPModel
 from PIL import Image
+import numpy as np
 import torch
 import os
-from typing import Dict, List
+from typing import Any, Dict, List, Union
+import functools
+from app.services.pipeline import Stage
+from app.utils.palette import extract_palettes
+from app.utils.imaging import DecodedImage, as_decoded, BLIP_INPUT_SIZE, CLIP_INPUT_SIDE, PALETTE_SAMPLE_SIZE
+from app.services.model_registry import registry
+from app.services.model_server import remote_op
+from app.services.batching import MicroBatcher
+from app.services.tagging_service import tag_embeddings
 
-# Global model instances (lazy loaded)
-_blip_processor = None
-_blip_model = None
-_clip_processor = None
-_clip_model = None
+# Captioning batches images from all in-flight jobs/frames in this process
+CAPTION_BATCH_SIZE = int(os.getenv("CAPTION_BATCH_SIZE", "8"))
+CAPTION_BATCH_WAIT_MS = float(os.getenv("CAPTION_BATCH_WAIT_MS", "10"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "16"))
+# Longest caption BLIP generates (tokens)
+CAPTION_MAX_LENGTH = 50
+# Distinct search queries whose text embeddings are kept in memory
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
 
 def get_blip_models():
-    """Lazy load BLIP models"""
-    global _blip_processor, _blip_model
-    if _blip_processor is None:
-        model_name = os.getenv("BLIP_MODEL", "Salesforce/blip-image-captioning-base")
-        print(f"Loading BLIP model: {model_name}")
-        _blip_processor = BlipProcessor.from_pretrained(model_name)
-        _blip_model = BlipForConditionalGeneration.from_pretrained(model_name)
-    return _blip_processor, _blip_model
+    """BLIP processor and model from the shared registry (loaded on first use)"""
+    return registry.get("blip")
 
 def get_clip_models():
-    """Lazy load CLIP models"""
-    global _clip_processor, _clip_model
-    if _clip_processor is None:
-        model_name = "openai/clip-vit-base-patch32"
-        print(f"Loading CLIP model: {model_name}")
-        _clip_processor = CLIPProcessor.from_pretrained(model_name)
-        _clip_model = CLIPModel.from_pretrained(model_name)
-    return _clip_processor, _clip_model
-
-def analyze_image(image_path: str, detect_objects: bool = True) -> Dict:
+    """CLIP processor and model from the shared registry (loaded on first use)"""
+    return registry.get("clip")
+
+def describe_image(image: Union[str, DecodedImage]) -> Dict:
     """
-    Analyze image using BLIP for captioning and optionally detect objects
-    Returns: dict with caption, colors, dimensions, and objects
+    Caption image using BLIP and extract its palette
+    Returns: dict with caption, colors, and dimensions
     """
-    # Load image
-    image = Image.open(image_path).convert("RGB")
-    width, height = image.size
+    return describe_images([image])[0]
+
+def describe_images(images: List[Union[str, DecodedImage]]) -> List[Dict]:
+    """describe_image for several images (e.g. video frames), captioned in shared batches"""
+    decoded = [as_decoded(image) for image in images]
+    
+    # Generate captions using BLIP on the model-sized variant
+    captions = caption_pixels([image.resized(BLIP_INPUT_SIZE) for image in decoded])
+    
+    # Dominant colors of all images in one vectorized pass
+    palettes = extract_palettes([np.asarray(image.resized(PALETTE_SAMPLE_SIZE)) for image in decoded])
     
-    # Generate caption using BLIP
+    return [
+        {
+            "caption": caption,
+            "width": image.width,
+            "height": image.height,
+            "colors": colors,
+            "aspect_ratio": image.aspect_ratio
+        }
+        for image, caption, colors in zip(decoded, captions, palettes)
+    ]
+
+def caption_batch(images: List[Image.Image]) -> List[str]:
+    """Caption several images with one batched BLIP generate call"""
     processor, model = get_blip_models()
-    inputs = processor(images=image, return_tensors="pt")
+    inputs = processor(images=images, return_tensors="pt")
     
     with torch.no_grad():
-        out = model.generate(**inputs, max_length=50)
+        out = model.generate(**inputs, max_length=CAPTION_MAX_LENGTH)
     
-    caption = processor.decode(out[0], skip_special_tokens=True)
+    return processor.batch_decode(out, skip_special_tokens=True)
+
+caption_batcher = MicroBatcher("caption", caption_batch, CAPTION_BATCH_SIZE, CAPTION_BATCH_WAIT_MS)
+
+@remote_op("caption", serialize=False)
+def caption_pixels(images: List[Image.Image]) -> List[str]:
+    """Caption decoded RGB images (batched with concurrent requests)"""
+    return caption_batcher.map(images)
+
+def caption_image(image: Union[str, DecodedImage]) -> str:
+    """Caption a single image using BLIP"""
+    return caption_pixels([as_decoded(image).resized(BLIP_INPUT_SIZE)])[0]
+
+def embed_batch(images: List[Image.Image]) -> List[np.ndarray]:
+    """Unit-normalized CLIP image embeddings for several images in one forward pass"""
+    processor, model = get_clip_models()
+    inputs = processor(images=images, return_tensors="pt")
     
-    # Extract dominant colors (simple version)
-    colors = extract_dominant_colors(image)
+    with torch.no_grad():
+        features = model.get_image_features(**inputs)
     
-    result = {
-        "caption": caption,
-        "width": width,
-        "height": height,
-        "colors": colors,
-        "aspect_ratio": round(width / height, 2)
-    }
+    features = features / features.norm(dim=-1, keepdim=True)
+    return list(features.cpu().numpy().astype(np.float32))
+
+embed_batcher = MicroBatcher("embed", embed_batch, EMBED_BATCH_SIZE, CAPTION_BATCH_WAIT_MS)
+
+@remote_op("embed_images", serialize=False)
+def embed_pixels(images: List[Image.Image]) -> List[np.ndarray]:
+    """CLIP embeddings of decoded RGB images (batched with concurrent requests)"""
+    return embed_batcher.map(images)
+
+def embed_images(images: List[Union[str, DecodedImage]]) -> List[List[float]]:
+    """CLIP embedding per image (e.g. video keyframes), as JSON-friendly lists"""
+    vectors = embed_pixels([as_decoded(image).cover(CLIP_INPUT_SIDE) for image in images])
+    return [vector.tolist() for vector in vectors]
+
+@remote_op("embed_texts")
+def embed_texts(texts: List[str]) -> List[np.ndarray]:
+    """Unit-normalized CLIP text embeddings (same space as the image embeddings)"""
+    processor, model = get_clip_models()
+    inputs = processor(text=texts, padding=True, truncation=True, return_tensors="pt")
     
-    # Add object detection if enabled
-    if detect_objects:
-        try:
-            from app.services.object_detection_service import detect_objects as yolo_detect
-            detection_result = yolo_detect(image_path)
-            result["object_detection"] = detection_result
-        except Exception as e:
-            print(f"Object detection failed: {e}")
-            result["object_detection"] = {"error": str(e)}
+    with torch.no_grad():
+        features = model.get_text_features(**inputs)
     
+    features = features / features.norm(dim=-1, keepdim=True)
+    return list(features.cpu().numpy().astype(np.float32))
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _cached_query_embedding(query: str) -> np.ndarray:
+    vector = embed_texts([query])[0]
+    vector.setflags(write=False)  # Shared between callers
+    return vector
+
+def embed_query(query: str) -> np.ndarray:
+    """CLIP embedding of a search query, cached so repeated queries skip the text encoder"""
+    # CLIP's tokenizer lowercases, so case and spacing variants share a cache entry
+    return _cached_query_embedding(" ".join(query.lower().split()))
+
+def query_cache_stats() -> Dict:
+    """Hit/miss counts of the query embedding cache"""
+    info = _cached_query_embedding.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+def detect_image_objects(image: Union[str, DecodedImage]) -> Dict:
+    """Run YOLO object detection, reporting failures in the result instead of raising"""
+    return detect_images_objects([image])[0]
+
+def detect_images_objects(images: List[Union[str, DecodedImage]]) -> List[Dict]:
+    """Batched YOLO detection for several images (e.g. video frames), failures reported per image"""
+    try:
+        from app.services.object_detection_service import detect_images
+        return detect_images([as_decoded(image) for image in images])
+    except Exception as e:
+        print(f"Object detection failed: {e}")
+        return [{"error": str(e)} for _ in images]
+
+def build_image_stages(image_path: str) -> List[Stage]:
+    """
+    Stage graph for an image: decoded once, then captioning, detection and
+    CLIP embedding (and tagging from it) run side by side on the shared pixels
+    """
+    return [
+        Stage("decode", lambda results: DecodedImage.open(image_path), executor="text"),
+        Stage("caption", lambda results: describe_image(results["decode"]), deps=("decode",),
+              executor="vision", checkpoint=True),
+        Stage("detect", lambda results: detect_image_objects(results["decode"]), deps=("decode",),
+              executor="detect", checkpoint=True),
+        # Similarity-search vector, added to the embedding index once the analysis is saved
+        Stage("embed", lambda results: {"timestamps": [None], "vectors": embed_images([results["decode"]])},
+              deps=("decode",), executor="embed", checkpoint=True),
+        # Zero-shot tags from the same embedding (one matrix product against the label bank)
+        Stage("tags", lambda results: tag_embeddings(results["embed"]["vectors"])[0], deps=("embed",),
+              executor="text", checkpoint=True),
+    ]
+
+def assemble_image_result(results: Dict[str, Any], errors: Dict[str, Exception]) -> Dict:
+    """Combine stage outputs into the image analysis payload"""
+    if "caption" not in results:
+        raise errors.get("caption") or RuntimeError("Captioning unavailable")
+    
+    result = dict(results["caption"])
+    result["object_detection"] = results.get("detect", {"error": str(errors.get("detect"))})
+    if "tags" in results:
+        result["tags"] = results["tags"]
     return result
 
 def extract_dominant_colors(image: Image.Image, num_colors: int = 5) -> List[str]:
-    """Extract dominant colors from image (simple palette extraction)"""
-    # Resize for performance
-    image = image.resize((100, 100))
-    
-    # Get color palette
-    palette = image.quantize(colors=num_colors).getpalette()
-    
-    # Convert to hex colors
-    colors = []
-    for i in range(num_colors):
-        r, g, b = palette[i*3:i*3+3]
-        hex_color = f"#{r:02x}{g:02x}{b:02x}"
-        colors.append(hex_color)
+    """Extract dominant colors from image (histogram palette, see app/utils/palette.py)"""
+    # Resize for performance (no-op for the pre-resized palette variant)
+    if image.size != PALETTE_SAMPLE_SIZE:
+        image = image.resize(PALETTE_SAMPLE_SIZE)
     
-    return colors
-
-def generate_tags_from_caption(caption: str) -> List[str]:
-    """Generate tags from caption (simple keyword extraction)"""
-    # Simple approach: split and filter common words
-    stop_words = {'a', 'an', 'the', 'is', 'are', 'in', 'on', 'of', 'with', 'and', 'or'}
-    words = caption.lower().split()
-    tags = [w.strip('.,!?') for w in words if w not in stop_words and len(w) > 2]
-    return list(set(tags))[:10]  # Return unique tags, max 10
+    return extract_palettes([np.asarray(image.convert("RGB"))], num_colors)[0]
@@ -0,0 +1,474 @@
+"""
+Durable job queue with a bounded worker pool
+Jobs live in the database (SQLite by default) so they survive restarts; a fixed
+number of worker processes pull them, heartbeat while running, and retry on crash
+"""
+from app.models.jobs import Job, JobEvent, MediaWatcher, WorkerModel, WorkerStat
+from app.utils.database import SessionLocal, engine
+from app.utils.websocket_manager import manager
+from app.services.model_registry import registry
+from app.services.model_server import uses_model_server
+from app.services.batching import get_batching_stats
+from app.utils.file_lock import LeaderLock
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import uuid4
+import multiprocessing
+import asyncio
+import threading
+import socket
+import time
+import os
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL_SEC", "1.0"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL_SEC", "10"))
+JOB_HEARTBEAT_TIMEOUT = float(os.getenv("JOB_HEARTBEAT_TIMEOUT_SEC", "60"))
+# How often the pool owner restarts workers that died
+JOB_SUPERVISE_INTERVAL = 5.0
+STORAGE_PATH = os.getenv("STORAGE_PATH", "./storage")
+# API processes re-announce the media their WebSocket clients watch this often;
+# announcements older than WATCHER_TTL_SEC (e.g. from a crashed process) are ignored
+WATCHER_REFRESH_SEC = 5.0
+WATCHER_TTL_SEC = 15.0
+
+def enqueue_job(db: Session, media_id: str, file_path: str, storage_dir: str) -> Job:
+    """Add an analysis job to the queue"""
+    job = Job(
+        id=str(uuid4()),
+        media_id=media_id,
+        file_path=file_path,
+        storage_dir=storage_dir,
+        status="queued",
+        max_attempts=JOB_MAX_ATTEMPTS
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[Job]:
+    """Atomically move the oldest queued job to running for this worker"""
+    candidates = db.query(Job.id).filter(
+        Job.status == "queued"
+    ).order_by(Job.created_at).limit(5).all()
+
+    for (job_id,) in candidates:
+        now = datetime.utcnow()
+        # Conditional update - only one worker can win the queued -> running transition
+        claimed = db.query(Job).filter(
+            Job.id == job_id,
+            Job.status == "queued"
+        ).update({
+            Job.status: "running",
+            Job.worker_id: worker_id,
+            Job.attempts: Job.attempts + 1,
+            Job.started_at: now,
+            Job.heartbeat_at: now,
+            Job.error: None
+        }, synchronize_session=False)
+        db.commit()
+
+        if claimed:
+            return db.query(Job).filter(Job.id == job_id).first()
+
+    return None
+
+def heartbeat(job_id: str, worker_id: str):
+    """Record that the worker running a job is still alive"""
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(
+            Job.id == job_id,
+            Job.worker_id == worker_id,
+            Job.status == "running"
+        ).update({Job.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def finish_job(db: Session, job: Job, worker_id: str, error: Optional[str] = None) -> bool:
+    """
+    Mark a job completed, or requeue/fail it after an error
+    Conditional on the job still being this worker's run - if it was recovered as
+    stale meanwhile, the result is dropped. Returns whether the job was updated
+    """
+    values = {Job.finished_at: datetime.utcnow()}
+    if error is None:
+        values[Job.status] = "completed"
+    else:
+        values[Job.error] = error
+        values[Job.status] = "queued" if job.attempts < job.max_attempts else "failed"
+
+    updated = db.query(Job).filter(
+        Job.id == job.id,
+        Job.worker_id == worker_id,
+        Job.status == "running"
+    ).update(values, synchronize_session=False)
+    db.commit()
+
+    if not updated:
+        print(f"⚠️ Job {job.id} was recovered from {worker_id} before it finished, result dropped")
+    return bool(updated)
+
+def requeue_stale_jobs(db: Session, timeout: float = JOB_HEARTBEAT_TIMEOUT) -> int:
+    """Recover running jobs whose worker stopped heartbeating (crash, deploy, OOM kill)"""
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout)
+    stale = db.query(Job.id, Job.worker_id, Job.attempts, Job.max_attempts).filter(
+        Job.status == "running",
+        Job.heartbeat_at < cutoff
+    ).all()
+
+    requeued = 0
+    for job_id, worker_id, attempts, max_attempts in stale:
+        # Conditional update - a job that finished or heartbeated since the query is left alone
+        updated = db.query(Job).filter(
+            Job.id == job_id,
+            Job.worker_id == worker_id,
+            Job.status == "running",
+            Job.heartbeat_at < cutoff
+        ).update({
+            Job.error: f"Worker {worker_id} stopped responding",
+            Job.status: "queued" if attempts < max_attempts else "failed"
+        }, synchronize_session=False)
+        db.commit()
+
+        if updated:
+            print(f"⚠️ Job {job_id} lost its worker {worker_id}, attempt {attempts}/{max_attempts}")
+            requeued += 1
+
+    return requeued
+
+def retry_job(db: Session, job: Job):
+    """Put a failed job back on the queue with a fresh attempt budget"""
+    job.status = "queued"
+    job.attempts = 0
+    job.error = None
+    job.finished_at = None
+    db.commit()
+
+def serialize_job(job: Job) -> Dict:
+    """Job record as API response"""
+    return {
+        "id": job.id,
+        "media_id": job.media_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "worker_id": job.worker_id,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+def get_queue_stats(db: Session) -> Dict:
+    """Queue depth per status and age of the oldest waiting job"""
+    counts = dict(
+        db.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+    )
+    oldest = db.query(func.min(Job.created_at)).filter(Job.status == "queued").scalar()
+
+    return {
+        "queued": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "completed": counts.get("completed", 0),
+        "failed": counts.get("failed", 0),
+        "workers": worker_pool.size,
+        "workers_alive": worker_pool.alive_count(),
+        "oldest_queued_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0
+    }
+
+# --- Worker process ---
+
+def publish_event(media_id: str, message: dict):
+    """Store a WebSocket message for the API process to relay"""
+    db = SessionLocal()
+    try:
+        db.add(JobEvent(media_id=media_id, message=message))
+        db.commit()
+    finally:
+        db.close()
+
+def media_is_watched(media_id: str) -> bool:
+    """Whether a WebSocket client is connected for media_id in any API process"""
+    cutoff = datetime.utcnow() - timedelta(seconds=WATCHER_TTL_SEC)
+    db = SessionLocal()
+    try:
+        return db.query(MediaWatcher).filter(
+            MediaWatcher.media_id == media_id,
+            MediaWatcher.updated_at >= cutoff
+        ).first() is not None
+    finally:
+        db.close()
+
+def report_models(worker_id: str, models: List[Dict]):
+    """Persist this worker's model residency so the API process can report it"""
+    db = SessionLocal()
+    try:
+        db.query(WorkerModel).filter(WorkerModel.worker_id == worker_id).delete(synchronize_session=False)
+        for status in models:
+            db.add(WorkerModel(worker_id=worker_id, name=status["name"], status=status,
+                               updated_at=datetime.utcnow()))
+        db.commit()
+    finally:
+        db.close()
+
+def get_worker_models(db: Session) -> Dict[str, List[Dict]]:
+    """Model residency reported by each worker process"""
+    workers: Dict[str, List[Dict]] = {}
+    for row in db.query(WorkerModel).order_by(WorkerModel.worker_id, WorkerModel.name).all():
+        workers.setdefault(row.worker_id, []).append(row.status)
+    return workers
+
+def report_stats(worker_id: str, stats: Dict[str, Dict]):
+    """Persist this worker's named stats snapshots (replacing earlier ones)"""
+    db = SessionLocal()
+    try:
+        for name, payload in stats.items():
+            db.merge(WorkerStat(worker_id=worker_id, name=name, payload=payload,
+                                updated_at=datetime.utcnow()))
+        db.commit()
+    finally:
+        db.close()
+
+def get_worker_stats(db: Session, name: str) -> Dict[str, Dict]:
+    """A named stats snapshot from each worker process"""
+    rows = db.query(WorkerStat).filter(WorkerStat.name == name).order_by(WorkerStat.worker_id).all()
+    return {row.worker_id: row.payload for row in rows}
+
+def run_job(job: Job, worker_id: str) -> Optional[str]:
+    """Run one analysis job with a heartbeat thread; returns error message on failure"""
+    from app.services.orchestrator import start_processing
+
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                heartbeat(job.id, worker_id)
+            except Exception as e:
+                print(f"Heartbeat failed for job {job.id}: {e}")
+
+    beat_thread = threading.Thread(target=beat, daemon=True)
+    beat_thread.start()
+
+    db = SessionLocal()
+    try:
+        asyncio.run(start_processing(db, job.media_id, job.file_path, job.storage_dir))
+        return None
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+    finally:
+        stop.set()
+        beat_thread.join()
+        db.close()
+
+def worker_main(name: str):
+    """Worker process loop: recover stale jobs, claim one, run it, repeat"""
+    # Unique across pools/hosts sharing the same queue
+    worker_id = f"{name}:{os.getpid()}"
+    # Never reuse connections inherited from the parent process
+    engine.dispose()
+    manager.publisher = publish_event
+    manager.watch_checker = media_is_watched
+
+    # Drop residency/stats reported by a previous process in this pool slot
+    db = SessionLocal()
+    try:
+        db.query(WorkerModel).filter(WorkerModel.worker_id.like(f"{name}:%")).delete(synchronize_session=False)
+        db.query(WorkerStat).filter(WorkerStat.worker_id.like(f"{name}:%")).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+    registry.reporter = lambda models: report_models(worker_id, models)
+    if not uses_model_server():
+        registry.preload()
+    print(f"👷 Worker {worker_id} started")
+
+    while True:
+        job = None
+        db = SessionLocal()
+        try:
+            requeue_stale_jobs(db)
+            job = claim_next_job(db, worker_id)
+
+            if job is not None:
+                print(f"👷 Worker {worker_id} running job {job.id} (attempt {job.attempts})")
+                error = run_job(job, worker_id)
+                finish_job(db, job, worker_id, error)
+                report_stats(worker_id, {"batching": get_batching_stats()})
+        except Exception as e:
+            print(f"Worker {worker_id} loop error: {e}")
+        finally:
+            db.close()
+
+        if job is None:
+            time.sleep(JOB_POLL_INTERVAL)
+
+class WorkerPool:
+    """Fixed-size pool of worker processes - concurrency never exceeds its size"""
+
+    def __init__(self, size: int = JOB_WORKERS):
+        self.size = size
+        self.processes: Dict[str, multiprocessing.Process] = {}
+        # Spawn avoids forking a parent that holds model threads/locks
+        self.context = multiprocessing.get_context("spawn")
+
+    def start(self):
+        """Start (or restart) worker processes up to the pool size"""
+        for index in range(self.size):
+            name = f"worker-{index}"
+            process = self.processes.get(name)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                print(f"⚠️ {name} exited with code {process.exitcode}, restarting")
+
+            # Not daemonic so a worker can start its own process pool (chunked transcription);
+            # stop() terminates workers explicitly
+            process = self.context.Process(target=worker_main, args=(name,), daemon=False)
+            process.start()
+            self.processes[name] = process
+
+    def stop(self, timeout: float = 5.0):
+        """Terminate all workers - their running jobs are recovered via heartbeat timeout"""
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join(timeout)
+        self.processes.clear()
+
+    def alive_count(self) -> int:
+        """Number of worker processes currently running in this process's pool"""
+        return sum(1 for p in self.processes.values() if p.is_alive())
+
+# Global worker pool instance
+worker_pool = WorkerPool()
+
+# Held by the one process (per STORAGE_PATH) that runs the worker pool
+pool_leader = LeaderLock(os.path.join(STORAGE_PATH, ".worker-pool.lock"))
+
+def supervise_pool(pool: WorkerPool = worker_pool, leader: LeaderLock = pool_leader) -> bool:
+    """
+    Start or restart the pool's workers if this process owns the pool
+    With several API processes (uvicorn --workers) or a standalone runner, the
+    first to take the leader lock runs the pool and the others only relay events;
+    when the owner exits, another one takes over on its next call
+    """
+    if pool.size <= 0:
+        return False
+    if not leader.file and leader.acquire():
+        print(f"👑 Process {os.getpid()} owns the worker pool ({pool.size} workers)")
+    if leader.file:
+        pool.start()
+        return True
+    return False
+
+# --- API process ---
+
+async def run_pool_supervisor(interval: float = JOB_SUPERVISE_INTERVAL):
+    """Keep the worker pool running in this process while it holds the leader lock"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            # Starting worker processes blocks; keep it off the event loop
+            await loop.run_in_executor(None, supervise_pool)
+        except Exception as e:
+            print(f"Worker pool supervision failed: {e}")
+        await asyncio.sleep(interval)
+
+def announce_watched_media(db: Session, server_id: str, media_ids: Set[str]):
+    """Replace this API process's list of media with connected WebSocket clients"""
+    db.query(MediaWatcher).filter(MediaWatcher.server_id == server_id).delete(synchronize_session=False)
+    now = datetime.utcnow()
+    for media_id in media_ids:
+        db.add(MediaWatcher(server_id=server_id, media_id=media_id, updated_at=now))
+    db.commit()
+
+def latest_event_id() -> int:
+    """Id of the newest stored event (0 if none)"""
+    db = SessionLocal()
+    try:
+        return db.query(func.max(JobEvent.id)).scalar() or 0
+    finally:
+        db.close()
+
+def poll_job_events(last_id: int, limit: int = 500, server_id: Optional[str] = None,
+                    watched: Optional[Set[str]] = None) -> List[Tuple[int, str, dict]]:
+    """
+    One relay poll's database work: events newer than last_id as (id, media_id, message),
+    this process's watched media (when given) and cleanup of old events
+    Runs in a thread, since SQLite lock waits would otherwise stall the event loop
+    """
+    db = SessionLocal()
+    try:
+        events = [
+            (event.id, event.media_id, event.message)
+            for event in db.query(JobEvent).filter(
+                JobEvent.id > last_id
+            ).order_by(JobEvent.id).limit(limit).all()
+        ]
+        if watched is not None:
+            announce_watched_media(db, server_id, watched)
+
+        # Relayed events are only needed briefly
+        cutoff = datetime.utcnow() - timedelta(minutes=10)
+        db.query(JobEvent).filter(JobEvent.created_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+        return events
+    finally:
+        db.close()
+
+async def relay_new_events(last_id: int, limit: int = 500, server_id: Optional[str] = None,
+                           watched: Optional[Set[str]] = None) -> int:
+    """Broadcast events newer than last_id to this process's clients; returns the new last id"""
+    events = await asyncio.get_running_loop().run_in_executor(
+        None, poll_job_events, last_id, limit, server_id, watched
+    )
+    for event_id, media_id, message in events:
+        await manager.broadcast_to_media(media_id, message)
+        last_id = event_id
+    return last_id
+
+async def relay_job_events(poll_interval: float = 0.5):
+    """
+    Forward worker WebSocket messages to the clients connected to this process,
+    and tell workers which media those clients watch
+    """
+    loop = asyncio.get_running_loop()
+    server_id = f"{socket.gethostname()}:{os.getpid()}"
+    announced: Set[str] = set()
+    announced_at = 0.0
+    # Only relay events emitted after this process started
+    last_id = await loop.run_in_executor(None, latest_event_id)
+
+    while True:
+        try:
+            watched = set(manager.active_connections)
+            changed = watched != announced or (watched and time.time() - announced_at >= WATCHER_REFRESH_SEC)
+            last_id = await relay_new_events(last_id, server_id=server_id, watched=watched if changed else None)
+            if changed:
+                announced, announced_at = watched, time.time()
+        except Exception as e:
+            print(f"Job event relay failed: {e}")
+
+        await asyncio.sleep(poll_interval)
+
+if __name__ == "__main__":
+    # Run the worker pool standalone (set JOB_WORKERS=0 on the API servers)
+    from app.utils.database import init_db
+    init_db()
+    pool = WorkerPool(max(JOB_WORKERS, 1))
+    try:
+        while True:
+            # Waits as a standby while another process on this storage owns the pool
+            supervise_pool(pool)
+            time.sleep(JOB_SUPERVISE_INTERVAL)
+    except KeyboardInterrupt:
+        pool.stop()
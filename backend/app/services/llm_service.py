@@ -2,35 +2,27 @@
 LLM service for conversational analysis
 Using small local models for zero-cost deployment
 """
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-import torch
-import os
 from typing import Dict, List
-
-# Global models (lazy loaded)
-_llm_pipeline = None
+from app.services.model_registry import registry
+from app.services.model_server import remote_op
 
 def get_llm_pipeline():
-    """Lazy load LLM pipeline"""
-    global _llm_pipeline
-    if _llm_pipeline is None:
-        model_name = os.getenv("LLM_MODEL", "facebook/opt-1.3b")
-        print(f"Loading LLM model: {model_name}")
-        
-        _llm_pipeline = pipeline(
-            "text-generation",
-            model=model_name,
-            tokenizer=model_name,
-            device=-1,  # CPU
-            max_length=1024
-        )
-    return _llm_pipeline
+    """LLM pipeline from the shared registry (loaded on first use)"""
+    return registry.get("llm")
 
 SYSTEM_PROMPT = """You are a helpful AI assistant analyzing media content.
 Answer the user's question based ONLY on the provided context.
 If the answer is not in the context, say "I don't see that in the media."
 Keep your answer concise and direct."""
 
+@remote_op("generate")
+def generate_text(prompt: str, **generate_kwargs) -> str:
+    """Run the LLM on a prompt and return only the generated continuation"""
+    llm = get_llm_pipeline()
+    result = llm(prompt, **generate_kwargs)
+    generated = result[0]["generated_text"]
+    return generated[len(prompt):].strip()
+
 def ask_llm(context: Dict, question: str, chat_history: List[Dict] = None) -> str:
     """
     Generate response using LLM with context
@@ -45,11 +37,9 @@ def ask_llm(context: Dict, question: str, chat_history: List[Dict] = None) -> st
     # Build prompt with context
     prompt = build_prompt(context, question, chat_history)
     
-    # Generate response
-    llm = get_llm_pipeline()
-    
     try:
-        result = llm(
+        # Generate response (without the prompt part)
+        response = generate_text(
             prompt,
             max_new_tokens=300,
             temperature=0.5,
@@ -58,12 +48,6 @@ def ask_llm(context: Dict, question: str, chat_history: List[Dict] = None) -> st
             num_return_sequences=1
         )
         
-        # Extract generated text
-        generated = result[0]["generated_text"]
-        
-        # Remove the prompt part
-        response = generated[len(prompt):].strip()
-        
         # Stop at the next USER: or ASSISTANT: token to prevent hallucination
         stop_tokens = ["USER:", "ASSISTANT:", "User:", "Assistant:"]
         for token in stop_tokens:
@@ -84,6 +68,9 @@ def build_prompt(context: Dict, question: str, chat_history: List[Dict] = None)
     if "caption" in context:
         facts.append(f"- Image caption: {context['caption']}")
     
+    if context.get("tags"):
+        facts.append(f"- Tags: {', '.join(t['tag'] for t in context['tags'])}")
+    
     if "transcript" in context:
         transcript = context["transcript"][:500]  # Limit length
         facts.append(f"- Transcript excerpt: {transcript}")
@@ -141,12 +128,7 @@ def summarize_analysis(analysis: Dict) -> str:
 
 Summary:"""
     
-    llm = get_llm_pipeline()
-    
     try:
-        result = llm(prompt, max_new_tokens=150, temperature=0.7)
-        generated = result[0]["generated_text"]
-        summary = generated[len(prompt):].strip()
-        return summary
+        return generate_text(prompt, max_new_tokens=150, temperature=0.7)
     except:
         return "Analysis completed. Ask questions to explore the content."
@@ -0,0 +1,259 @@
+"""
+Model registry
+Owns loading of every model, tracks resident memory, evicts least-recently-used
+models when MODEL_MEMORY_BUDGET_MB is exceeded and preloads PRELOAD_MODELS
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import threading
+import time
+import gc
+import os
+
+# 0 = no limit (models are never evicted)
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+
+# Comma-separated model names each worker loads at startup, e.g. "whisper,blip,yolo"
+PRELOAD_MODELS = [name.strip() for name in os.getenv("PRELOAD_MODELS", "").split(",") if name.strip()]
+
+# Models the API process itself serves (chat) - workers handle everything else
+PRELOAD_API_MODELS = [name.strip() for name in os.getenv("PRELOAD_API_MODELS", "").split(",") if name.strip()]
+
+# --- Loaders (heavy libraries are imported only when a model is loaded) ---
+
+def load_whisper():
+    import whisper
+    model_size = os.getenv("WHISPER_MODEL", "small")
+    print(f"Loading Whisper model: {model_size}")
+    return whisper.load_model(model_size)
+
+def load_sentiment():
+    from transformers import pipeline
+    print("Loading sentiment analyzer")
+    return pipeline(
+        "sentiment-analysis",
+        model="distilbert-base-uncased-finetuned-sst-2-english"
+    )
+
+def load_blip():
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+    model_name = os.getenv("BLIP_MODEL", "Salesforce/blip-image-captioning-base")
+    print(f"Loading BLIP model: {model_name}")
+    return BlipProcessor.from_pretrained(model_name), BlipForConditionalGeneration.from_pretrained(model_name)
+
+def load_clip():
+    from transformers import CLIPProcessor, CLIPModel
+    model_name = "openai/clip-vit-base-patch32"
+    print(f"Loading CLIP model: {model_name}")
+    return CLIPProcessor.from_pretrained(model_name), CLIPModel.from_pretrained(model_name)
+
+def load_yolo():
+    from ultralytics import YOLO
+    model_name = os.getenv("YOLO_MODEL", "yolov8n.pt")  # nano model (smallest)
+    print(f"Loading YOLO model: {model_name}")
+    return YOLO(model_name)
+
+def load_llm():
+    from transformers import pipeline
+    model_name = os.getenv("LLM_MODEL", "facebook/opt-1.3b")
+    print(f"Loading LLM model: {model_name}")
+    return pipeline(
+        "text-generation",
+        model=model_name,
+        tokenizer=model_name,
+        device=-1,  # CPU
+        max_length=1024
+    )
+
+# --- Memory accounting ---
+
+def estimate_size_bytes(obj: Any, _seen: Optional[set] = None) -> int:
+    """
+    Resident size of a model from its parameter and buffer tensors
+    Handles torch modules, pipelines/wrappers exposing .model, and tuples of them
+    """
+    seen = _seen if _seen is not None else set()
+    if obj is None or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_size_bytes(item, seen) for item in obj)
+
+    parameters = getattr(obj, "parameters", None)
+    buffers = getattr(obj, "buffers", None)
+    if callable(parameters) and callable(buffers):
+        try:
+            tensors = list(parameters()) + list(buffers())
+            return sum(t.numel() * t.element_size() for t in tensors)
+        except Exception:
+            pass
+
+    # transformers pipelines and ultralytics YOLO wrap the torch module
+    return estimate_size_bytes(getattr(obj, "model", None), seen)
+
+class ModelEntry:
+    """Registered model and its residency bookkeeping"""
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self.loader = loader
+        self.model = None
+        self.size_bytes = 0  # Kept after eviction so the next load can make room first
+        self.load_seconds = None
+        self.loaded_at = None
+        self.last_used_at = None
+        self.loads = 0
+        self.evictions = 0
+        self.lock = threading.Lock()  # Serializes loading of this model
+
+    @property
+    def resident(self) -> bool:
+        return self.model is not None
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "resident": self.resident,
+            "size_mb": round(self.size_bytes / 1024 / 1024, 1),
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "last_used_at": self.last_used_at.isoformat() if self.last_used_at else None,
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
+
+class ModelRegistry:
+    """
+    Loads models on first use and keeps resident ones within a memory budget
+    Eviction drops the registry's reference; a thread still running inference
+    keeps its own reference until it finishes
+    """
+
+    def __init__(self, budget_mb: float = MODEL_MEMORY_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.entries: Dict[str, ModelEntry] = {}
+        self.lru: "OrderedDict[str, None]" = OrderedDict()  # Resident models, least recently used first
+        self.lock = threading.RLock()
+        # Called with status() after every load/eviction (worker processes persist it)
+        self.reporter: Optional[Callable[[List[Dict]], None]] = None
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """Register (or replace) the loader for a model name"""
+        with self.lock:
+            self.entries[name] = ModelEntry(name, loader)
+
+    def get(self, name: str) -> Any:
+        """Return a model, loading it (and evicting others if over budget) as needed"""
+        entry = self.entries.get(name)
+        if entry is None:
+            raise ValueError(f"Unknown model: {name}")
+
+        with entry.lock:
+            with self.lock:
+                model = entry.model
+                if model is not None:
+                    entry.last_used_at = datetime.utcnow()
+                    self.lru.move_to_end(name)
+                    return model
+
+                # Size is known from an earlier load - make room before loading again
+                if entry.size_bytes:
+                    self._evict_to_fit(entry.size_bytes, keep=name)
+
+            started = time.perf_counter()
+            model = entry.loader()
+            elapsed = time.perf_counter() - started
+
+            with self.lock:
+                entry.model = model
+                entry.size_bytes = estimate_size_bytes(model)
+                entry.load_seconds = elapsed
+                entry.loaded_at = entry.last_used_at = datetime.utcnow()
+                entry.loads += 1
+                self.lru[name] = None
+                self.lru.move_to_end(name)
+                print(f"📦 Loaded {name} in {elapsed:.1f}s ({entry.size_bytes / 1024 / 1024:.0f}MB, "
+                      f"{self.resident_bytes() / 1024 / 1024:.0f}MB resident)")
+                self._evict_to_fit(0, keep=name)
+
+        self._report()
+        return model
+
+    def unload(self, name: str) -> bool:
+        """Drop a resident model; returns False if it was not loaded"""
+        with self.lock:
+            unloaded = self._evict(name)
+        if unloaded:
+            self._release_memory()
+            self._report()
+        return unloaded
+
+    def preload(self, names: Optional[List[str]] = None):
+        """Load models ahead of the first request (defaults to PRELOAD_MODELS)"""
+        for name in names if names is not None else PRELOAD_MODELS:
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"⚠️ Failed to preload {name}: {e}")
+
+    def resident_bytes(self) -> int:
+        return sum(self.entries[name].size_bytes for name in self.lru)
+
+    def status(self) -> List[Dict]:
+        """Residency, size and load time of every registered model"""
+        with self.lock:
+            return [entry.to_dict() for entry in self.entries.values()]
+
+    def _evict_to_fit(self, incoming_bytes: int, keep: str):
+        """Evict least-recently-used models until incoming_bytes fits in the budget"""
+        if self.budget_bytes <= 0:
+            return
+
+        evicted = False
+        for name in list(self.lru):
+            if self.resident_bytes() + incoming_bytes <= self.budget_bytes:
+                break
+            if name == keep:
+                continue
+            evicted = self._evict(name) or evicted
+
+        if evicted:
+            self._release_memory()
+
+    def _evict(self, name: str) -> bool:
+        entry = self.entries.get(name)
+        if entry is None or entry.model is None:
+            return False
+        print(f"📦 Evicting {name} ({entry.size_bytes / 1024 / 1024:.0f}MB, least recently used)")
+        entry.model = None
+        entry.evictions += 1
+        self.lru.pop(name, None)
+        return True
+
+    def _release_memory(self):
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def _report(self):
+        if self.reporter is None:
+            return
+        try:
+            self.reporter(self.status())
+        except Exception as e:
+            print(f"Model status report failed: {e}")
+
+# Global registry instance
+registry = ModelRegistry()
+registry.register("whisper", load_whisper)
+registry.register("sentiment", load_sentiment)
+registry.register("blip", load_blip)
+registry.register("clip", load_clip)
+registry.register("yolo", load_yolo)
+registry.register("llm", load_llm)
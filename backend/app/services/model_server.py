@@ -0,0 +1,236 @@
+"""
+Shared model server
+One process hosts the models and serves caption, detect, transcribe, sentiment
+and generate calls to any number of API/worker processes over a local socket,
+so model memory no longer scales with the number of processes
+"""
+from multiprocessing.connection import Client, Listener
+from typing import Any, Callable, Dict, List, Tuple, Union
+import functools
+import importlib
+import threading
+import os
+
+# Unix socket path (or loopback host:port) of the model server; empty = run models in-process
+MODEL_SERVER_ADDRESS = os.getenv("MODEL_SERVER_ADDRESS", "")
+# Shared secret for the connection handshake - required, there is no default
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "").encode("utf-8")
+MODEL_SERVER_TIMEOUT = float(os.getenv("MODEL_SERVER_TIMEOUT_SEC", "600"))
+
+# Modules whose @remote_op functions the server exposes
+SERVICE_MODULES = [
+    "app.services.image_service",
+    "app.services.object_detection_service",
+    "app.services.audio_service",
+    "app.services.sentiment_service",
+    "app.services.llm_service",
+]
+
+# Registered operations (the undecorated, in-process implementations)
+_ops: Dict[str, Callable] = {}
+# One call per operation at a time - concurrent callers queue instead of thrashing the model
+_op_locks: Dict[str, threading.Lock] = {}
+# True inside the server process, where operations always run locally
+_serving = False
+
+def uses_model_server() -> bool:
+    """Whether model calls in this process are forwarded to the model server"""
+    return bool(MODEL_SERVER_ADDRESS) and not _serving
+
+# Calls are pickled, so the server must never be reachable from other machines
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1", "[::1]")
+# Placeholder from .env.example
+EXAMPLE_AUTHKEY = b"change-me"
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """
+    'host:port' -> TCP address (loopback hosts only), anything else is a Unix socket path
+    Raises: ValueError for a non-loopback host
+    """
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        if host not in LOOPBACK_HOSTS:
+            raise ValueError(f"Model server address must be a Unix socket or a loopback host, not {host}")
+        return host.strip("[]"), int(port)
+    return address
+
+def check_authkey(authkey: bytes) -> bytes:
+    """
+    The handshake secret must be set explicitly - anyone holding it can send the
+    server pickled data, i.e. run code in it
+    Raises: ValueError if MODEL_SERVER_AUTHKEY is unset or the example placeholder
+    """
+    if not authkey or authkey == EXAMPLE_AUTHKEY:
+        raise ValueError("MODEL_SERVER_AUTHKEY must be set to a secret to use the model server")
+    return authkey
+
+def remote_op(name: str, serialize: bool = True):
+    """
+    Mark a model-backed function as a model server operation
+    Calls run in-process unless MODEL_SERVER_ADDRESS is set, in which case the
+    arguments are sent to the server and its result (or error) is returned
+    serialize=False lets the server run calls concurrently (e.g. ops that
+    micro-batch concurrent calls themselves)
+    """
+    def decorator(fn: Callable) -> Callable:
+        _ops[name] = fn
+        if serialize:
+            _op_locks[name] = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if uses_model_server():
+                return client.call(name, *args, **kwargs)
+            return fn(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+class ModelServerClient:
+    """Pool of connections to the model server (a connection serves one call at a time)"""
+
+    def __init__(self, address: str = MODEL_SERVER_ADDRESS, authkey: bytes = MODEL_SERVER_AUTHKEY,
+                 timeout: float = MODEL_SERVER_TIMEOUT):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self.idle: List = []
+        self.lock = threading.Lock()
+
+    def call(self, name: str, *args, **kwargs) -> Any:
+        """Run an operation on the server; raises its error locally"""
+        for attempt in range(2):
+            conn, reused = self._acquire()
+            try:
+                conn.send((name, args, kwargs))
+                if not conn.poll(self.timeout):
+                    raise TimeoutError(f"Model server did not answer {name} within {self.timeout}s")
+                status, payload = conn.recv()
+                break
+            except (OSError, EOFError):
+                conn.close()
+                # An idle connection may predate a server restart - retry once on a fresh one
+                if not reused or attempt:
+                    raise
+            except Exception:
+                # Out-of-sync connection - never reuse it
+                conn.close()
+                raise
+
+        self._release(conn)
+        if status == "ok":
+            return payload
+
+        error_type, message = payload
+        if error_type == "ValueError":
+            raise ValueError(message)
+        raise RuntimeError(f"Model server {name} failed: {error_type}: {message}")
+
+    def close(self):
+        with self.lock:
+            for conn in self.idle:
+                conn.close()
+            self.idle.clear()
+
+    def _acquire(self):
+        """Returns: (connection, whether it was reused from the pool)"""
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        try:
+            return Client(parse_address(self.address), authkey=check_authkey(self.authkey)), False
+        except (OSError, EOFError) as e:
+            raise RuntimeError(f"Model server unavailable at {self.address}: {e}")
+
+    def _release(self, conn):
+        with self.lock:
+            self.idle.append(conn)
+
+# Global client instance
+client = ModelServerClient()
+
+# --- Server process ---
+
+def handle_connection(conn):
+    """Serve calls from one client connection until it disconnects"""
+    try:
+        while True:
+            try:
+                name, args, kwargs = conn.recv()
+            except EOFError:
+                break
+
+            fn = _ops.get(name)
+            if fn is None:
+                conn.send(("error", ("ValueError", f"Unknown model operation: {name}")))
+                continue
+
+            try:
+                lock = _op_locks.get(name)
+                if lock is not None:
+                    with lock:
+                        result = fn(*args, **kwargs)
+                else:
+                    result = fn(*args, **kwargs)
+                conn.send(("ok", result))
+            except Exception as e:
+                print(f"Model operation {name} failed: {e}")
+                conn.send(("error", (e.__class__.__name__, str(e))))
+    finally:
+        conn.close()
+
+def serve(address: str = MODEL_SERVER_ADDRESS, authkey: bytes = MODEL_SERVER_AUTHKEY):
+    """Load the models once and serve requests forever"""
+    global _serving
+    _serving = True
+
+    if not address:
+        raise ValueError("MODEL_SERVER_ADDRESS is not set")
+    # Refuse to start before loading anything
+    listen_address = parse_address(address)
+    check_authkey(authkey)
+
+    for module in SERVICE_MODULES:
+        importlib.import_module(module)
+
+    from app.services.model_registry import registry
+    registry.preload()
+
+    if isinstance(listen_address, str) and os.path.exists(listen_address):
+        # Stale socket from a previous run
+        os.remove(listen_address)
+
+    listener = Listener(listen_address, authkey=authkey)
+    if isinstance(listen_address, str):
+        # Only this user's processes may connect
+        os.chmod(listen_address, 0o600)
+    print(f"🧠 Model server listening on {address} ({', '.join(sorted(_ops))})")
+
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # e.g. a client with the wrong authkey
+                print(f"Model server rejected connection: {e}")
+                continue
+            threading.Thread(target=handle_connection, args=(conn,), daemon=True).start()
+    finally:
+        listener.close()
+
+@remote_op("models")
+def model_status() -> List[Dict]:
+    """Residency of the models hosted by this process"""
+    from app.services.model_registry import registry
+    return registry.status()
+
+@remote_op("batching_stats", serialize=False)
+def batching_stats() -> Dict[str, Dict]:
+    """Micro-batching stats of this process"""
+    from app.services.batching import get_batching_stats
+    return get_batching_stats()
+
+if __name__ == "__main__":
+    # Run via the package module so the services register into the same _ops
+    from app.services import model_server
+    model_server.serve()
@@ -2,80 +2,61 @@
 Object Detection service using YOLOv8
 Detects objects, people, animals, vehicles in images and video frames
 """
-from ultralytics import YOLO
 import os
-from PIL import Image
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import numpy as np
-
-# Global model instance (lazy loaded)
-_yolo_model = None
+from app.utils.imaging import DecodedImage
+from app.services.model_registry import registry
+from app.services.model_server import remote_op
+from app.services.batching import MicroBatcher
 
 def get_yolo_model():
-    """Lazy load YOLO model"""
-    global _yolo_model
-    if _yolo_model is None:
-        model_name = os.getenv("YOLO_MODEL", "yolov8n.pt")  # nano model (smallest)
-        print(f"Loading YOLO model: {model_name}")
-        _yolo_model = YOLO(model_name)
-    return _yolo_model
+    """YOLO model from the shared registry (loaded on first use)"""
+    return registry.get("yolo")
 
-def detect_objects(image_path: str, confidence_threshold: float = 0.25) -> Dict:
-    """
-    Detect objects in an image using YOLOv8
-    
-    Args:
-        image_path: Path to image file
-        confidence_threshold: Minimum confidence for detections (0-1)
-    
-    Returns:
-        Dict with detected objects, counts, and metadata
-    """
-    model = get_yolo_model()
-    
-    # Run inference
-    results = model.predict(
-        source=image_path,
-        conf=confidence_threshold,
-        verbose=False
-    )
+# Frames/images per YOLO predict call; concurrent callers share batches
+DETECTION_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", "8"))
+DETECTION_BATCH_WAIT_MS = float(os.getenv("DETECTION_BATCH_WAIT_MS", "10"))
+# Default minimum confidence of reported detections
+DETECTION_CONFIDENCE = 0.25
+
+def summarize_result(result, confidence_threshold: float) -> Dict:
+    """Convert one YOLO result to the detection payload, reading all boxes at once"""
+    boxes = result.boxes
+    xyxy = boxes.xyxy.cpu().numpy()
+    confidences = boxes.conf.cpu().numpy()
+    class_ids = boxes.cls.cpu().numpy().astype(int)
+    
+    # The batch ran at the lowest threshold of its items
+    keep = confidences >= confidence_threshold
+    xyxy, confidences, class_ids = xyxy[keep], confidences[keep], class_ids[keep]
+    
+    xs = xyxy[:, 0].astype(int)
+    ys = xyxy[:, 1].astype(int)
+    widths = (xyxy[:, 2] - xyxy[:, 0]).astype(int)
+    heights = (xyxy[:, 3] - xyxy[:, 1]).astype(int)
     
-    # Extract results
     detections = []
     class_counts = {}
     
-    for result in results:
-        boxes = result.boxes
-        
-        for box in boxes:
-            # Get box coordinates
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-            
-            # Get class and confidence
-            cls_id = int(box.cls[0].cpu().numpy())
-            confidence = float(box.conf[0].cpu().numpy())
-            class_name = result.names[cls_id]
-            
-            detection = {
-                "label": class_name,
-                "confidence": round(confidence, 3),
-                "bbox": {
-                    "x": int(x1),
-                    "y": int(y1),
-                    "width": int(x2 - x1),
-                    "height": int(y2 - y1)
-                }
+    for i, cls_id in enumerate(class_ids.tolist()):
+        class_name = result.names[cls_id]
+        detections.append({
+            "label": class_name,
+            "confidence": round(float(confidences[i]), 3),
+            "bbox": {
+                "x": int(xs[i]),
+                "y": int(ys[i]),
+                "width": int(widths[i]),
+                "height": int(heights[i])
             }
-            
-            detections.append(detection)
-            
-            # Count occurrences
-            class_counts[class_name] = class_counts.get(class_name, 0) + 1
+        })
+        
+        # Count occurrences
+        class_counts[class_name] = class_counts.get(class_name, 0) + 1
     
-    # Get image dimensions
-    img = Image.open(image_path)
-    width, height = img.size
-    img.close()
+    # Image dimensions from the decoded input (avoids reopening the file)
+    height, width = result.orig_shape
     
     return {
         "detections": detections,
@@ -86,7 +67,66 @@ def detect_objects(image_path: str, confidence_threshold: float = 0.25) -> Dict:
         "confidence_threshold": confidence_threshold
     }
 
-def detect_objects_batch(image_paths: List[str], confidence_threshold: float = 0.25) -> List[Dict]:
+def predict_batch(items: List[Tuple[np.ndarray, float]]) -> List[Dict]:
+    """Run one YOLO predict over (image array, confidence threshold) pairs"""
+    model = get_yolo_model()
+    
+    results = model.predict(
+        source=[image for image, _ in items],
+        conf=min(threshold for _, threshold in items),
+        verbose=False
+    )
+    
+    return [summarize_result(result, threshold) for result, (_, threshold) in zip(results, items)]
+
+detection_batcher = MicroBatcher("detect", predict_batch, DETECTION_BATCH_SIZE, DETECTION_BATCH_WAIT_MS)
+
+@remote_op("detect_arrays", serialize=False)
+def detect_arrays(images: List[np.ndarray], confidence_threshold: float = DETECTION_CONFIDENCE) -> List[Dict]:
+    """
+    Detect objects in decoded images (BGR uint8 arrays), e.g. video frames
+    Images are predicted in batches of DETECTION_BATCH_SIZE
+    
+    Returns:
+        List of detection results (one per image)
+    """
+    return detection_batcher.map([(image, confidence_threshold) for image in images])
+
+def detect_images(images: List[DecodedImage], confidence_threshold: float = DETECTION_CONFIDENCE) -> List[Dict]:
+    """
+    Detect objects in decoded images using their YOLO-sized variant
+    Boxes and dimensions are scaled back to each image's original size
+    """
+    arrays = [image.bgr() for image in images]
+    results = detect_arrays(arrays, confidence_threshold)
+    
+    for image, array, result in zip(images, arrays, results):
+        scale_x = image.width / array.shape[1]
+        scale_y = image.height / array.shape[0]
+        for detection in result["detections"]:
+            bbox = detection["bbox"]
+            bbox["x"] = int(bbox["x"] * scale_x)
+            bbox["y"] = int(bbox["y"] * scale_y)
+            bbox["width"] = int(bbox["width"] * scale_x)
+            bbox["height"] = int(bbox["height"] * scale_y)
+        result["image_dimensions"] = {"width": image.width, "height": image.height}
+    
+    return results
+
+def detect_objects(image_path: str, confidence_threshold: float = DETECTION_CONFIDENCE) -> Dict:
+    """
+    Detect objects in an image using YOLOv8
+    
+    Args:
+        image_path: Path to image file
+        confidence_threshold: Minimum confidence for detections (0-1)
+    
+    Returns:
+        Dict with detected objects, counts, and metadata
+    """
+    return detect_images([DecodedImage.open(image_path)], confidence_threshold)[0]
+
+def detect_objects_batch(image_paths: List[str], confidence_threshold: float = DETECTION_CONFIDENCE) -> List[Dict]:
     """
     Detect objects in multiple images (batch processing)
     More efficient than calling detect_objects individually
@@ -98,56 +138,11 @@ def detect_objects_batch(image_paths: List[str], confidence_threshold: float = 0
     Returns:
         List of detection results (one per image)
     """
-    model = get_yolo_model()
-    
-    # Run batch inference
-    results = model.predict(
-        source=image_paths,
-        conf=confidence_threshold,
-        verbose=False
-    )
+    images = [DecodedImage.open(path) for path in image_paths]
+    all_detections = detect_images(images, confidence_threshold)
     
-    all_detections = []
-    
-    for idx, result in enumerate(results):
-        detections = []
-        class_counts = {}
-        
-        boxes = result.boxes
-        
-        for box in boxes:
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-            cls_id = int(box.cls[0].cpu().numpy())
-            confidence = float(box.conf[0].cpu().numpy())
-            class_name = result.names[cls_id]
-            
-            detection = {
-                "label": class_name,
-                "confidence": round(confidence, 3),
-                "bbox": {
-                    "x": int(x1),
-                    "y": int(y1),
-                    "width": int(x2 - x1),
-                    "height": int(y2 - y1)
-                }
-            }
-            
-            detections.append(detection)
-            class_counts[class_name] = class_counts.get(class_name, 0) + 1
-        
-        # Get image dimensions
-        img = Image.open(image_paths[idx])
-        width, height = img.size
-        img.close()
-        
-        all_detections.append({
-            "image_path": image_paths[idx],
-            "detections": detections,
-            "total_objects": len(detections),
-            "object_counts": class_counts,
-            "unique_classes": len(class_counts),
-            "image_dimensions": {"width": width, "height": height}
-        })
+    for image_path, result in zip(image_paths, all_detections):
+        result["image_path"] = image_path
     
     return all_detections
 
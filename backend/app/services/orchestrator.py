@@ -1,18 +1,46 @@
 """
 Orchestrator service - coordinates all analysis pipelines
 """
-from app.services.image_service import analyze_image
-from app.services.audio_service import analyze_audio
-from app.services.video_service import analyze_video
+from app.services.image_service import build_image_stages, assemble_image_result
+from app.services.audio_service import VAD_ENABLED, decode_pcm, detect_voice_activity, stream_transcription
+from app.services.sentiment_service import analyze_sentiment, unknown_sentiment
+from app.services.video_service import build_video_stages, assemble_video_result
 from app.services.text_service import analyze_text
+from app.services.pipeline import Stage, run_stages
 from app.services.llm_service import summarize_analysis
+from app.services.dedup_service import mark_processed, get_analysis_key
+from app.services.embedding_index import index_media
+from app.services.storage_service import create_scratch, release_scratch
 from app.utils.file_validation import detect_media_type
+from app.utils.probe import probe_media, save_probe, load_probe
 from app.models.db import Media, Analysis, TranscriptSegment, Report
+from app.models.jobs import StageCheckpoint
 from app.utils.websocket_manager import manager
+from app.utils.database import SessionLocal
 from sqlalchemy.orm import Session
 import json
 import os
 import asyncio
+import time
+
+# Human-readable progress messages per stage
+STAGE_LABELS = {
+    "probe": "Media probe",
+    "audio_decode": "Audio decoding",
+    "vad": "Voice activity detection",
+    "transcribe": "Transcription",
+    "sentiment": "Sentiment analysis",
+    "frame_extract": "Frame extraction",
+    "keyframes": "Keyframe selection",
+    "decode": "Image decoding",
+    "frame_decode": "Frame decoding",
+    "caption": "Captioning",
+    "detect": "Object detection",
+    "embed": "Similarity embedding",
+    "tags": "Tagging",
+    "text": "Text extraction",
+    "summarize": "Summary",
+}
 
 async def start_processing(db: Session, media_id: str, file_path: str, storage_dir: str):
     """
@@ -26,6 +54,7 @@ async def start_processing(db: Session, media_id: str, file_path: str, storage_d
         storage_dir: Storage directory for temp files
     """
     print(f"🚀 Starting processing for {media_id}")
+    started_at = time.perf_counter()
     
     try:
         # Send initial progress
@@ -36,56 +65,68 @@ async def start_processing(db: Session, media_id: str, file_path: str, storage_d
         if not media:
             raise ValueError(f"Media {media_id} not found")
         
-        # Detect media type
+        # Read the upload-time probe (probing here only for records created without one)
+        probe = ensure_probe(db, media, file_path)
         media_type = media.media_type
         
-        # Run appropriate analysis
-        if media_type == "image":
-            await manager.send_progress_update(media_id, "image", 20, "Analyzing image...")
-            result = analyze_image(file_path)
-            stage = "image"
-        elif media_type == "audio":
-            await manager.send_progress_update(media_id, "audio", 20, "Transcribing audio...")
-            result = analyze_audio(file_path)
-            stage = "audio"
-            # Save transcript segments
-            save_transcript_segments(db, media_id, result.get("segments", []))
-            await manager.send_progress_update(media_id, "audio", 60, "Analyzing sentiment...")
-        elif media_type == "video":
-            await manager.send_progress_update(media_id, "video", 20, "Extracting frames and audio...")
-            result = analyze_video(file_path, storage_dir)
-            stage = "video"
-            # Save transcript segments if audio was analyzed
-            if "audio" in result and "segments" in result["audio"]:
-                save_transcript_segments(db, media_id, result["audio"]["segments"])
-            await manager.send_progress_update(media_id, "video", 70, "Analyzing frames...")
-        elif media_type == "text":
-            print(f"DEBUG: Processing text file {file_path}")
-            await manager.send_progress_update(media_id, "text", 20, "Reading text content...")
-            result = analyze_text(file_path)
-            print(f"DEBUG: Text analysis result: {result}")
-            stage = "text"
-            await manager.send_progress_update(media_id, "text", 80, "Text processed")
-        else:
-            raise ValueError(f"Unknown media type: {media_type}")
+        # Build the stage graph for this media type
+        stages, assemble = build_analysis_graph(db, media_id, media_type, file_path, storage_dir, probe)
+        
+        def summarize_stage(results):
+            # Summarizes whatever branches succeeded
+            return summarize_analysis(assemble(results, {}))
+        
+        # Ordered after every stage that contributes to the payload
+        stages.append(Stage(
+            "summarize", summarize_stage,
+            after=tuple(stage.name for stage in stages if stage.checkpoint),
+            executor="llm",
+            checkpoint=True
+        ))
+        checkpointed = {stage.name for stage in stages if stage.checkpoint}
+        
+        # Resume from stages a previous attempt already completed
+        analysis_key = get_analysis_key(media_type)
+        restored = load_checkpoints(db, media_id, analysis_key)
+        completed = list(restored)
+        if restored:
+            print(f"♻️ Resuming {media_id} with completed stages: {', '.join(completed)}")
+        if media_type in ("audio", "video") and "transcribe" not in restored:
+            # Segments streamed by an interrupted attempt (or an earlier analysis) are rewritten
+            clear_transcript_segments(db, media_id)
+            db.commit()
+        
+        async def on_stage_complete(name, value):
+            completed.append(name)
+            
+            # Persist each stage as it finishes so a crash only loses in-flight work
+            if name in checkpointed:
+                save_checkpoint(db, media_id, name, value, analysis_key)
+                db.commit()
+            
+            progress = 10 + int(80 * len(completed) / len(stages))
+            await manager.send_progress_update(media_id, name, progress, f"{STAGE_LABELS.get(name, name)} complete")
+        
+        await manager.send_progress_update(media_id, media_type, 10, f"Analyzing {media_type}...")
+        results, errors = await run_stages(stages, on_stage_complete, completed=restored)
+        
+        result = assemble(results, errors)
         
         # Save analysis to database
-        await manager.send_progress_update(media_id, "saving", 80, "Saving results...")
+        await manager.send_progress_update(media_id, "saving", 90, "Saving results...")
         
         analysis = Analysis(
             media_id=media_id,
-            stage=stage,
+            stage=media_type,
             payload=result
         )
         db.add(analysis)
         
-        # Generate summary report using LLM
-        await manager.send_progress_update(media_id, "summarizing", 90, "Generating summary...")
-        
-        try:
-            summary = summarize_analysis(result)
-        except Exception as e:
-            print(f"Summary generation failed: {e}")
+        # Summary report generated by the LLM stage
+        if "summarize" in results:
+            summary = results["summarize"]
+        else:
+            print(f"Summary generation failed: {errors.get('summarize')}")
             summary = f"Analysis completed for {media_type}"
         
         report = Report(
@@ -94,8 +135,20 @@ async def start_processing(db: Session, media_id: str, file_path: str, storage_d
         )
         db.add(report)
         
+        # Only a complete analysis is reused for identical uploads
+        if errors:
+            print(f"⚠️ {media_id} finished with failed stages ({', '.join(errors)}), not reusable for duplicates")
+        else:
+            mark_processed(db, media_id, round(time.perf_counter() - started_at, 2))
+        
+        # Stage outputs now live in the Analysis/Report rows
+        clear_checkpoints(db, media_id)
+        
         db.commit()
         
+        # Make the image/keyframes findable by similarity search
+        index_media(media_id, results.get("embed"))
+        
         # Send completion via WebSocket
         await manager.send_progress_update(media_id, "complete", 100, "Analysis complete!")
         await manager.send_analysis_complete(media_id, result)
@@ -118,6 +171,134 @@ async def start_processing(db: Session, media_id: str, file_path: str, storage_d
         db.add(error_analysis)
         db.commit()
         raise
+    finally:
+        # Scratch data (e.g. extracted audio) is never needed after the job
+        try:
+            release_scratch(db, media_id)
+        except Exception as e:
+            print(f"Scratch cleanup failed for {media_id}: {e}")
+
+def build_analysis_graph(db: Session, media_id: str, media_type: str, file_path: str, storage_dir: str, probe: dict):
+    """
+    Stage graph and payload assembler for a media type
+    Returns: (stages, assemble(results, errors) -> payload)
+    """
+    if media_type == "image":
+        return build_image_stages(file_path), assemble_image_result
+    
+    if media_type == "video":
+        # Tracked so it is removed when the job ends (or by the sweeper if the worker dies)
+        work_dir = create_scratch(db, storage_dir, media_id, media_id)
+        on_segments = transcript_streamer(media_id, asyncio.get_running_loop())
+        watched = lambda: manager.has_clients(media_id)
+        return build_video_stages(file_path, storage_dir, probe, work_dir, on_segments, watched), assemble_video_result
+    
+    if media_type == "audio":
+        # The audio is decoded once into scratch and memory-mapped by VAD and Whisper
+        work_dir = create_scratch(db, storage_dir, media_id, media_id)
+        # Transcript segments are stored and pushed to clients as they are transcribed,
+        # in short windows only while a client is connected
+        on_segments = transcript_streamer(media_id, asyncio.get_running_loop())
+        watched = lambda: manager.has_clients(media_id)
+        stages = [
+            Stage("audio_decode", lambda results: decode_pcm(file_path, work_dir), executor="ffmpeg"),
+            # Only detected speech is transcribed
+            Stage("transcribe", lambda results: stream_transcription(
+                      results["audio_decode"]["path"], results["vad"]["intervals"] if VAD_ENABLED else None, on_segments, watched),
+                  deps=("audio_decode", "vad") if VAD_ENABLED else ("audio_decode",), executor="audio", checkpoint=True),
+            Stage("sentiment", lambda results: analyze_sentiment(results["transcribe"]["transcript"], results["transcribe"]["segments"]),
+                  deps=("transcribe",), executor="text", checkpoint=True),
+        ]
+        if VAD_ENABLED:
+            stages.insert(1, Stage("vad", lambda results: detect_voice_activity(results["audio_decode"]["path"]),
+                                   deps=("audio_decode",), executor="ffmpeg", checkpoint=True))
+        return stages, assemble_audio_result
+    
+    if media_type == "text":
+        stages = [Stage("text", lambda results: analyze_text(file_path), executor="text", checkpoint=True)]
+        return stages, assemble_text_result
+    
+    raise ValueError(f"Unknown media type: {media_type}")
+
+def assemble_audio_result(results: dict, errors: dict) -> dict:
+    """Combine transcription and sentiment into the audio analysis payload"""
+    if "transcribe" not in results:
+        raise errors.get("transcribe") or RuntimeError("Transcription unavailable")
+    
+    result = dict(results["transcribe"])
+    # Duration of the decoded samples (the decode itself is not checkpointed, VAD is)
+    decoded = results.get("vad") or results.get("audio_decode")
+    if decoded is not None:
+        result["duration"] = decoded["duration"]
+    if "vad" in results:
+        result["speech_ratio"] = results["vad"]["speech_ratio"]
+    result["sentiment"] = results.get("sentiment") or unknown_sentiment()
+    return result
+
+def assemble_text_result(results: dict, errors: dict) -> dict:
+    """Text analysis payload"""
+    if "text" not in results:
+        raise errors.get("text") or RuntimeError("Text extraction unavailable")
+    return results["text"]
+
+def load_checkpoints(db: Session, media_id: str, analysis_key: str) -> dict:
+    """Stage outputs saved by earlier attempts with the same models/parameters"""
+    rows = db.query(StageCheckpoint).filter(
+        StageCheckpoint.media_id == media_id,
+        StageCheckpoint.analysis_key == analysis_key
+    ).all()
+    return {row.stage: row.payload for row in rows}
+
+def save_checkpoint(db: Session, media_id: str, stage: str, payload, analysis_key: str):
+    """Persist one completed stage's output"""
+    db.merge(StageCheckpoint(
+        media_id=media_id,
+        stage=stage,
+        analysis_key=analysis_key,
+        payload=payload
+    ))
+
+def clear_checkpoints(db: Session, media_id: str):
+    """Drop checkpoints once the full analysis is saved"""
+    db.query(StageCheckpoint).filter(StageCheckpoint.media_id == media_id).delete()
+
+def ensure_probe(db: Session, media: Media, file_path: str) -> dict:
+    """Load the media's probe record, creating it once if missing"""
+    probe = load_probe(db, media.id)
+    if probe is not None:
+        return probe
+    
+    # e.g. batch uploads, which are stored before their type is known
+    if media.media_type in (None, "", "unknown"):
+        media.media_type = detect_media_type(file_path)
+    
+    probe = probe_media(file_path, media.media_type)
+    media.duration = probe.get("duration")
+    media.width = probe.get("width")
+    media.height = probe.get("height")
+    save_probe(db, media.id, probe)
+    db.commit()
+    return probe
+
+def transcript_streamer(media_id: str, loop: asyncio.AbstractEventLoop):
+    """
+    Callback for the transcription thread: saves each batch of segments in its own
+    session and sends it to clients as a transcript_partial event
+    """
+    def on_segments(segments: list):
+        db = SessionLocal()
+        try:
+            save_transcript_segments(db, media_id, segments)
+            db.commit()
+        finally:
+            db.close()
+        asyncio.run_coroutine_threadsafe(manager.send_transcript_partial(media_id, segments), loop)
+    
+    return on_segments
+
+def clear_transcript_segments(db: Session, media_id: str):
+    """Drop a media item's stored transcript segments"""
+    db.query(TranscriptSegment).filter(TranscriptSegment.media_id == media_id).delete()
 
 def save_transcript_segments(db: Session, media_id: str, segments: list):
     """Save transcript segments to database"""
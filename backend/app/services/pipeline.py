@@ -0,0 +1,163 @@
+"""
+Stage DAG scheduler
+Analysis is expressed as stages with dependencies; independent branches run
+concurrently, each on the executor for the kind of work it does
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import os
+import time
+
+# Default thread count per executor - models get one thread each so branches run
+# side by side without two jobs fighting over the same model instance
+EXECUTOR_THREADS = {
+    "ffmpeg": 2,   # subprocess-bound extraction
+    "audio": 1,    # Whisper
+    "vision": 1,   # BLIP captioning
+    "embed": 1,    # CLIP embeddings
+    "detect": 1,   # YOLO
+    "text": 1,     # sentiment / light CPU work
+    "llm": 1,      # summary generation
+}
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    """Shared executor for a kind of work (size configurable via PIPELINE_<NAME>_THREADS)"""
+    if name not in _executors:
+        threads = int(os.getenv(f"PIPELINE_{name.upper()}_THREADS", EXECUTOR_THREADS.get(name, 1)))
+        _executors[name] = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"stage-{name}")
+    return _executors[name]
+
+class Stage:
+    """
+    One unit of analysis: fn receives the results of all completed stages by name
+    deps must succeed before the stage runs; after only orders it (the stage
+    still runs if those fail, e.g. a summary over whatever branches succeeded)
+    checkpoint marks stages whose (JSON) output is persisted and feeds the
+    final payload; intermediate stages only run when a later stage needs them
+    """
+
+    def __init__(self, name: str, fn: Callable[[Dict[str, Any]], Any],
+                 deps: Tuple[str, ...] = (), executor: str = "text",
+                 after: Tuple[str, ...] = (), checkpoint: bool = False):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.after = tuple(after)
+        self.executor = executor
+        self.checkpoint = checkpoint
+
+    @property
+    def upstream(self) -> Tuple[str, ...]:
+        return self.deps + self.after
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, deps={self.deps}, executor={self.executor!r})"
+
+class StageSkipped(Exception):
+    """Raised for stages whose dependency failed"""
+
+def topological_order(stages: List[Stage]) -> List[Stage]:
+    """Order stages so every stage comes after its dependencies; validates the graph"""
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("Duplicate stage names")
+
+    for stage in stages:
+        for dep in stage.upstream:
+            if dep not in by_name:
+                raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+
+    ordered = []
+    state: Dict[str, str] = {}
+
+    def visit(stage: Stage):
+        if state.get(stage.name) == "done":
+            return
+        if state.get(stage.name) == "visiting":
+            raise ValueError(f"Dependency cycle at stage {stage.name}")
+        state[stage.name] = "visiting"
+        for dep in stage.upstream:
+            visit(by_name[dep])
+        state[stage.name] = "done"
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+def stages_to_run(stages: List[Stage], completed: Dict[str, Any]) -> Set[str]:
+    """
+    Names of stages that still have to run given already-completed (checkpointed) results
+    A stage runs if it is not completed and its output is part of the result
+    (checkpoint/sink) or a stage that runs is waiting on it
+    """
+    downstream: Dict[str, List[str]] = {stage.name: [] for stage in stages}
+    for stage in stages:
+        for dep in stage.upstream:
+            downstream[dep].append(stage.name)
+
+    needed: Set[str] = set()
+
+    # Consumers come before their inputs in reverse topological order
+    for stage in reversed(topological_order(stages)):
+        if stage.name in completed:
+            continue
+        is_output = stage.checkpoint or not downstream[stage.name]
+        if is_output or any(consumer in needed for consumer in downstream[stage.name]):
+            needed.add(stage.name)
+    return needed
+
+async def run_stages(
+    stages: List[Stage],
+    on_stage_complete: Optional[Callable[[str, Any], Awaitable[None]]] = None,
+    completed: Optional[Dict[str, Any]] = None
+) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+    """
+    Run a stage graph, starting each stage as soon as its dependencies finish
+    Stages in completed (e.g. restored checkpoints) are not run again, nor are
+    intermediate stages that only fed them
+    Returns: (results by stage name, errors by stage name)
+    A failed stage does not stop independent branches; its dependents are skipped
+    """
+    ordered = topological_order(stages)
+    loop = asyncio.get_running_loop()
+    results: Dict[str, Any] = dict(completed or {})
+    errors: Dict[str, Exception] = {}
+    tasks: Dict[str, asyncio.Task] = {}
+    needed = stages_to_run(stages, results)
+
+    async def run(stage: Stage):
+        # Wait for upstream stages (created earlier thanks to topological order)
+        if stage.upstream:
+            await asyncio.gather(*(tasks[dep] for dep in stage.upstream))
+
+        if stage.name not in needed:
+            return
+
+        failed = [dep for dep in stage.deps if dep in errors]
+        if failed:
+            errors[stage.name] = StageSkipped(f"{stage.name} skipped: {', '.join(failed)} failed")
+            return
+
+        started = time.perf_counter()
+        try:
+            value = await loop.run_in_executor(get_executor(stage.executor), stage.fn, results)
+        except Exception as e:
+            print(f"Stage {stage.name} failed: {e}")
+            errors[stage.name] = e
+            return
+
+        results[stage.name] = value
+        print(f"⏱️ Stage {stage.name} finished in {time.perf_counter() - started:.2f}s")
+
+        if on_stage_complete is not None:
+            await on_stage_complete(stage.name, value)
+
+    for stage in ordered:
+        tasks[stage.name] = asyncio.ensure_future(run(stage))
+
+    await asyncio.gather(*tasks.values())
+    return results, errors
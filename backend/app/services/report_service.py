@@ -91,6 +91,11 @@ def generate_pdf_report(media_data: Dict, analysis: Dict, chat_history: list, ou
         story.append(Paragraph(f"<b>Caption:</b> {analysis['caption']}", styles['Normal']))
         story.append(Spacer(1, 0.1 * inch))
     
+    if analysis.get('tags'):
+        tags = ", ".join(t['tag'] for t in analysis['tags'])
+        story.append(Paragraph(f"<b>Tags:</b> {tags}", styles['Normal']))
+        story.append(Spacer(1, 0.1 * inch))
+    
     if analysis.get('transcript'):
         story.append(Paragraph("<b>Transcript:</b>", styles['Normal']))
         # Truncate if too long
@@ -203,6 +208,10 @@ def generate_markdown_report(media_data: Dict, analysis: Dict, chat_history: lis
         md_lines.append(f"**Caption:** {analysis['caption']}")
         md_lines.append("")
     
+    if analysis.get('tags'):
+        md_lines.append(f"**Tags:** {', '.join(t['tag'] for t in analysis['tags'])}")
+        md_lines.append("")
+    
     if analysis.get('transcript'):
         md_lines.append("**Transcript:**")
         md_lines.append("")
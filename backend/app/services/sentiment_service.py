@@ -0,0 +1,94 @@
+"""
+Sentiment analysis service (DistilBERT SST-2)
+Scores every transcript segment in length-sorted batches and aggregates them
+into an overall label weighted by how long each segment lasts
+"""
+import os
+from typing import Dict, List, Optional
+from app.services.model_registry import registry
+from app.services.model_server import remote_op
+
+# Texts per pipeline call; sorted by length so each batch pads little
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "32"))
+# Plain text without segments is scored in windows of this many words
+SENTIMENT_WINDOW_WORDS = 200
+
+def unknown_sentiment() -> Dict:
+    """Result when scoring failed - same keys as a scored one"""
+    return {"label": "unknown", "score": 0.0, "polarity": 0.0, "timeline": []}
+
+def get_sentiment_analyzer():
+    """Sentiment analyzer from the shared registry (loaded on first use)"""
+    return registry.get("sentiment")
+
+@remote_op("sentiment")
+def analyze_sentiment(text: str, segments: Optional[List[Dict]] = None) -> Dict:
+    """
+    Sentiment of a whole transcript
+    With segments (text/start/end), each one is scored and the overall label is
+    the duration-weighted average; otherwise the text is scored in word windows
+    Returns: dict with label, score, polarity (-1..1) and a per-segment timeline
+    """
+    if segments:
+        units = [seg for seg in segments if seg.get("text", "").strip()]
+        weights = [max(seg["end"] - seg["start"], 0.0) for seg in units]
+    else:
+        words = text.split()
+        units = [
+            {"text": " ".join(words[i:i + SENTIMENT_WINDOW_WORDS])}
+            for i in range(0, len(words), SENTIMENT_WINDOW_WORDS)
+        ]
+        weights = [len(unit["text"].split()) for unit in units]
+
+    if not units:
+        return {"label": "neutral", "score": 0.0, "polarity": 0.0, "timeline": []}
+
+    try:
+        positive = score_texts([unit["text"] for unit in units])
+    except Exception as e:
+        print(f"Sentiment analysis failed: {e}")
+        return unknown_sentiment()
+
+    timeline = []
+    if segments:
+        for seg, p in zip(units, positive):
+            label = "positive" if p >= 0.5 else "negative"
+            timeline.append({
+                "start": seg["start"],
+                "end": seg["end"],
+                "label": label,
+                "score": round(p if label == "positive" else 1 - p, 3)
+            })
+
+    result = aggregate_sentiment(positive, weights)
+    result["timeline"] = timeline
+    return result
+
+def score_texts(texts: List[str]) -> List[float]:
+    """Probability of positive sentiment for each text, in batched pipeline calls"""
+    analyzer = get_sentiment_analyzer()
+
+    # Similar lengths share a batch (less padding); results are put back in order
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    outputs = analyzer([texts[i] for i in order], batch_size=SENTIMENT_BATCH_SIZE, truncation=True)
+
+    positive = [0.0] * len(texts)
+    for i, output in zip(order, outputs):
+        # Binary model: the other label has the remaining probability
+        positive[i] = output["score"] if output["label"].upper() == "POSITIVE" else 1 - output["score"]
+    return positive
+
+def aggregate_sentiment(positive: List[float], weights: List[float]) -> Dict:
+    """Weighted average of per-unit positive probabilities as label, score and polarity"""
+    total = sum(weights)
+    if total <= 0:
+        weights = [1.0] * len(positive)
+        total = float(len(positive))
+
+    mean = sum(p * w for p, w in zip(positive, weights)) / total
+    label = "positive" if mean >= 0.5 else "negative"
+    return {
+        "label": label,
+        "score": round(mean if label == "positive" else 1 - mean, 3),
+        "polarity": round(2 * mean - 1, 3)
+    }
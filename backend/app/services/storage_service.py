@@ -0,0 +1,357 @@
+"""
+Storage lifecycle manager
+Tracks every file a media item creates (upload, scratch work dir, generated
+reports), deletes scratch data when its job finishes, keeps total usage under
+STORAGE_QUOTA_MB by evicting least recently used derived artifacts, and sweeps
+files it created that nothing references any more
+"""
+from app.models.db import Media
+from app.models.ingest import ContentIndex, UploadSession, UploadChunk
+from app.models.jobs import Job
+from app.models.storage import StorageArtifact
+from app.utils.file_lock import LeaderLock
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import asyncio
+import shutil
+import re
+import os
+
+STORAGE_PATH = os.getenv("STORAGE_PATH", "./storage")
+
+# Total disk budget for STORAGE_PATH (0 = unlimited)
+STORAGE_QUOTA_MB = float(os.getenv("STORAGE_QUOTA_MB", "0"))
+# Untracked files younger than this may belong to an upload/job in flight
+ORPHAN_MIN_AGE_SEC = float(os.getenv("STORAGE_ORPHAN_MIN_AGE_SEC", "3600"))
+SWEEP_INTERVAL_SEC = float(os.getenv("STORAGE_SWEEP_INTERVAL_SEC", "3600"))
+# Resumable uploads with no new chunk for this long are abandoned
+STAGING_TTL_SEC = float(os.getenv("STORAGE_STAGING_TTL_SEC", "86400"))
+
+# Categories that can be regenerated and are evicted to stay under the quota. Only
+# reports qualify: uploads are originals, scratch belongs to running jobs, and the
+# managed dirs below count towards usage but are never evicted
+DERIVED_CATEGORIES = ("report",)
+
+# Subdirectories owned by other components (reported in usage, never swept)
+MANAGED_DIRS = {
+    "index": "index",          # embedding index
+    "tag_banks": "tag_banks",  # cached label embeddings
+    "uploads": "staging",      # resumable upload staging files
+}
+REPORTS_DIR = "reports"
+
+# Names of the entries uploads, jobs and reports create; the sweeper never deletes
+# anything else (operator files, lock files, other components' dirs)
+_UUID = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+OWNED_NAME = re.compile(rf"^(temp_)?{_UUID}(\.[^.]+)?$")  # {media_id}{ext}, temp_{media_id}
+LEGACY_REPORT_NAME = re.compile(rf"^report_{_UUID}_\d{{8}}_\d{{6}}\.pdf$")  # before reports/ existed
+REPORT_NAME = re.compile(rf"^{_UUID}_[0-9a-f]+\.[a-z]+$")  # {media_id}_{fingerprint}.{ext}
+
+# Held by the one process (per STORAGE_PATH) that runs the periodic sweep
+sweeper_leader = LeaderLock(os.path.join(STORAGE_PATH, ".storage-sweeper.lock"))
+
+def path_size(path: str) -> int:
+    """Bytes used by a file or a directory tree (0 if missing)"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def remove_path(path: str):
+    """Delete a file or directory tree, ignoring paths that are already gone"""
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def normalize_path(path: str) -> str:
+    return os.path.abspath(path)
+
+def track(db: Session, path: str, category: str, media_id: Optional[str] = None) -> StorageArtifact:
+    """Record (or refresh the size of) a file or directory owned by media_id"""
+    artifact = db.merge(StorageArtifact(
+        path=normalize_path(path),
+        media_id=media_id,
+        category=category,
+        size_bytes=path_size(path),
+        last_accessed_at=datetime.utcnow()
+    ))
+    return artifact
+
+def touch(db: Session, path: str):
+    """Mark an artifact as used (moves it to the back of the eviction order)"""
+    db.query(StorageArtifact).filter(StorageArtifact.path == normalize_path(path)).update(
+        {StorageArtifact.last_accessed_at: datetime.utcnow()}, synchronize_session=False
+    )
+
+def forget(db: Session, artifact: StorageArtifact):
+    """Delete an artifact from disk and stop tracking it"""
+    remove_path(artifact.path)
+    db.delete(artifact)
+
+# --- Scratch data ---
+
+def scratch_path(storage_dir: str, key: str) -> str:
+    """Work directory for one analysis (e.g. extracted audio)"""
+    return os.path.join(storage_dir, f"temp_{key}")
+
+def create_scratch(db: Session, storage_dir: str, key: str, media_id: str) -> str:
+    """Create and track an analysis work directory"""
+    path = scratch_path(storage_dir, key)
+    os.makedirs(path, exist_ok=True)
+    track(db, path, "scratch", media_id)
+    db.commit()
+    return path
+
+def release_scratch(db: Session, media_id: str) -> int:
+    """Delete a media item's scratch directories once its job has finished"""
+    artifacts = db.query(StorageArtifact).filter(
+        StorageArtifact.media_id == media_id,
+        StorageArtifact.category == "scratch"
+    ).all()
+    for artifact in artifacts:
+        forget(db, artifact)
+    db.commit()
+    return len(artifacts)
+
+# --- Reports ---
+
+def report_path(media_id: str, fingerprint: str, extension: str) -> str:
+    """Cache location of a generated report for one version of a media item's analysis"""
+    return os.path.join(STORAGE_PATH, REPORTS_DIR, f"{media_id}_{fingerprint}.{extension}")
+
+def get_cached_report(db: Session, path: str) -> Optional[str]:
+    """Path of a previously generated report, if still on disk"""
+    artifact = db.query(StorageArtifact).filter(StorageArtifact.path == normalize_path(path)).first()
+    if artifact is None or not os.path.exists(artifact.path):
+        return None
+    touch(db, path)
+    db.commit()
+    return artifact.path
+
+def store_report(db: Session, media_id: str, path: str):
+    """Track a newly generated report, dropping superseded versions for the same media"""
+    stale = db.query(StorageArtifact).filter(
+        StorageArtifact.media_id == media_id,
+        StorageArtifact.category == "report",
+        StorageArtifact.path != normalize_path(path)
+    ).all()
+    for artifact in stale:
+        forget(db, artifact)
+    track(db, path, "report", media_id)
+    db.commit()
+    enforce_quota(db, keep=path)
+
+# --- Media files ---
+
+def get_media_path(db: Session, media_id: str) -> Optional[str]:
+    """Stored upload of a media item"""
+    artifact = db.query(StorageArtifact).filter(
+        StorageArtifact.media_id == media_id,
+        StorageArtifact.category == "media"
+    ).first()
+    if artifact is not None:
+        return artifact.path
+    # Uploads stored before artifacts were tracked
+    content = db.query(ContentIndex).filter(ContentIndex.media_id == media_id).first()
+    return content.file_path if content is not None else None
+
+def delete_media_files(db: Session, media_id: str) -> int:
+    """Delete every tracked file of a media item (upload, scratch, reports)"""
+    artifacts = db.query(StorageArtifact).filter(StorageArtifact.media_id == media_id).all()
+    for artifact in artifacts:
+        forget(db, artifact)
+
+    # Uploads stored before artifacts were tracked; the file can no longer be a dedup source
+    content = db.query(ContentIndex).filter(ContentIndex.media_id == media_id).first()
+    if content is not None:
+        remove_path(content.file_path)
+        db.delete(content)
+    return len(artifacts)
+
+# --- Quota ---
+
+def tracked_bytes(db: Session) -> int:
+    return int(db.query(func.coalesce(func.sum(StorageArtifact.size_bytes), 0)).scalar())
+
+def enforce_quota(db: Session, quota_mb: float = STORAGE_QUOTA_MB, keep: Optional[str] = None) -> int:
+    """
+    Evict least recently used derived artifacts until usage is under the quota
+    keep: artifact about to be served, never evicted
+    Returns: bytes freed
+    """
+    if quota_mb <= 0:
+        return 0
+    quota = int(quota_mb * 1024 * 1024)
+    usage = tracked_bytes(db) + sum(path_size(os.path.join(STORAGE_PATH, d)) for d in MANAGED_DIRS)
+    if usage <= quota:
+        return 0
+
+    freed = 0
+    candidates = db.query(StorageArtifact).filter(
+        StorageArtifact.category.in_(DERIVED_CATEGORIES),
+        StorageArtifact.path != normalize_path(keep or "")
+    ).order_by(StorageArtifact.last_accessed_at).all()
+    for artifact in candidates:
+        if usage - freed <= quota:
+            break
+        freed += artifact.size_bytes or 0
+        forget(db, artifact)
+    db.commit()
+
+    if usage - freed > quota:
+        print(f"⚠️ Storage usage {(usage - freed) / 1024 / 1024:.0f}MB exceeds quota {quota_mb:.0f}MB with no reports left to evict (uploads and the index are kept)")
+    elif freed:
+        print(f"🧹 Evicted {freed / 1024 / 1024:.1f}MB of derived artifacts to stay under the storage quota")
+    return freed
+
+# --- Usage ---
+
+def get_storage_usage(db: Session, storage_dir: str = STORAGE_PATH) -> Dict:
+    """Bytes and file counts per category"""
+    categories: Dict[str, Dict] = {}
+
+    def add(category: str, size: int, count: int = 1):
+        entry = categories.setdefault(category, {"count": 0, "bytes": 0})
+        entry["count"] += count
+        entry["bytes"] += size
+
+    rows = db.query(
+        StorageArtifact.category, func.count(), func.coalesce(func.sum(StorageArtifact.size_bytes), 0)
+    ).group_by(StorageArtifact.category).all()
+    for category, count, size in rows:
+        add(category, int(size), count)
+
+    for directory, category in MANAGED_DIRS.items():
+        path = os.path.join(storage_dir, directory)
+        if os.path.exists(path):
+            add(category, path_size(path))
+
+    total = sum(entry["bytes"] for entry in categories.values())
+    quota = int(STORAGE_QUOTA_MB * 1024 * 1024)
+    return {
+        "total_bytes": total,
+        "quota_bytes": quota or None,
+        "quota_used": round(total / quota, 3) if quota else None,
+        "categories": categories
+    }
+
+# --- Orphan sweeper ---
+
+def sweep(db: Session, storage_dir: str = STORAGE_PATH, min_age: float = ORPHAN_MIN_AGE_SEC) -> Dict:
+    """
+    Remove storage nothing references any more:
+      - tracked artifacts whose media was deleted, or whose file is gone
+      - scratch dirs of media with no queued/running job (crashed workers)
+      - abandoned resumable upload sessions
+      - untracked uploads, temp files and reports older than min_age (failed
+        uploads, legacy reports) - only names matching OWNED_NAME/REPORT_NAME
+    Untracked uploads of existing media are adopted instead of deleted
+    """
+    stats = {"artifacts": 0, "scratch": 0, "staging": 0, "untracked": 0, "adopted": 0, "bytes": 0}
+    now = datetime.utcnow()
+    media_ids = {row[0] for row in db.query(Media.id).all()}
+    active = {row[0] for row in db.query(Job.media_id).filter(Job.status.in_(("queued", "running"))).all()}
+
+    for artifact in db.query(StorageArtifact).all():
+        if not os.path.exists(artifact.path):
+            db.delete(artifact)
+        elif artifact.media_id is not None and artifact.media_id not in media_ids:
+            stats["artifacts"] += 1
+            stats["bytes"] += artifact.size_bytes or 0
+            forget(db, artifact)
+        elif artifact.category == "scratch" and artifact.media_id not in active:
+            stats["scratch"] += 1
+            stats["bytes"] += path_size(artifact.path)
+            forget(db, artifact)
+    db.commit()
+
+    # Resumable uploads nobody has touched for STAGING_TTL_SEC
+    cutoff = now - timedelta(seconds=STAGING_TTL_SEC)
+    for session in db.query(UploadSession).filter(
+        UploadSession.status == "active", UploadSession.updated_at < cutoff
+    ).all():
+        stats["staging"] += 1
+        if os.path.exists(session.staging_path):
+            stats["bytes"] += path_size(session.staging_path)
+            remove_path(session.staging_path)
+        session.status = "aborted"
+        db.query(UploadChunk).filter(UploadChunk.upload_id == session.id).delete()
+    db.commit()
+
+    # Uploads, temp files and reports at the known locations must be referenced
+    known = {row[0] for row in db.query(StorageArtifact.path).all()}
+    known |= {normalize_path(row[0]) for row in db.query(ContentIndex.file_path).all()}
+    entries: List[str] = []
+    if os.path.isdir(storage_dir):
+        entries = [os.path.join(storage_dir, name) for name in os.listdir(storage_dir)
+                   if OWNED_NAME.match(name) or LEGACY_REPORT_NAME.match(name)]
+    reports_dir = os.path.join(storage_dir, REPORTS_DIR)
+    if os.path.isdir(reports_dir):
+        entries += [os.path.join(reports_dir, name) for name in os.listdir(reports_dir) if REPORT_NAME.match(name)]
+
+    for path in entries:
+        path = normalize_path(path)
+        if path in known:
+            continue
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if stem in media_ids and os.path.isfile(path):
+            # Upload stored before artifacts were tracked
+            track(db, path, "media", stem)
+            stats["adopted"] += 1
+            continue
+        if stem.startswith("temp_") and stem[len("temp_"):] in active:
+            continue
+        try:
+            age = now.timestamp() - os.path.getmtime(path)
+        except OSError:
+            continue
+        if age >= min_age:
+            stats["untracked"] += 1
+            stats["bytes"] += path_size(path)
+            remove_path(path)
+    db.commit()
+
+    enforce_quota(db)
+    if any(stats[key] for key in ("artifacts", "scratch", "staging", "untracked")):
+        print(f"🧹 Storage sweep freed {stats['bytes'] / 1024 / 1024:.1f}MB: {stats}")
+    return stats
+
+async def run_sweeper(interval: float = SWEEP_INTERVAL_SEC, leader: LeaderLock = sweeper_leader):
+    """
+    Periodic orphan sweep for the API process
+    With several API processes only the holder of the leader lock sweeps; the
+    others keep trying and take over when it exits
+    """
+    from app.utils.database import SessionLocal
+    while True:
+        await asyncio.sleep(interval)
+        db = SessionLocal()
+        try:
+            if not leader.file and leader.acquire():
+                print(f"👑 Process {os.getpid()} runs the storage sweeper")
+            if leader.file:
+                await asyncio.get_running_loop().run_in_executor(None, sweep, db)
+        except Exception as e:
+            print(f"Storage sweep failed: {e}")
+        finally:
+            db.close()
+
+if __name__ == "__main__":
+    # One sweep, e.g. from a cron job
+    from app.utils.database import SessionLocal, init_db
+    init_db()
+    db = SessionLocal()
+    try:
+        print(sweep(db))
+        print(get_storage_usage(db))
+    finally:
+        db.close()
@@ -0,0 +1,164 @@
+"""
+Zero-shot tagging with CLIP
+Image embeddings are scored against a bank of label text embeddings in one
+matrix product. The bank is encoded once per vocabulary file + CLIP model and
+cached on disk, so only a vocabulary or model change triggers re-encoding
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import threading
+import hashlib
+import os
+
+STORAGE_PATH = os.getenv("STORAGE_PATH", "./storage")
+CLIP_MODEL = "openai/clip-vit-base-patch32"
+
+DEFAULT_VOCABULARY_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "tag_vocabulary.txt")
+TAG_VOCABULARY_PATH = os.getenv("TAG_VOCABULARY_PATH") or DEFAULT_VOCABULARY_PATH
+TAG_PROMPT = os.getenv("TAG_PROMPT", "a photo of {}")
+TAG_TOP_K = int(os.getenv("TAG_TOP_K", "10"))
+# Tags below this probability are dropped (probabilities sum to 1 over the vocabulary)
+TAG_MIN_SCORE = float(os.getenv("TAG_MIN_SCORE", "0.01"))
+
+# Labels encoded per text-encoder call while building a bank
+LABEL_BATCH_SIZE = 256
+# CLIP's learned softmax temperature
+LOGIT_SCALE = 100.0
+
+def read_vocabulary(data: bytes) -> List[str]:
+    """One tag per line; blank lines, comments and duplicates are skipped"""
+    labels = []
+    seen = set()
+    for line in data.decode("utf-8").splitlines():
+        label = line.strip()
+        if label and not label.startswith("#") and label.lower() not in seen:
+            seen.add(label.lower())
+            labels.append(label)
+    return labels
+
+def encode_labels(texts: List[str]) -> List[np.ndarray]:
+    """CLIP text embeddings (imported lazily so the bank can be used without torch in tests)"""
+    from app.services.image_service import embed_texts
+    return embed_texts(texts)
+
+class LabelBank:
+    """
+    Label text embeddings for a vocabulary file
+    Cached on disk under a key of (vocabulary content, model, prompt); reloaded
+    in-process only when the vocabulary file changes
+    """
+
+    def __init__(self, vocabulary_path: str, model_name: str = CLIP_MODEL, prompt: str = TAG_PROMPT,
+                 cache_dir: Optional[str] = None, encoder: Callable[[List[str]], List[np.ndarray]] = encode_labels):
+        self.vocabulary_path = vocabulary_path
+        self.model_name = model_name
+        self.prompt = prompt
+        self.cache_dir = cache_dir or os.path.join(STORAGE_PATH, "tag_banks")
+        self.encoder = encoder
+        self.lock = threading.Lock()
+        self.labels: List[str] = []
+        self.matrix: Optional[np.ndarray] = None
+        self.key: Optional[str] = None
+        self._stat: Optional[Tuple[int, int]] = None
+
+    def fingerprint(self, data: bytes) -> str:
+        """Cache key: changes with the vocabulary content, the CLIP model or the prompt"""
+        digest = hashlib.sha256()
+        for part in (self.model_name.encode("utf-8"), self.prompt.encode("utf-8"), data):
+            digest.update(part)
+            digest.update(b"\0")
+        return digest.hexdigest()[:16]
+
+    def load(self) -> Tuple[List[str], np.ndarray]:
+        """Labels and their unit-normalized embedding matrix (labels x dim)"""
+        with self.lock:
+            stat = os.stat(self.vocabulary_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if self.matrix is not None and signature == self._stat:
+                return self.labels, self.matrix
+
+            with open(self.vocabulary_path, "rb") as f:
+                data = f.read()
+            key = self.fingerprint(data)
+            if key != self.key:
+                self.labels, self.matrix = self._load_or_build(key, read_vocabulary(data))
+                self.key = key
+            self._stat = signature
+            return self.labels, self.matrix
+
+    def _load_or_build(self, key: str, labels: List[str]) -> Tuple[List[str], np.ndarray]:
+        path = os.path.join(self.cache_dir, f"{key}.npz")
+        if os.path.exists(path):
+            try:
+                cached = np.load(path)
+                return [str(label) for label in cached["labels"]], cached["embeddings"]
+            except Exception as e:
+                print(f"Ignoring unreadable label bank {path}: {e}")
+
+        if not labels:
+            raise ValueError(f"Tag vocabulary {self.vocabulary_path} is empty")
+        print(f"Encoding {len(labels)} tag labels with {self.model_name}")
+        prompts = [self.prompt.format(label) for label in labels]
+        vectors = []
+        for start in range(0, len(prompts), LABEL_BATCH_SIZE):
+            vectors.extend(self.encoder(prompts[start:start + LABEL_BATCH_SIZE]))
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+        # Written atomically - API and worker processes may build the same bank
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, labels=np.array(labels), embeddings=matrix)
+        os.replace(tmp_path, path)
+        return labels, matrix
+
+    def score(self, vectors, k: int = TAG_TOP_K, min_score: float = TAG_MIN_SCORE) -> List[List[Dict]]:
+        """Top-k tags per embedding, all embeddings scored in one matrix product"""
+        labels, matrix = self.load()
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        logits = LOGIT_SCALE * (vectors @ matrix.T)
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        k = min(k, len(labels))
+        top = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(probs, top):
+            ordered = candidates[np.argsort(-row[candidates])]
+            results.append([
+                {"tag": labels[i], "score": round(float(row[i]), 4)}
+                for i in ordered if row[i] >= min_score
+            ])
+        return results
+
+# Global label bank for the configured vocabulary
+label_bank = LabelBank(TAG_VOCABULARY_PATH)
+
+def tag_embeddings(vectors, k: int = TAG_TOP_K) -> List[List[Dict]]:
+    """Top-k tags for each CLIP image embedding"""
+    return label_bank.score(vectors, k)
+
+def tag_video(vectors, k: int = TAG_TOP_K) -> Dict:
+    """Tags per keyframe plus overall tags from the mean keyframe embedding, in one pass"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    tags = label_bank.score(np.vstack([vectors, vectors.mean(axis=0)]), k)
+    return {"tags": tags[-1], "frames": tags[:-1]}
+
+# (path, mtime, size) -> content hash, so the file is only re-read when it changes
+_vocabulary_digests: Dict[Tuple[str, int, int], str] = {}
+
+def vocabulary_digest(path: str = TAG_VOCABULARY_PATH) -> str:
+    """Content hash of the tag vocabulary (part of the dedup analysis key)"""
+    try:
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key not in _vocabulary_digests:
+            with open(path, "rb") as f:
+                _vocabulary_digests[key] = hashlib.sha256(f.read()).hexdigest()[:16]
+        return _vocabulary_digests[key]
+    except OSError:
+        return "missing"
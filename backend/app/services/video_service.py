@@ -1,81 +1,251 @@
 """
 Video analysis service - orchestrates audio + frame analysis
+Expressed as a stage graph so the audio and frame branches run concurrently
 """
 import os
-from typing import Dict, List
-from app.utils.ffmpeg import extract_audio_from_video, extract_frames, extract_video_metadata
-from app.services.audio_service import analyze_audio
-from app.services.image_service import analyze_image
+from typing import Any, Callable, Dict, List, Optional
+from app.utils.ffmpeg import extract_frames_at, iter_frames
+from app.utils.probe import probe_streams
+from app.services.audio_service import VAD_ENABLED, decode_pcm, detect_voice_activity, stream_transcription, transcribe_audio
+from app.services.sentiment_service import analyze_sentiment, unknown_sentiment
+from app.services.image_service import describe_image, describe_images, detect_images_objects, embed_images
+from app.services.pipeline import Stage
+from app.services.tagging_service import tag_video
+from app.utils.imaging import DecodedImage, YOLO_INPUT_SIDE, fit_size
+from app.utils.keyframes import SIGNATURE_SIZE, plan_keyframes
+from app.services.storage_service import scratch_path
 
-def analyze_video(video_path: str, storage_dir: str) -> Dict:
+# Max keyframes sent to captioning/detection per video
+MAX_ANALYZED_FRAMES = 10
+# Keyframes are scaled by ffmpeg to the largest model input (YOLO) instead of full size
+FRAME_MAX_SIDE = YOLO_INPUT_SIDE
+# Frames scanned for keyframe selection at most; longer videos are sampled by seeking
+MAX_SCANNED_FRAMES = int(os.getenv("MAX_SCANNED_FRAMES", "120"))
+
+def build_video_stages(video_path: str, storage_dir: str, probe: Optional[Dict] = None,
+                       work_dir: Optional[str] = None,
+                       on_segments: Optional[Callable[[List[Dict]], None]] = None,
+                       watched: Optional[Callable[[], bool]] = None) -> List[Stage]:
     """
-    Analyze video by extracting audio and frames, then analyzing each
-    Returns: combined analysis results
+    Stage graph for a video:
+        probe -> audio_decode -> vad -> transcribe -> sentiment
+        probe -> frame_extract -> keyframes -> frame_decode -> caption
+                                                          -> detect
+                                                          -> embed -> tags
+    on_segments receives transcript segments while transcription runs (in short
+    windows only while watched() says a client is connected)
     """
-    # Extract metadata
-    duration, width, height = extract_video_metadata(video_path)
-    
-    # Create working directory for this video
-    video_id = os.path.basename(video_path).split('.')[0]
-    work_dir = os.path.join(storage_dir, f"temp_{video_id}")
+    # Working directory for this video (the orchestrator passes a tracked one)
+    if work_dir is None:
+        video_id = os.path.basename(video_path).split('.')[0]
+        work_dir = scratch_path(storage_dir, video_id)
     os.makedirs(work_dir, exist_ok=True)
     
-    results = {
-        "duration": duration,
+    def probe_stage(results: Dict[str, Any]) -> Dict:
+        # Upload-time probe record when available
+        return probe if probe is not None else probe_streams(video_path)
+    
+    def audio_decode_stage(results: Dict[str, Any]) -> Dict:
+        # One decode to a 16 kHz PCM cache shared by VAD and Whisper
+        if results["probe"].get("has_audio") is False:
+            raise RuntimeError("Video has no audio track")
+        return decode_pcm(video_path, work_dir)
+    
+    def vad_stage(results: Dict[str, Any]) -> Dict:
+        return detect_voice_activity(results["audio_decode"]["path"])
+    
+    def transcribe_stage(results: Dict[str, Any]) -> Dict:
+        # Only speech regions go to Whisper; none at all skips it
+        intervals = results["vad"]["intervals"] if VAD_ENABLED else None
+        if on_segments is not None:
+            return stream_transcription(results["audio_decode"]["path"], intervals, on_segments, watched)
+        return transcribe_audio(results["audio_decode"]["path"], intervals)
+    
+    def sentiment_stage(results: Dict[str, Any]) -> Dict:
+        # Every segment is scored; the overall label is weighted by segment duration
+        transcript = results["transcribe"]
+        return analyze_sentiment(transcript["transcript"], transcript["segments"])
+    
+    def frame_extract_stage(results: Dict[str, Any]) -> Dict:
+        # Signature-sized thumbnails of sampled frames, piped straight from ffmpeg
+        return sample_thumbnails(video_path, results["probe"]["duration"])
+    
+    def keyframes_stage(results: Dict[str, Any]) -> Dict:
+        # Signatures of every sampled frame pick a budget of distinct frames across the video
+        sampled = results["frame_extract"]
+        return plan_keyframes(sampled["thumbnails"], sampled["timestamps"], MAX_ANALYZED_FRAMES, sampled["interval"])
+    
+    def frame_decode_stage(results: Dict[str, Any]) -> List[DecodedImage]:
+        # Only keyframes are decoded, shared by captioning and detection
+        return decode_keyframes(video_path, results)
+    
+    def caption_stage(results: Dict[str, Any]) -> Dict:
+        # Self-contained (JSON) output so it can be checkpointed without the frames
+        timestamps = results["keyframes"]["timestamps"]
+        frames = results["frame_decode"]
+        try:
+            # All frames are captioned in shared BLIP batches
+            samples = describe_images(frames)
+        except Exception as e:
+            print(f"Batched frame analysis failed, retrying per frame: {e}")
+            samples = []
+            for i, frame in enumerate(frames):
+                try:
+                    samples.append(describe_image(frame))
+                except Exception as e:
+                    print(f"Frame {i} analysis failed: {e}")
+                    samples.append(None)
+        
+        for i, analysis in enumerate(samples):
+            if analysis is not None:
+                analysis["timestamp"] = timestamps[i]
+        return {
+            "total_extracted": results["keyframes"]["total"],
+            "samples": samples
+        }
+    
+    def detect_stage(results: Dict[str, Any]) -> List[Dict]:
+        # One batched YOLO pass over all analyzed frames
+        return detect_images_objects(results["frame_decode"])
+    
+    def embed_stage(results: Dict[str, Any]) -> Dict:
+        # Keyframe vectors for similarity search, with the same timestamps as the captions
+        return {
+            "timestamps": results["keyframes"]["timestamps"],
+            "vectors": embed_images(results["frame_decode"])
+        }
+    
+    def tags_stage(results: Dict[str, Any]) -> Dict:
+        # Zero-shot tags per keyframe and for the whole video from the keyframe embeddings
+        return tag_video(results["embed"]["vectors"])
+    
+    stages = [
+        Stage("probe", probe_stage, executor="ffmpeg", checkpoint=True),
+        Stage("audio_decode", audio_decode_stage, deps=("probe",), executor="ffmpeg"),
+        Stage("transcribe", transcribe_stage, deps=("audio_decode", "vad") if VAD_ENABLED else ("audio_decode",),
+              executor="audio", checkpoint=True),
+        Stage("sentiment", sentiment_stage, deps=("transcribe",), executor="text", checkpoint=True),
+        Stage("frame_extract", frame_extract_stage, deps=("probe",), executor="ffmpeg"),
+        Stage("keyframes", keyframes_stage, deps=("frame_extract",), executor="ffmpeg", checkpoint=True),
+        Stage("frame_decode", frame_decode_stage, deps=("probe", "keyframes"), executor="ffmpeg"),
+        Stage("caption", caption_stage, deps=("keyframes", "frame_decode"), executor="vision", checkpoint=True),
+        Stage("detect", detect_stage, deps=("frame_decode",), executor="detect", checkpoint=True),
+        Stage("embed", embed_stage, deps=("keyframes", "frame_decode"), executor="embed", checkpoint=True),
+        Stage("tags", tags_stage, deps=("embed",), executor="text", checkpoint=True),
+    ]
+    if VAD_ENABLED:
+        stages.insert(2, Stage("vad", vad_stage, deps=("audio_decode",), executor="ffmpeg", checkpoint=True))
+    return stages
+
+def sample_thumbnails(video_path: str, duration: float) -> Dict:
+    """
+    Signature thumbnails every 2s for long videos, every 1s for short ones
+    Up to MAX_SCANNED_FRAMES they come from one sequential decode; beyond that,
+    MAX_SCANNED_FRAMES evenly spread frames are grabbed by seeking, so the scan
+    costs the same for a one-hour video as for a four-minute one
+    """
+    sample_fps = 0.5 if duration > 30 else 1
+    if duration * sample_fps <= MAX_SCANNED_FRAMES:
+        thumbnails = list(iter_frames(video_path, sample_fps, SIGNATURE_SIZE))
+        return {
+            "thumbnails": thumbnails,
+            "timestamps": [i / sample_fps for i in range(len(thumbnails))],
+            "interval": 1 / sample_fps
+        }
+    
+    interval = duration / MAX_SCANNED_FRAMES
+    timestamps = [(i + 0.5) * interval for i in range(MAX_SCANNED_FRAMES)]
+    frames = extract_frames_at(video_path, timestamps, SIGNATURE_SIZE)
+    found = [(t, frame) for t, frame in zip(timestamps, frames) if frame is not None]
+    return {
+        "thumbnails": [frame for _, frame in found],
+        "timestamps": [t for t, _ in found],
+        "interval": interval
+    }
+
+def decode_keyframes(video_path: str, results: Dict[str, Any]) -> List[DecodedImage]:
+    """
+    Keyframes that get captioned and run through detection, each grabbed by a
+    seeking ffmpeg process at FRAME_MAX_SIDE (in parallel)
+    """
+    probe = results["probe"]
+    if not probe.get("width") or not probe.get("height"):
+        raise RuntimeError("Video has no video stream")
+    original_size = (probe["width"], probe["height"])
+    
+    frames = extract_frames_at(video_path, results["keyframes"]["timestamps"], fit_size(original_size, FRAME_MAX_SIDE))
+    if any(frame is None for frame in frames):
+        raise RuntimeError("Keyframe extraction returned no frame")
+    # Boxes and dimensions are reported at the original resolution
+    return [DecodedImage.from_array(frame, original_size) for frame in frames]
+
+def assemble_video_result(results: Dict[str, Any], errors: Dict[str, Exception]) -> Dict:
+    """Combine stage outputs into the video analysis payload"""
+    if "probe" not in results:
+        raise errors.get("probe") or RuntimeError("Video probe unavailable")
+    probe = results["probe"]
+    width = probe["width"]
+    height = probe["height"]
+    
+    payload = {
+        "duration": probe["duration"],
         "width": width,
         "height": height,
         "aspect_ratio": round(width / height, 2)
     }
     
-    # Extract and analyze audio
-    audio_path = os.path.join(work_dir, "audio.wav")
-    try:
-        extract_audio_from_video(video_path, audio_path)
-        audio_analysis = analyze_audio(audio_path)
-        results["audio"] = audio_analysis
-    except Exception as e:
-        print(f"Audio extraction/analysis failed: {e}")
-        results["audio"] = {"error": str(e)}
-    
-    # Extract and analyze frames (sample at 1 fps)
-    frames_dir = os.path.join(work_dir, "frames")
-    try:
-        # Sample frames - limit to avoid overload
-        sample_fps = 0.5 if duration > 30 else 1  # Every 2s for long videos, every 1s for short
-        frame_paths = extract_frames(video_path, frames_dir, fps=sample_fps)
-        
-        # Analyze a subset of frames (max 10)
-        max_frames = min(10, len(frame_paths))
+    # Audio branch
+    audio_error = next((errors[name] for name in ("audio_decode", "vad", "transcribe") if name in errors), None)
+    if audio_error is not None:
+        print(f"Audio extraction/analysis failed: {audio_error}")
+        payload["audio"] = {"error": str(audio_error)}
+    elif "transcribe" in results:
+        audio = dict(results["transcribe"])
+        if "vad" in results:
+            audio["speech_ratio"] = results["vad"]["speech_ratio"]
+        audio["sentiment"] = results.get("sentiment") or unknown_sentiment()
+        payload["audio"] = audio
+    
+    # Frame branch
+    frame_error = next((errors[name] for name in ("frame_extract", "keyframes", "caption") if name in errors), None)
+    if frame_error is not None:
+        print(f"Frame extraction/analysis failed: {frame_error}")
+        payload["frames"] = {"error": str(frame_error)}
+    elif "caption" in results:
+        detections = results.get("detect")
+        frame_tags = results["tags"]["frames"] if "tags" in results else None
+        keyframes = results["keyframes"]
         frame_analyses = []
         
-        for i, frame_path in enumerate(frame_paths[:max_frames]):
-            try:
-                analysis = analyze_image(frame_path)
-                analysis["timestamp"] = i / sample_fps
-                frame_analyses.append(analysis)
-            except Exception as e:
-                print(f"Frame {i} analysis failed: {e}")
+        for i, caption in enumerate(results["caption"]["samples"]):
+            if caption is None:
+                continue
+            analysis = dict(caption)
+            if detections is not None:
+                analysis["object_detection"] = detections[i]
+            elif "detect" in errors:
+                analysis["object_detection"] = {"error": str(errors["detect"])}
+            if frame_tags is not None:
+                analysis["tags"] = frame_tags[i]
+            # Time ranges of the near-duplicate frames that share this keyframe's analysis
+            analysis["covers"] = keyframes["spans"][i]
+            frame_analyses.append(analysis)
         
-        results["frames"] = {
-            "total_extracted": len(frame_paths),
+        payload["frames"] = {
+            "total_extracted": results["caption"]["total_extracted"],
             "analyzed": len(frame_analyses),
+            "covered": keyframes["covered"],
+            "scenes": keyframes["scenes"],
             "samples": frame_analyses
         }
         
         # Generate overall video description from frames
         if frame_analyses:
-            results["visual_summary"] = generate_visual_summary(frame_analyses)
-        
-    except Exception as e:
-        print(f"Frame extraction/analysis failed: {e}")
-        results["frames"] = {"error": str(e)}
-    
-    # Clean up temp files (optional, comment out for debugging)
-    # import shutil
-    # if os.path.exists(work_dir):
-    #     shutil.rmtree(work_dir)
+            payload["visual_summary"] = generate_visual_summary(frame_analyses)
+        if "tags" in results:
+            payload["tags"] = results["tags"]["tags"]
     
-    return results
+    return payload
 
 def generate_visual_summary(frame_analyses: List[Dict]) -> str:
     """Generate summary from frame captions"""
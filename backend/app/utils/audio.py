@@ -0,0 +1,216 @@
+"""
+Audio utilities for 16 kHz mono PCM (the format Whisper consumes)
+Voice activity detection finds the speech regions worth transcribing, and long
+recordings are split into chunks at quiet points so they can be transcribed in
+parallel without cutting words in half
+"""
+from collections import Counter
+from typing import Dict, List, Tuple
+import numpy as np
+
+SAMPLE_RATE = 16000
+# Energy is measured over 30 ms frames...
+ENERGY_FRAME_SEC = 0.03
+# ...and smoothed over 0.3 s so a cut lands in a pause, not a single quiet frame
+ENERGY_SMOOTH_SEC = 0.3
+
+# Voice activity detection (per 30 ms frame)
+VAD_FFT_SIZE = 512
+SPEECH_BAND_HZ = (300, 3400)
+VAD_ENERGY_MARGIN_DB = 12   # above the recording's noise floor...
+VAD_MIN_ENERGY_DB = -50     # ...and never quieter than this (dBFS)
+VAD_MIN_BAND_RATIO = 0.5    # share of power in the speech band
+VAD_MAX_FLATNESS = 0.3      # speech is harmonic; broadband noise is flat (~0.56)
+VAD_MODULATION_SEC = 1.0    # syllables make speech energy fluctuate within a second;
+VAD_MIN_MODULATION_DB = 6   # sustained music and hum are steadier (energy std in dB)
+MIN_SPEECH_SEC = 0.25       # shorter bursts are dropped
+MIN_SILENCE_SEC = 0.5       # shorter pauses do not split speech
+SPEECH_PAD_SEC = 0.2        # kept around each region so word edges are not clipped
+# Silence placed between speech regions when they are joined for transcription
+SPEECH_JOIN_GAP_SEC = 0.3
+
+def frame_energy(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Mean power of each ENERGY_FRAME_SEC frame, smoothed over ENERGY_SMOOTH_SEC"""
+    frame_length = int(sample_rate * ENERGY_FRAME_SEC)
+    n_frames = len(audio) // frame_length
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    frames = audio[:n_frames * frame_length].reshape(n_frames, frame_length).astype(np.float32)
+    power = np.mean(frames * frames, axis=1)
+
+    width = max(1, int(round(ENERGY_SMOOTH_SEC / ENERGY_FRAME_SEC)))
+    return np.convolve(power, np.ones(width, dtype=np.float32) / width, mode="same")
+
+def plan_chunks(audio: np.ndarray, chunk_seconds: float, search_seconds: float,
+                sample_rate: int = SAMPLE_RATE, first_chunk_seconds: float = 0) -> List[Tuple[int, int]]:
+    """
+    Split audio into (start, end) sample ranges of about chunk_seconds
+    The audio is divided into equal parts, then each cut is moved to the quietest
+    point within search_seconds of its target so it falls in a pause between words.
+    With first_chunk_seconds, a short head chunk is cut off first (so the start of
+    a recording is transcribed quickly) and the rest is divided as usual
+    """
+    total = len(audio)
+    energy = frame_energy(audio, sample_rate)
+    search = int(search_seconds * sample_rate)
+
+    head = 0
+    if 0 < first_chunk_seconds and total > (first_chunk_seconds + chunk_seconds) * sample_rate:
+        head = quietest_cut(energy, int(first_chunk_seconds * sample_rate), 0, search, total, sample_rate)
+
+    rest = total - head
+    n_chunks = int(round(rest / (chunk_seconds * sample_rate))) if chunk_seconds > 0 else 1
+
+    chunks = [(0, head)] if head else []
+    start = head
+    for k in range(1, max(n_chunks, 1)):
+        cut = quietest_cut(energy, head + k * rest // n_chunks, start, search, total, sample_rate)
+        chunks.append((start, cut))
+        start = cut
+
+    chunks.append((start, total))
+    return chunks
+
+def quietest_cut(energy: np.ndarray, target: int, start: int, search: int, total: int,
+                 sample_rate: int = SAMPLE_RATE) -> int:
+    """Sample index of the quietest frame within search samples of target (after start)"""
+    frame_length = int(sample_rate * ENERGY_FRAME_SEC)
+    lo = max(target - search, start + frame_length) // frame_length
+    hi = min(target + search, total) // frame_length
+    window = energy[lo:hi]
+    if len(window) == 0:
+        return target
+    return (lo + int(np.argmin(window))) * frame_length + frame_length // 2
+
+def detect_speech(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Dict:
+    """
+    Energy/spectral voice activity detection
+    A frame is voiced when it is loud relative to the noise floor, its power is
+    mostly in the speech band and its spectrum is harmonic rather than flat.
+    Frames and runs of voiced frames only count as speech when their energy
+    fluctuates like syllables do, which sustained music and hum do not
+    Returns: dict with intervals ([start, end] seconds), speech_seconds, speech_ratio, duration
+    """
+    duration = len(audio) / sample_rate
+    frame_length = int(sample_rate * ENERGY_FRAME_SEC)
+    n_frames = len(audio) // frame_length
+    if n_frames == 0:
+        return {"intervals": [], "speech_seconds": 0.0, "speech_ratio": 0.0, "duration": round(duration, 2)}
+
+    frames = audio[:n_frames * frame_length].reshape(n_frames, frame_length).astype(np.float32)
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(frame_length), n=VAD_FFT_SIZE)) ** 2 + 1e-12
+    freqs = np.fft.rfftfreq(VAD_FFT_SIZE, 1 / sample_rate)
+    band = (freqs >= SPEECH_BAND_HZ[0]) & (freqs <= SPEECH_BAND_HZ[1])
+    band_ratio = spectrum[:, band].sum(axis=1) / spectrum.sum(axis=1)
+    flatness = np.exp(np.mean(np.log(spectrum[:, band]), axis=1)) / np.mean(spectrum[:, band], axis=1)
+
+    # Energy std over a sliding window around each frame
+    width = max(1, int(round(VAD_MODULATION_SEC / ENERGY_FRAME_SEC)))
+    kernel = np.ones(width) / width
+    mean = np.convolve(energy_db, kernel, mode="same")
+    modulation = np.sqrt(np.maximum(np.convolve(energy_db ** 2, kernel, mode="same") - mean ** 2, 0))
+
+    threshold = max(np.percentile(energy_db, 10) + VAD_ENERGY_MARGIN_DB, VAD_MIN_ENERGY_DB)
+    voiced = (
+        (energy_db > threshold)
+        & (band_ratio > VAD_MIN_BAND_RATIO)
+        & (flatness < VAD_MAX_FLATNESS)
+        & (modulation > VAD_MIN_MODULATION_DB)
+    )
+
+    intervals = []
+    for start, end in voiced_runs(voiced, ENERGY_FRAME_SEC):
+        # The window around a music onset fluctuates too, but the run itself is steady
+        if (end - start) * ENERGY_FRAME_SEC < MIN_SPEECH_SEC or np.std(energy_db[start:end]) < VAD_MIN_MODULATION_DB:
+            continue
+        start_sec = max(0.0, start * ENERGY_FRAME_SEC - SPEECH_PAD_SEC)
+        end_sec = min(duration, end * ENERGY_FRAME_SEC + SPEECH_PAD_SEC)
+        if intervals and start_sec <= intervals[-1][1]:
+            intervals[-1][1] = round(end_sec, 3)
+        else:
+            intervals.append([round(start_sec, 3), round(end_sec, 3)])
+
+    speech_seconds = sum(end - start for start, end in intervals)
+    return {
+        "intervals": intervals,
+        "speech_seconds": round(speech_seconds, 2),
+        "speech_ratio": round(speech_seconds / duration, 3) if duration else 0.0,
+        "duration": round(duration, 2)
+    }
+
+def voiced_runs(voiced: np.ndarray, frame_sec: float) -> List[Tuple[int, int]]:
+    """(start, end) frame ranges of voiced frames, bridging pauses shorter than MIN_SILENCE_SEC"""
+    edges = np.diff(np.concatenate([[0], voiced.astype(np.int8), [0]]))
+    max_gap = int(MIN_SILENCE_SEC / frame_sec)
+
+    runs = []
+    for start, end in zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()):
+        if runs and start - runs[-1][1] < max_gap:
+            runs[-1] = (runs[-1][0], end)
+        else:
+            runs.append((start, end))
+    return runs
+
+def join_speech(audio: np.ndarray, intervals: List[List[float]],
+                sample_rate: int = SAMPLE_RATE) -> Tuple[np.ndarray, List[Tuple[float, float, float]]]:
+    """
+    Concatenate the speech intervals, separated by SPEECH_JOIN_GAP_SEC of silence
+    Returns: (joined audio, timeline of (joined_start, original_start, length) seconds)
+    """
+    gap = np.zeros(int(SPEECH_JOIN_GAP_SEC * sample_rate), dtype=audio.dtype)
+    pieces = []
+    timeline = []
+    position = 0
+    for start, end in intervals:
+        piece = audio[int(start * sample_rate):int(end * sample_rate)]
+        if pieces:
+            pieces.append(gap)
+            position += len(gap)
+        timeline.append((position / sample_rate, start, len(piece) / sample_rate))
+        pieces.append(piece)
+        position += len(piece)
+
+    joined = np.concatenate(pieces) if pieces else np.zeros(0, dtype=audio.dtype)
+    return joined, timeline
+
+def to_original_time(t: float, timeline: List[Tuple[float, float, float]]) -> float:
+    """Map a time in the joined speech audio back to the original recording"""
+    for joined_start, original_start, length in reversed(timeline):
+        if t >= joined_start:
+            # Times inside the gap after a region clamp to that region's end
+            return original_start + min(t - joined_start, length)
+    return timeline[0][1] if timeline else t
+
+def stitch_transcripts(results: List[Tuple[float, Dict]]) -> Dict:
+    """
+    Merge Whisper results of consecutive chunks, given as (offset_seconds, result)
+    Returns: dict with transcript, segments (global timestamps), language, word_count
+    """
+    text = ""
+    segments = []
+    languages = Counter()
+
+    for offset, result in results:
+        text += result["text"]
+        segments.extend(
+            {
+                "text": seg["text"],
+                "start": seg["start"] + offset,
+                "end": seg["end"] + offset
+            }
+            for seg in result.get("segments", [])
+        )
+        # Chunks detect their language independently; the most-spoken one wins
+        languages[result.get("language", "unknown")] += len(result["text"].split())
+
+    language = languages.most_common(1)[0][0] if languages else "unknown"
+
+    return {
+        "transcript": text,
+        "segments": segments,
+        "language": language,
+        "word_count": len(text.split())
+    }
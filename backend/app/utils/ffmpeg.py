@@ -1,71 +1,126 @@
 """
-FFmpeg utilities for video processing
+FFmpeg utilities for video and audio processing
+Decoded frames and samples are read from ffmpeg pipes; nothing is written as images or WAV files
 """
+from concurrent.futures import ThreadPoolExecutor
 import ffmpeg
+import numpy as np
 import os
-from typing import Tuple, List
+from typing import Iterator, List, Optional, Sequence, Tuple
 
-def extract_video_metadata(video_path: str) -> Tuple[float, int, int]:
+# Concurrent ffmpeg processes used to grab frames at explicit timestamps
+FRAME_SEEK_WORKERS = int(os.getenv("FRAME_SEEK_WORKERS", "4"))
+# Decoded audio is read from the pipe in blocks of this size (~32 s of 16 kHz PCM)
+AUDIO_READ_BYTES = 1 << 20
+
+def decode_audio(media_path: str, sample_rate: int = 16000, cache_path: Optional[str] = None) -> np.ndarray:
     """
-    Extract duration, width, height from video
-    Returns: (duration_sec, width, height)
+    Decode a file's audio to mono float32 samples in [-1, 1] at sample_rate,
+    streamed from ffmpeg's stdout in blocks
+    With cache_path the samples are written there (raw float32) as they arrive and
+    returned memory-mapped, so other stages and processes can map the same file
     """
-    probe = ffmpeg.probe(video_path)
-    video_info = next(s for s in probe['streams'] if s['codec_type'] == 'video')
+    process = (
+        ffmpeg
+        .input(media_path)
+        .output('pipe:', format='s16le', acodec='pcm_s16le', ac=1, ar=sample_rate)
+        .global_args('-loglevel', 'error', '-nostdin')
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
     
-    duration = float(probe['format']['duration'])
-    width = int(video_info['width'])
-    height = int(video_info['height'])
+    blocks = []
+    cache = open(cache_path, "wb") if cache_path else None
+    try:
+        while True:
+            data = process.stdout.read(AUDIO_READ_BYTES)
+            if not data:
+                break
+            block = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+            if cache is not None:
+                cache.write(block.tobytes())
+            else:
+                blocks.append(block)
+    finally:
+        if cache is not None:
+            cache.close()
+        stderr = process.communicate()[1]
     
-    return duration, width, height
+    if process.returncode != 0:
+        raise RuntimeError(f"Audio decoding failed: {stderr.decode(errors='replace')}")
+    if cache_path:
+        return load_pcm(cache_path)
+    return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+
+def load_pcm(cache_path: str) -> np.ndarray:
+    """Memory-map samples written by decode_audio (read-only)"""
+    if os.path.getsize(cache_path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(cache_path, dtype=np.float32, mode="r")
 
-def extract_audio_from_video(video_path: str, output_path: str) -> str:
+def iter_frames(video_path: str, fps: float, size: Tuple[int, int]) -> Iterator[np.ndarray]:
     """
-    Extract audio track from video
-    Returns: path to extracted audio file
+    Sample frames at fps as HxWx3 uint8 RGB arrays read from ffmpeg's stdout
+    ffmpeg scales each frame to size (width, height); nothing is written to disk.
+    Closing the generator early stops ffmpeg
     """
+    width, height = size
+    frame_bytes = width * height * 3
+    process = (
+        ffmpeg
+        .input(video_path)
+        .filter('fps', fps=fps)
+        .filter('scale', width, height)
+        .output('pipe:', format='rawvideo', pix_fmt='rgb24')
+        .global_args('-loglevel', 'error', '-nostdin')
+        .run_async(pipe_stdout=True, pipe_stderr=True)
+    )
+    
+    finished = False
     try:
-        (
-            ffmpeg
-            .input(video_path)
-            .output(output_path, acodec='pcm_s16le', ac=1, ar='16k')
-            .overwrite_output()
-            .run(capture_stdout=True, capture_stderr=True, quiet=True)
-        )
-        return output_path
-    except ffmpeg.Error as e:
-        raise RuntimeError(f"Audio extraction failed: {e.stderr.decode()}")
+        while True:
+            data = process.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            yield np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+        finished = True
+    finally:
+        if not finished:
+            process.kill()
+        stderr = process.communicate()[1]
+        if finished and process.returncode != 0:
+            raise RuntimeError(f"Frame extraction failed: {stderr.decode(errors='replace')}")
 
-def extract_frames(video_path: str, output_dir: str, fps: int = 1) -> List[str]:
+def read_frame_at(video_path: str, timestamp: float, size: Tuple[int, int]) -> Optional[np.ndarray]:
     """
-    Extract frames from video at specified FPS
-    Returns: list of frame paths
+    Decode the single frame at timestamp as an HxWx3 uint8 RGB array scaled to size
+    Input seeking jumps to the preceding keyframe, so only one GOP is decoded
+    Returns None if the timestamp is past the end of the video
     """
-    os.makedirs(output_dir, exist_ok=True)
-    output_pattern = os.path.join(output_dir, "frame_%04d.jpg")
-    
+    width, height = size
     try:
-        (
+        out, _ = (
             ffmpeg
-            .input(video_path)
-            .filter('fps', fps=fps)
-            .output(output_pattern, **{'q:v': 2})
-            .overwrite_output()
-            .run(capture_stdout=True, capture_stderr=True, quiet=True)
+            .input(video_path, ss=f"{timestamp:.3f}")
+            .filter('scale', width, height)
+            .output('pipe:', vframes=1, format='rawvideo', pix_fmt='rgb24')
+            .global_args('-loglevel', 'error', '-nostdin')
+            .run(capture_stdout=True, capture_stderr=True)
         )
-        
-        # Get list of created frames
-        frames = sorted([
-            os.path.join(output_dir, f) 
-            for f in os.listdir(output_dir) 
-            if f.startswith("frame_") and f.endswith(".jpg")
-        ])
-        
-        return frames
     except ffmpeg.Error as e:
-        raise RuntimeError(f"Frame extraction failed: {e.stderr.decode()}")
+        raise RuntimeError(f"Frame extraction at {timestamp:.2f}s failed: {e.stderr.decode(errors='replace')}")
+    
+    if len(out) < width * height * 3:
+        return None
+    return np.frombuffer(out[:width * height * 3], dtype=np.uint8).reshape(height, width, 3)
 
-def get_audio_duration(audio_path: str) -> float:
-    """Get duration of audio file in seconds"""
-    probe = ffmpeg.probe(audio_path)
-    return float(probe['format']['duration'])
+def extract_frames_at(video_path: str, timestamps: Sequence[float], size: Tuple[int, int],
+                      max_workers: int = FRAME_SEEK_WORKERS) -> List[Optional[np.ndarray]]:
+    """
+    Frames at explicit timestamps (None where past the end), one seeking ffmpeg
+    process per frame run in parallel - cost scales with the number of frames,
+    not the length of the video
+    """
+    if not timestamps:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(timestamps)))) as pool:
+        return list(pool.map(lambda t: read_frame_at(video_path, t, size), timestamps))
@@ -0,0 +1,75 @@
+"""
+Cross-process file lock
+Serializes writers (API and worker processes) to shared files on disk, and
+elects one process to run singleton background work
+"""
+from contextlib import contextmanager
+import os
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _try_lock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+else:
+    import fcntl
+
+    def _lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _try_lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+@contextmanager
+def file_lock(lock_path: str):
+    """Hold an exclusive lock on lock_path (created if missing) for the block"""
+    with open(lock_path, "a+") as f:
+        _lock(f)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+class LeaderLock:
+    """
+    Exclusive lock a process keeps once it gets it
+    Of all processes (API servers, standalone runners) sharing lock_path, only the
+    holder runs the guarded work; the OS releases the lock when the holder exits,
+    so the next acquire() elsewhere takes over
+    """
+
+    def __init__(self, lock_path: str):
+        self.lock_path = lock_path
+        self.file = None
+
+    def acquire(self) -> bool:
+        """Take the lock without waiting; True while this process holds it"""
+        if self.file is not None:
+            return True
+        f = open(self.lock_path, "a+")
+        try:
+            _try_lock(f)
+        except OSError:
+            f.close()
+            return False
+        self.file = f
+        return True
+
+    def release(self):
+        """Give up the lock (e.g. on shutdown)"""
+        if self.file is not None:
+            _unlock(self.file)
+            self.file.close()
+            self.file = None
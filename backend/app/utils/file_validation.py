@@ -15,10 +15,26 @@ ALLOWED_MIME_TYPES = {
 
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE_MB", "100")) * 1024 * 1024  # Default 100MB
 
+# Resumable uploads survive dropped connections, so they can safely be much larger
+MAX_RESUMABLE_FILE_SIZE = int(os.getenv("MAX_RESUMABLE_FILE_SIZE_MB", "4096")) * 1024 * 1024  # Default 4GB
+
+# libmagic only needs the leading bytes of a file to identify its type
+SNIFF_BYTES = 64 * 1024
+
+_magic = None
+
+def get_magic() -> magic.Magic:
+    """Shared libmagic handle (loading the magic database is the expensive part)"""
+    global _magic
+    if _magic is None:
+        _magic = magic.Magic(mime=True)
+    return _magic
+
 def detect_media_type(file_path: str) -> str:
-    """Detect media type from file"""
-    mime = magic.Magic(mime=True)
-    mime_type = mime.from_file(file_path)
+    """Detect media type by sniffing the first bytes of the file"""
+    with open(file_path, "rb") as f:
+        header = f.read(SNIFF_BYTES)
+    mime_type = get_magic().from_buffer(header)
     print(f"DEBUG: Detected MIME type: {mime_type} for {file_path}")
     
     for media_type, allowed_mimes in ALLOWED_MIME_TYPES.items():
@@ -36,7 +52,7 @@ def detect_media_type(file_path: str) -> str:
     
     raise ValueError(f"Unsupported file type: {mime_type}")
 
-def validate_file(file_path: str) -> Tuple[str, int]:
+def validate_file(file_path: str, max_size: int = MAX_FILE_SIZE) -> Tuple[str, int]:
     """
     Validate uploaded file
     Returns: (media_type, file_size)
@@ -48,10 +64,10 @@ def validate_file(file_path: str) -> Tuple[str, int]:
     
     # Check file size
     file_size = os.path.getsize(file_path)
-    print(f"DEBUG: File size: {file_size} bytes. Max: {MAX_FILE_SIZE}")
-    if file_size > MAX_FILE_SIZE:
+    print(f"DEBUG: File size: {file_size} bytes. Max: {max_size}")
+    if file_size > max_size:
         print(f"DEBUG: File too large!")
-        raise ValueError(f"File too large. Max size: {MAX_FILE_SIZE / 1024 / 1024}MB")
+        raise ValueError(f"File too large. Max size: {max_size / 1024 / 1024}MB")
     
     if file_size == 0:
         raise ValueError("File is empty")
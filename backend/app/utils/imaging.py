@@ -0,0 +1,109 @@
+"""
+Decoded image shared by every image-analysis consumer
+The file is decoded once; captioning, color extraction and detection read the
+same pixels (or cached resized variants at their model input size)
+"""
+from PIL import Image
+from typing import Dict, Optional, Tuple, Union
+import numpy as np
+import os
+
+# Largest side JPEGs are decoded at (DCT scaling); every model input is smaller
+# than this, so the full-resolution decode of large photos is skipped. 0 = full size
+IMAGE_DECODE_MAX_SIDE = int(os.getenv("IMAGE_DECODE_MAX_SIDE", "1280"))
+
+# Model input sizes
+BLIP_INPUT_SIZE = (384, 384)  # BLIP processor resizes to a square
+YOLO_INPUT_SIDE = 640         # YOLO letterboxes to 640 on the longest side
+CLIP_INPUT_SIDE = 224         # CLIP resizes the shortest side to 224, then center-crops
+PALETTE_SAMPLE_SIZE = (100, 100)
+
+class DecodedImage:
+    """
+    RGB pixels of one image plus lazily built variants
+    width/height are the original dimensions even if decoded at reduced size
+    Variants are cached per size; concurrent consumers at worst build one twice
+    """
+
+    def __init__(self, image: Image.Image, original_size: Optional[Tuple[int, int]] = None,
+                 path: Optional[str] = None):
+        self.image = image if image.mode == "RGB" else image.convert("RGB")
+        self.width, self.height = original_size or self.image.size
+        self.path = path
+        self._rgb = None
+        self._variants: Dict[Tuple, Union[Image.Image, np.ndarray]] = {}
+
+    @classmethod
+    def open(cls, image_path: str, max_side: int = IMAGE_DECODE_MAX_SIDE) -> "DecodedImage":
+        """Decode an image file (JPEGs at reduced scale when much larger than max_side)"""
+        image = Image.open(image_path)
+        original_size = image.size
+        if max_side:
+            # Only JPEG honours draft; other formats decode at full size
+            image.draft("RGB", (max_side, max_side))
+        return cls(image.convert("RGB"), original_size, image_path)
+
+    @classmethod
+    def from_array(cls, rgb: np.ndarray, original_size: Optional[Tuple[int, int]] = None) -> "DecodedImage":
+        """Wrap an RGB uint8 array (e.g. a decoded video frame) without re-encoding it"""
+        decoded = cls(Image.fromarray(rgb, "RGB"), original_size)
+        decoded._rgb = rgb
+        return decoded
+
+    @property
+    def aspect_ratio(self) -> float:
+        return round(self.width / self.height, 2)
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """Shared HxWx3 uint8 view of the decoded pixels (do not modify)"""
+        if self._rgb is None:
+            self._rgb = np.asarray(self.image)
+        return self._rgb
+
+    def resized(self, size: Tuple[int, int]) -> Image.Image:
+        """Variant resized to exactly size (width, height)"""
+        key = ("resized", size)
+        if key not in self._variants:
+            self._variants[key] = self.image if self.image.size == size else self.image.resize(size, Image.BICUBIC)
+        return self._variants[key]
+
+    def fit(self, max_side: int) -> Image.Image:
+        """Variant scaled down (keeping aspect ratio) so its longest side is at most max_side"""
+        key = ("fit", max_side)
+        if key not in self._variants:
+            size = fit_size(self.image.size, max_side)
+            self._variants[key] = self.image if size == self.image.size else self.image.resize(size, Image.BILINEAR)
+        return self._variants[key]
+
+    def cover(self, min_side: int) -> Image.Image:
+        """Variant scaled down (keeping aspect ratio) so its shortest side is min_side"""
+        key = ("cover", min_side)
+        if key not in self._variants:
+            scale = min_side / min(self.image.size)
+            if scale >= 1:
+                self._variants[key] = self.image
+            else:
+                size = (max(1, round(self.image.width * scale)), max(1, round(self.image.height * scale)))
+                self._variants[key] = self.image.resize(size, Image.BICUBIC)
+        return self._variants[key]
+
+    def bgr(self, max_side: int = YOLO_INPUT_SIDE) -> np.ndarray:
+        """Contiguous BGR uint8 array (OpenCV/YOLO layout) of the fit(max_side) variant"""
+        key = ("bgr", max_side)
+        if key not in self._variants:
+            rgb = np.asarray(self.fit(max_side))
+            self._variants[key] = np.ascontiguousarray(rgb[:, :, ::-1])
+        return self._variants[key]
+
+def fit_size(size: Tuple[int, int], max_side: int) -> Tuple[int, int]:
+    """(width, height) scaled down, keeping aspect ratio, so the longest side is at most max_side"""
+    width, height = size
+    scale = max_side / max(width, height)
+    if scale >= 1:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def as_decoded(image: Union[str, "DecodedImage"]) -> DecodedImage:
+    """Accept either a path or an already decoded image"""
+    return image if isinstance(image, DecodedImage) else DecodedImage.open(image)
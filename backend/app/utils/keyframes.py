@@ -0,0 +1,164 @@
+"""
+Keyframe selection for video analysis
+Every sampled frame gets a cheap signature (64-bit difference hash + coarse
+color histogram of a tiny thumbnail). Scene cuts split the video, one
+representative frame per scene is picked within a budget spread across the
+duration, and near-duplicate frames inherit the analysis of their keyframe
+"""
+from typing import Dict, List, Sequence
+import numpy as np
+import os
+
+# Thumbnail signatures are computed from (width, height): 9x8 blocks of 4x4 pixels
+SIGNATURE_SIZE = (36, 32)
+# Levels per channel of the color histogram (4 -> 64 bins)
+HISTOGRAM_LEVELS = 4
+
+# Histogram distance (0-1) between consecutive frames that counts as a scene cut
+SCENE_CHANGE_THRESHOLD = float(os.getenv("SCENE_CHANGE_THRESHOLD", "0.35"))
+# dHash bits (of 64) that also count as a cut when the colors barely change
+SCENE_HASH_DISTANCE = 24
+# Frames within this many dHash bits of a keyframe are near-duplicates of it
+DUPLICATE_HASH_DISTANCE = int(os.getenv("KEYFRAME_DUPLICATE_DISTANCE", "10"))
+
+def compute_signatures(thumbnails: Sequence[np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    dHash and normalized color histogram of every thumbnail in one vectorized pass
+    thumbnails: SIGNATURE_SIZE RGB uint8 arrays
+    """
+    width, height = SIGNATURE_SIZE
+    pixels = np.stack(thumbnails).astype(np.float32)
+    count = len(pixels)
+
+    # Difference hash: is each 4x4 block brighter than its left neighbour
+    gray = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    blocks = gray.reshape(count, 8, height // 8, 9, width // 9).mean(axis=(2, 4))
+    bits = np.packbits(blocks[:, :, 1:] > blocks[:, :, :-1], axis=-1).reshape(count, 8)
+    hashes = np.ascontiguousarray(bits).view(">u8").ravel().astype(np.uint64)
+
+    # Coarse color histogram of the whole thumbnail
+    levels = (pixels.astype(np.int64) * HISTOGRAM_LEVELS) >> 8
+    bins = (levels[..., 0] * HISTOGRAM_LEVELS + levels[..., 1]) * HISTOGRAM_LEVELS + levels[..., 2]
+    size = HISTOGRAM_LEVELS ** 3
+    offsets = bins.reshape(count, -1) + (np.arange(count) * size)[:, None]
+    histograms = np.bincount(offsets.ravel(), minlength=count * size).reshape(count, size).astype(np.float32)
+    histograms /= width * height
+
+    return {"hashes": hashes, "histograms": histograms}
+
+def hamming(hashes: np.ndarray, other) -> np.ndarray:
+    """Differing bits between each hash and other (a hash or an array of hashes)"""
+    diff = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.asarray(other, dtype=np.uint64))
+    diff = np.atleast_1d(diff)
+    return np.unpackbits(diff.view(np.uint8).reshape(len(diff), 8), axis=1).sum(axis=1)
+
+def detect_scenes(signatures: Dict[str, np.ndarray]) -> List[range]:
+    """Split frame indices into runs without a cut between consecutive frames"""
+    hashes, histograms = signatures["hashes"], signatures["histograms"]
+    count = len(hashes)
+    if count == 0:
+        return []
+
+    color_change = 0.5 * np.abs(histograms[1:] - histograms[:-1]).sum(axis=1)
+    shape_change = hamming(hashes[1:], hashes[:-1]) if count > 1 else np.zeros(0)
+    cuts = np.flatnonzero((color_change > SCENE_CHANGE_THRESHOLD) | (shape_change > SCENE_HASH_DISTANCE)) + 1
+
+    bounds = [0] + cuts.tolist() + [count]
+    return [range(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+
+def select_keyframes(signatures: Dict[str, np.ndarray], timestamps: Sequence[float], budget: int) -> Dict:
+    """
+    Pick at most budget visually distinct frames spread across the video
+    Returns: selected frame indices (in time order), the keyframe each frame
+    inherits its analysis from (-1 if it is not a near-duplicate of any) and
+    the number of scenes found
+    """
+    hashes, histograms = signatures["hashes"], signatures["histograms"]
+    count = len(hashes)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    scenes = detect_scenes(signatures)
+    if count == 0 or budget <= 0:
+        return {"selected": [], "representative": [-1] * count, "scenes": len(scenes)}
+
+    # Most typical frame of each scene (closest to the scene's mean colors)
+    candidates = []
+    for scene in scenes:
+        scene_hist = histograms[scene.start:scene.stop]
+        distance = np.abs(scene_hist - scene_hist.mean(axis=0)).sum(axis=1)
+        candidates.append((scene.start + int(np.argmin(distance)), len(scene)))
+
+    selected: List[int] = []
+
+    def is_distinct(index: int) -> bool:
+        return not selected or hamming(hashes[selected], hashes[index]).min() > DUPLICATE_HASH_DISTANCE
+
+    # One slot per equal slice of the duration, filled with its longest distinct scene
+    start, end = timestamps[0], timestamps[-1]
+    span = max(end - start, 1e-9)
+    by_bucket: Dict[int, List] = {}
+    for index, length in candidates:
+        bucket = min(int((timestamps[index] - start) / span * budget), budget - 1)
+        by_bucket.setdefault(bucket, []).append((length, index))
+    for bucket in sorted(by_bucket):
+        for length, index in sorted(by_bucket[bucket], key=lambda c: (-c[0], c[1])):
+            if is_distinct(index):
+                selected.append(index)
+                break
+
+    # Remaining budget: scene representatives first, then any frame, always the most
+    # different from what is already selected (farthest point in hash space)
+    for pool in ([index for index, _ in candidates], list(range(count))):
+        pool = [index for index in pool if index not in selected]
+        while len(selected) < budget and pool:
+            distances = np.array([hamming(hashes[selected], hashes[index]).min() for index in pool])
+            best = int(np.argmax(distances))
+            if distances[best] <= DUPLICATE_HASH_DISTANCE:
+                break
+            selected.append(pool.pop(best))
+
+    selected.sort()
+    # Each frame inherits from its nearest keyframe if it is a near-duplicate of it
+    distances = np.stack([hamming(hashes, hashes[index]) for index in selected], axis=1)
+    nearest = np.argmin(distances, axis=1)
+    representative = [
+        selected[nearest[i]] if distances[i, nearest[i]] <= DUPLICATE_HASH_DISTANCE else -1
+        for i in range(count)
+    ]
+    for index in selected:
+        representative[index] = index
+
+    return {"selected": selected, "representative": representative, "scenes": len(scenes)}
+
+def coverage_spans(representative: Sequence[int], timestamps: Sequence[float], keyframe: int,
+                   frame_interval: float) -> List[List[float]]:
+    """Time ranges [start, end) of the runs of frames that inherit from keyframe"""
+    spans: List[List[float]] = []
+    for i, owner in enumerate(representative):
+        if owner != keyframe:
+            continue
+        if spans and i > 0 and representative[i - 1] == keyframe:
+            spans[-1][1] = round(timestamps[i] + frame_interval, 3)
+        else:
+            spans.append([round(timestamps[i], 3), round(timestamps[i] + frame_interval, 3)])
+    return spans
+
+def plan_keyframes(thumbnails: Sequence[np.ndarray], timestamps: Sequence[float], budget: int,
+                   frame_interval: float) -> Dict:
+    """
+    Keyframe plan for a video (JSON-friendly, so it can be checkpointed)
+    Returns: keyframe indices and timestamps, the spans each keyframe covers,
+    and how many sampled frames are covered by some keyframe
+    """
+    if not len(thumbnails):
+        return {"indices": [], "timestamps": [], "spans": [], "covered": 0, "total": 0, "scenes": 0}
+
+    selection = select_keyframes(compute_signatures(thumbnails), timestamps, budget)
+    representative = selection["representative"]
+    return {
+        "indices": selection["selected"],
+        "timestamps": [round(float(timestamps[i]), 3) for i in selection["selected"]],
+        "spans": [coverage_spans(representative, timestamps, i, frame_interval) for i in selection["selected"]],
+        "covered": sum(1 for owner in representative if owner >= 0),
+        "total": len(thumbnails),
+        "scenes": selection["scenes"]
+    }
@@ -0,0 +1,66 @@
+"""
+Vectorized dominant-color extraction
+Pixels of a whole batch of images are binned on a coarse RGB grid in one pass;
+each image's palette is the mean color of its most populated bins
+"""
+from typing import List, Sequence
+import numpy as np
+
+# Bits kept per channel when binning (4 -> 16 levels, 4096 bins)
+PALETTE_BIN_BITS = 4
+PALETTE_PAD_COLOR = "#000000"
+# Images binned per vectorized pass (bounds the per-bin count/sum arrays)
+PALETTE_CHUNK_SIZE = 64
+
+def extract_palettes(images: Sequence[np.ndarray], num_colors: int = 5,
+                     bits: int = PALETTE_BIN_BITS) -> List[List[str]]:
+    """
+    Dominant colors of each image as hex strings, most frequent first
+    images: HxWx3 uint8 RGB arrays (sizes may differ)
+    Images with fewer distinct colors are padded with PALETTE_PAD_COLOR
+    """
+    if not images:
+        return []
+    if len(images) > PALETTE_CHUNK_SIZE:
+        palettes = []
+        for start in range(0, len(images), PALETTE_CHUNK_SIZE):
+            palettes += extract_palettes(images[start:start + PALETTE_CHUNK_SIZE], num_colors, bits)
+        return palettes
+
+    bins = 1 << (3 * bits)
+    shift = 8 - bits
+
+    # One flat pixel array for the whole batch, with the image each pixel belongs to
+    flat = [np.asarray(image, dtype=np.uint8).reshape(-1, 3) for image in images]
+    pixels = np.concatenate(flat)
+    sizes = [len(image) for image in flat]
+    owners = np.repeat(np.arange(len(images)), sizes)
+
+    quantized = (pixels >> shift).astype(np.int64)
+    bin_ids = (quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]
+    keys = owners * bins + bin_ids
+
+    # Per image x bin: pixel count and channel sums (for the mean color of the bin)
+    total = len(images) * bins
+    counts = np.bincount(keys, minlength=total).reshape(len(images), bins)
+    sums = np.stack([
+        np.bincount(keys, weights=pixels[:, channel], minlength=total)
+        for channel in range(3)
+    ], axis=-1).reshape(len(images), bins, 3)
+
+    # Top bins per image, most populated first
+    k = min(num_colors, bins)
+    top = np.argpartition(-counts, k - 1, axis=1)[:, :k]
+    rows = np.arange(len(images))[:, None]
+    order = np.argsort(-counts[rows, top], axis=1, kind="stable")
+    top = top[rows, order]
+
+    top_counts = counts[rows, top]
+    means = np.rint(sums[rows, top] / np.maximum(top_counts, 1)[..., None]).astype(int)
+
+    palettes = []
+    for image_means, image_counts in zip(means, top_counts):
+        palette = [f"#{r:02x}{g:02x}{b:02x}" for (r, g, b), count in zip(image_means.tolist(), image_counts) if count]
+        palette += [PALETTE_PAD_COLOR] * (num_colors - len(palette))
+        palettes.append(palette)
+    return palettes
@@ -0,0 +1,93 @@
+"""
+Single-pass media probe
+Sniffs type and extracts stream/format metadata once per upload; the rest of the
+pipeline reads the persisted probe record instead of re-probing the file
+"""
+import ffmpeg
+from PIL import Image
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
+from app.models.ingest import MediaProbe
+
+def probe_media(file_path: str, media_type: str) -> Dict:
+    """
+    Extract all metadata needed downstream with one file open (images)
+    or one ffprobe call (audio/video)
+    Returns: dict with duration, width, height and per-type details
+    """
+    probe = {
+        "media_type": media_type,
+        "duration": None,
+        "width": None,
+        "height": None
+    }
+    
+    if media_type == "image":
+        # Image.open only parses the header - pixels are decoded later by the analysis
+        with Image.open(file_path) as img:
+            probe["width"], probe["height"] = img.size
+            probe["format"] = img.format
+            probe["mode"] = img.mode
+            probe["frames"] = getattr(img, "n_frames", 1)
+    elif media_type in ("audio", "video"):
+        probe.update(probe_streams(file_path))
+    
+    return probe
+
+def probe_streams(file_path: str) -> Dict:
+    """Run ffprobe once and keep the stream/format fields the pipeline uses"""
+    info = ffmpeg.probe(file_path)
+    fmt = info.get("format", {})
+    streams = info.get("streams", [])
+    
+    # Cover art (MP3/M4A artwork) is reported as a one-frame video stream
+    video = next((
+        s for s in streams
+        if s.get("codec_type") == "video" and not s.get("disposition", {}).get("attached_pic")
+    ), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    
+    result = {
+        "duration": float(fmt["duration"]) if fmt.get("duration") else None,
+        "format_name": fmt.get("format_name"),
+        "bit_rate": int(fmt["bit_rate"]) if fmt.get("bit_rate") else None,
+        "has_video": video is not None,
+        "has_audio": audio is not None
+    }
+    
+    if video:
+        result["width"] = int(video["width"])
+        result["height"] = int(video["height"])
+        result["video_codec"] = video.get("codec_name")
+        result["fps"] = parse_frame_rate(video.get("avg_frame_rate") or video.get("r_frame_rate"))
+        if result["duration"] is None and video.get("duration"):
+            result["duration"] = float(video["duration"])
+    
+    if audio:
+        result["audio_codec"] = audio.get("codec_name")
+        result["sample_rate"] = int(audio["sample_rate"]) if audio.get("sample_rate") else None
+        result["channels"] = audio.get("channels")
+        if result["duration"] is None and audio.get("duration"):
+            result["duration"] = float(audio["duration"])
+    
+    return result
+
+def parse_frame_rate(rate: Optional[str]) -> Optional[float]:
+    """Convert ffprobe's '30000/1001' style rate to a float"""
+    if not rate:
+        return None
+    num, _, den = rate.partition("/")
+    try:
+        value = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(value, 3) if value > 0 else None
+
+def save_probe(db: Session, media_id: str, probe: Dict):
+    """Persist the probe record for a media item"""
+    db.merge(MediaProbe(media_id=media_id, payload=probe))
+
+def load_probe(db: Session, media_id: str) -> Optional[Dict]:
+    """Read the persisted probe record, if any"""
+    record = db.query(MediaProbe).filter(MediaProbe.media_id == media_id).first()
+    return record.payload if record else None
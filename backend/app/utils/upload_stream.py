@@ -0,0 +1,127 @@
+"""
+Streaming upload helpers
+Copies uploaded files to storage in bounded chunks instead of reading them into memory
+"""
+import hashlib
+import os
+from typing import BinaryIO, Dict, List, Tuple
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from app.utils.file_validation import MAX_FILE_SIZE
+
+# Bytes read/written per iteration - peak memory per upload stays at this size
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE_KB", "1024")) * 1024
+# Allowance for multipart boundaries and part headers around an uploaded file
+MULTIPART_OVERHEAD = 64 * 1024
+
+def too_large_message(max_size: int) -> str:
+    return f"File too large. Max size: {max_size / 1024 / 1024}MB"
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects request bodies over the limit configured for their path with 413
+    Starlette spools a multipart file completely before the endpoint runs, so the
+    size is enforced here: Content-Length is checked before anything is read, and
+    bodies without one are cut off as soon as the received bytes exceed the limit
+    Limits include multipart overhead; the 413 message reports max_file_size, the per-file limit
+    """
+
+    def __init__(self, app, limits: Dict[str, int], max_file_size: int = MAX_FILE_SIZE):
+        self.app = app
+        self.limits = limits
+        self.max_file_size = max_file_size
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > limit:
+            response = JSONResponse({"detail": too_large_message(self.max_file_size)}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=too_large_message(self.max_file_size))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def copy_stream(source: BinaryIO, dest_path: str, max_size: int = MAX_FILE_SIZE,
+                chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[int, str]:
+    """
+    Copy a file-like object to dest_path chunk by chunk
+    Returns: (size_bytes, sha256_hex)
+    Raises: ValueError as soon as max_size is exceeded (partial file is removed)
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(dest_path, "wb") as out:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_size:
+                    raise ValueError(too_large_message(max_size))
+
+                sha256.update(chunk)
+                out.write(chunk)
+    except Exception:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+
+    return size, sha256.hexdigest()
+
+async def save_upload(file: UploadFile, dest_path: str, max_size: int = MAX_FILE_SIZE) -> Tuple[int, str]:
+    """
+    Copy an UploadFile (already spooled by Starlette) to dest_path without blocking
+    the event loop; oversized requests are stopped earlier by UploadSizeLimitMiddleware
+    Returns: (size_bytes, sha256_hex)
+    """
+    await file.seek(0)
+    return await run_in_threadpool(copy_stream, file.file, dest_path, max_size)
+
+def hash_file(file_path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """Compute SHA-256 of a file already on disk, reading it in chunks"""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merge overlapping/adjacent [start, end) byte ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def missing_ranges(received: List[Tuple[int, int]], total_size: int) -> List[Tuple[int, int]]:
+    """Byte ranges of [0, total_size) not covered by the received ranges"""
+    missing = []
+    cursor = 0
+    for start, end in merge_ranges(received):
+        if start > cursor:
+            missing.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < total_size:
+        missing.append((cursor, total_size))
+    return missing
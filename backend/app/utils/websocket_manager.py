@@ -3,7 +3,7 @@ WebSocket manager for real-time updates
 Replaces polling with push notifications
 """
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, Set
+from typing import Callable, Dict, List, Optional, Set
 import json
 import asyncio
 
@@ -13,6 +13,12 @@ class ConnectionManager:
     def __init__(self):
         # Map of media_id to set of connected websockets
         self.active_connections: Dict[str, Set[WebSocket]] = {}
+        
+        # Worker processes have no sockets - they hand messages to a publisher
+        # that the API process relays (see job_queue.relay_job_events)
+        self.publisher: Optional[Callable[[str, dict], None]] = None
+        # ...and ask the database whether an API process has clients for a media item
+        self.watch_checker: Optional[Callable[[str], bool]] = None
     
     async def connect(self, websocket: WebSocket, media_id: str):
         """Accept new WebSocket connection"""
@@ -35,6 +41,12 @@ class ConnectionManager:
         
         print(f"❌ WebSocket disconnected for media {media_id}")
     
+    def has_clients(self, media_id: str) -> bool:
+        """Whether any client is connected for media_id (in any API process, when asked from a worker)"""
+        if self.watch_checker is not None:
+            return self.watch_checker(media_id)
+        return bool(self.active_connections.get(media_id))
+    
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """Send message to specific websocket"""
         try:
@@ -44,6 +56,10 @@ class ConnectionManager:
     
     async def broadcast_to_media(self, media_id: str, message: dict):
         """Broadcast message to all connections watching a specific media"""
+        if self.publisher is not None:
+            self.publisher(media_id, message)
+            return
+        
         if media_id not in self.active_connections:
             return
         
@@ -69,6 +85,15 @@ class ConnectionManager:
             "message": message
         })
     
+    async def send_transcript_partial(self, media_id: str, segments: List[dict]):
+        """Send transcript segments as soon as they are transcribed"""
+        await self.broadcast_to_media(media_id, {
+            "type": "transcript_partial",
+            "media_id": media_id,
+            "segments": segments,
+            "transcribed_until": segments[-1]["end"] if segments else None
+        })
+    
     async def send_analysis_complete(self, media_id: str, analysis: dict):
         """Send analysis completion notification"""
         await self.broadcast_to_media(media_id, {
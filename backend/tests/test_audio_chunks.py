@@ -0,0 +1,57 @@
+import numpy as np
+from app.utils.audio import SAMPLE_RATE, plan_chunks, stitch_transcripts
+
+def speech_with_pauses(seconds, pauses):
+    """Noise 'speech' with silent gaps at the given (start, end) seconds"""
+    audio = np.random.default_rng(0).normal(0, 0.3, seconds * SAMPLE_RATE).astype(np.float32)
+    for start, end in pauses:
+        audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)] = 0.0
+    return audio
+
+def test_cuts_land_in_pauses():
+    pauses = [(57.0, 58.0), (125.0, 125.5), (181.0, 182.0)]
+    audio = speech_with_pauses(240, pauses)
+    chunks = plan_chunks(audio, chunk_seconds=60, search_seconds=10)
+    print(f"Chunks (s): {[(s / SAMPLE_RATE, e / SAMPLE_RATE) for s, e in chunks]}")
+
+    # Contiguous and covering the whole recording
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(audio)
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    # Every cut is inside a pause
+    cuts = [end / SAMPLE_RATE for _, end in chunks[:-1]]
+    assert len(cuts) == 3
+    for cut, (start, end) in zip(cuts, pauses):
+        assert start <= cut <= end
+
+def test_short_audio_is_one_chunk():
+    audio = speech_with_pauses(50, [])
+    assert plan_chunks(audio, chunk_seconds=60, search_seconds=10) == [(0, len(audio))]
+
+def test_short_head_chunk():
+    audio = speech_with_pauses(240, [(24.0, 24.5), (130.0, 131.0)])
+    chunks = plan_chunks(audio, chunk_seconds=100, search_seconds=10, first_chunk_seconds=25)
+    print(f"Chunks with head (s): {[(s / SAMPLE_RATE, e / SAMPLE_RATE) for s, e in chunks]}")
+    assert len(chunks) == 3
+    assert 24.0 <= chunks[0][1] / SAMPLE_RATE <= 24.5
+    assert 130.0 <= chunks[1][1] / SAMPLE_RATE <= 131.0
+
+def test_stitch_offsets_segments():
+    first = {"text": " Hello there.", "language": "en",
+             "segments": [{"text": " Hello there.", "start": 0.0, "end": 1.5}]}
+    second = {"text": " Bonjour. How are you?", "language": "en",
+              "segments": [{"text": " Bonjour.", "start": 0.2, "end": 1.0},
+                           {"text": " How are you?", "start": 1.0, "end": 2.4}]}
+    result = stitch_transcripts([(0.0, first), (58.5, second)])
+    print(f"Stitched: {result}")
+
+    assert result["transcript"] == " Hello there. Bonjour. How are you?"
+    assert [seg["start"] for seg in result["segments"]] == [0.0, 58.7, 59.5]
+    assert result["segments"][-1]["end"] == 58.5 + 2.4
+    assert result["language"] == "en" and result["word_count"] == 6
+
+if __name__ == "__main__":
+    test_cuts_land_in_pauses()
+    test_short_audio_is_one_chunk()
+    test_short_head_chunk()
+    test_stitch_offsets_segments()
+    print("✅ Chunked transcription planning works!")
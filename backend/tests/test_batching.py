@@ -0,0 +1,61 @@
+import threading
+import time
+from app.services.batching import MicroBatcher, get_batching_stats
+
+def test_concurrent_calls_share_batches():
+    seen = []
+
+    def double(items):
+        seen.append(len(items))
+        time.sleep(0.01)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher("test_double", double, max_batch_size=4, max_wait_ms=50)
+    results = {}
+
+    def call(value):
+        results[value] = batcher.run(value)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"Batch sizes: {seen}")
+    assert results == {i: i * 2 for i in range(8)}
+    assert max(seen) == 4 and len(seen) < 8
+
+    stats = get_batching_stats()["test_double"]
+    assert stats["items"] == 8
+    assert stats["avg_batch_size"] > 1
+    print("✅ Calls batched!")
+
+def test_map_keeps_order():
+    batcher = MicroBatcher("test_upper", lambda items: [s.upper() for s in items], max_batch_size=3, max_wait_ms=5)
+    assert batcher.map(["a", "b", "c", "d", "e"]) == ["A", "B", "C", "D", "E"]
+    assert batcher.stats()["largest_batch"] == 3
+    print("✅ Order preserved!")
+
+def test_batch_error_reaches_every_caller():
+    def broken(items):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher("test_broken", broken, max_batch_size=2, max_wait_ms=5)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        try:
+            future.result(timeout=1)
+            assert False, "Expected RuntimeError"
+        except RuntimeError as e:
+            print(f"Propagated: {e}")
+
+    # The batcher keeps serving after a failed batch
+    batcher.fn = lambda items: items
+    assert batcher.run("ok") == "ok"
+    print("✅ Errors propagated!")
+
+if __name__ == "__main__":
+    test_concurrent_calls_share_batches()
+    test_map_keeps_order()
+    test_batch_error_reaches_every_caller()
@@ -0,0 +1,61 @@
+import time
+import numpy as np
+from PIL import Image
+from app.utils.palette import extract_palettes, PALETTE_PAD_COLOR
+
+def make_frame(colors, size=100):
+    """Frame made of horizontal bands, band i covering a share proportional to len(colors) - i"""
+    weights = np.arange(len(colors), 0, -1)
+    rows = np.repeat(np.arange(len(colors)), np.round(weights / weights.sum() * size).astype(int))
+    rows = np.resize(rows, size)
+    return np.asarray(colors, dtype=np.uint8)[rows][:, None, :].repeat(size, axis=1)
+
+def test_palette_ordered_by_frequency():
+    frame = make_frame([(200, 30, 30), (20, 180, 20), (10, 10, 220)])
+    palette = extract_palettes([frame], num_colors=3)[0]
+    print(f"Palette: {palette}")
+    assert palette == ["#c81e1e", "#14b414", "#0a0adc"]
+    print("✅ Palette ordered!")
+
+def test_batch_matches_single_and_pads():
+    frames = [
+        make_frame([(255, 255, 255), (0, 0, 0)]),
+        np.full((50, 80, 3), 128, dtype=np.uint8),  # Different size, one color
+        make_frame([(240, 200, 10), (10, 90, 200), (90, 10, 90), (30, 220, 220), (200, 120, 0), (5, 5, 5)]),
+    ]
+    batched = extract_palettes(frames)
+    assert batched == [extract_palettes([frame])[0] for frame in frames]
+
+    assert all(len(palette) == 5 for palette in batched)
+    assert batched[1] == ["#808080"] + [PALETTE_PAD_COLOR] * 4
+    print("✅ Batch matches single-image results!")
+
+def quantize_palette(frame, num_colors=5):
+    """Previous implementation: PIL quantize per frame"""
+    palette = Image.fromarray(frame).resize((100, 100)).quantize(colors=num_colors).getpalette()
+    return [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in zip(*[iter(palette[:num_colors * 3])] * 3)]
+
+def benchmark(frame_count: int = 300):
+    """PIL quantize per frame vs one vectorized histogram call over all frames"""
+    rng = np.random.default_rng(0)
+    frames = [
+        make_frame([tuple(c) for c in rng.integers(0, 256, (8, 3))]) + rng.integers(0, 12, (100, 100, 3), dtype=np.uint8)
+        for _ in range(frame_count)
+    ]
+
+    started = time.perf_counter()
+    for frame in frames:
+        quantize_palette(frame)
+    quantize_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    extract_palettes(frames)
+    vectorized_seconds = time.perf_counter() - started
+
+    print(f"{frame_count} frames - quantize: {quantize_seconds * 1000:.0f}ms, "
+          f"vectorized: {vectorized_seconds * 1000:.0f}ms ({quantize_seconds / vectorized_seconds:.1f}x)")
+
+if __name__ == "__main__":
+    test_palette_ordered_by_frequency()
+    test_batch_matches_single_and_pads()
+    benchmark()
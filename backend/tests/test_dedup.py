@@ -0,0 +1,82 @@
+import os
+import tempfile
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.db import Base, Analysis, TranscriptSegment
+from app.models.ingest import ContentIndex
+from app.services import tagging_service
+from app.services.dedup_service import find_reusable_media, record_content, clone_analysis, mark_processed
+
+def new_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+def stored_file():
+    path = os.path.join(tempfile.mkdtemp(), "source.mp3")
+    with open(path, "wb") as f:
+        f.write(b"audio")
+    return path
+
+def test_identical_upload_reuses_analysis():
+    db = new_session()
+    path = stored_file()
+    record_content(db, "source", "hash-1", "key-1", path)
+    db.add(Analysis(media_id="source", stage="audio", payload={"transcript": "hello"}))
+    db.add(TranscriptSegment(media_id="source", text="hello", start_sec=0.0, end_sec=1.0))
+    mark_processed(db, "source", 12.5)
+    db.commit()
+
+    source = find_reusable_media(db, "hash-1", "key-1")
+    assert source is not None and source.media_id == "source"
+    # Other content or other analysis settings never match
+    assert find_reusable_media(db, "hash-2", "key-1") is None
+    assert find_reusable_media(db, "hash-1", "key-2") is None
+
+    record_content(db, "copy", "hash-1", "key-1", path, source)
+    clone_analysis(db, "source", "copy")
+    db.commit()
+
+    assert db.query(Analysis).filter(Analysis.media_id == "copy").one().payload == {"transcript": "hello"}
+    assert db.query(TranscriptSegment).filter(TranscriptSegment.media_id == "copy").count() == 1
+    copy = db.query(ContentIndex).filter(ContentIndex.media_id == "copy").one()
+    assert copy.reused_from == "source" and copy.processing_seconds == 12.5
+    print("✅ Identical upload reuses the stored analysis!")
+
+def test_partial_failure_is_not_reused():
+    db = new_session()
+    path = stored_file()
+
+    # Stages failed, so the pipeline never marked the file as processed
+    record_content(db, "partial", "hash-1", "key-1", path)
+    db.add(Analysis(media_id="partial", stage="audio", payload={"transcript": ""}))
+    db.commit()
+    assert find_reusable_media(db, "hash-1", "key-1") is None
+
+    # Only an error record left behind
+    record_content(db, "failed", "hash-2", "key-1", path)
+    mark_processed(db, "failed", 3.0)
+    db.add(Analysis(media_id="failed", stage="error", payload={"error": "boom"}))
+    db.commit()
+    assert find_reusable_media(db, "hash-2", "key-1") is None
+    print("✅ Incomplete analyses are never reused!")
+
+def test_vocabulary_digest_is_cached_until_the_file_changes():
+    path = os.path.join(tempfile.mkdtemp(), "tags.txt")
+    with open(path, "w") as f:
+        f.write("cat\ndog\n")
+
+    first = tagging_service.vocabulary_digest(path)
+    assert tagging_service.vocabulary_digest(path) == first
+    assert len([key for key in tagging_service._vocabulary_digests if key[0] == path]) == 1
+
+    with open(path, "w") as f:
+        f.write("cat\ndog\nbird\n")
+    assert tagging_service.vocabulary_digest(path) != first
+    assert tagging_service.vocabulary_digest(os.path.join(tempfile.mkdtemp(), "none.txt")) == "missing"
+    print("✅ Vocabulary digest cached per file version!")
+
+if __name__ == "__main__":
+    test_identical_upload_reuses_analysis()
+    test_partial_failure_is_not_reused()
+    test_vocabulary_digest_is_cached_until_the_file_changes()
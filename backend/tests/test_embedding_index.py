@@ -0,0 +1,152 @@
+import os
+import tempfile
+import time
+import numpy as np
+from app.services import embedding_index as ei
+from app.services.embedding_index import EmbeddingIndex
+
+DIM = 64
+
+def random_vectors(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+def test_add_search_delete():
+    index = EmbeddingIndex(tempfile.mkdtemp())
+    cat, dog = random_vectors(2, seed=1)
+    index.add("image-cat", cat[None, :])
+    index.add("video-dog", np.stack([cat * 0.2 + dog, dog]), timestamps=[0.0, 2.0])
+
+    hits = index.search(dog[None, :], k=3)[0]
+    print(f"Hits: {hits}")
+    assert hits[0]["media_id"] == "video-dog" and hits[0]["timestamp"] == 2.0
+    assert hits[0]["score"] > 0.99
+
+    # Another process (fresh instance) sees the same files
+    reader = EmbeddingIndex(index.directory)
+    assert reader.search(cat[None, :], k=1)[0][0]["media_id"] == "image-cat"
+    assert len(reader.search(cat[None, :], k=5, exclude_media="image-cat")[0]) == 2
+
+    assert index.delete_media("video-dog") == 2
+    assert [h["media_id"] for h in reader.search(dog[None, :], k=5)[0]] == ["image-cat"]
+
+    assert index.copy_media("image-cat", "image-cat-copy") == 1
+    vectors, timestamps = reader.get_media_vectors("image-cat-copy")
+    assert vectors.shape == (1, DIM) and timestamps == [None]
+    print("✅ Index add/search/delete works!")
+
+def test_allowed_media_filters_inside_scan():
+    index = EmbeddingIndex(tempfile.mkdtemp())
+    query = random_vectors(1, seed=2)
+    # Ten keyframes near the query outrank the two images
+    index.add("video", query + 0.01 * random_vectors(10, seed=3), timestamps=[float(t) for t in range(10)])
+    index.add("image-a", random_vectors(1, seed=4))
+    index.add("image-b", random_vectors(1, seed=5))
+
+    hits = index.search(query, k=2, allowed_media={"image-a", "image-b"})[0]
+    assert sorted(h["media_id"] for h in hits) == ["image-a", "image-b"]
+    assert index.search(query, k=2, allowed_media=set())[0] == []
+    print("✅ allowed_media is applied before top-k!")
+
+def test_chunked_search_matches_exact():
+    index = EmbeddingIndex(tempfile.mkdtemp())
+    vectors = random_vectors(5000)
+    for start in range(0, 5000, 1000):
+        index.add(f"media-{start}", vectors[start:start + 1000])
+
+    original_chunk = ei.SEARCH_CHUNK_ROWS
+    ei.SEARCH_CHUNK_ROWS = 700  # Force several chunks
+    try:
+        queries = random_vectors(3, seed=7)
+        hits = index.search(queries, k=10)
+    finally:
+        ei.SEARCH_CHUNK_ROWS = original_chunk
+
+    stored = ei.normalize(vectors.astype(np.float16).astype(np.float32))
+    exact = ei.normalize(queries) @ stored.T
+    for query_hits, scores in zip(hits, exact):
+        expected = np.sort(scores)[::-1][:10]
+        assert np.allclose([h["score"] for h in query_hits], expected, atol=2e-3)
+    print("✅ Chunked top-k matches exact search!")
+
+def test_ivf_search_finds_near_duplicates():
+    index = EmbeddingIndex(tempfile.mkdtemp())
+    vectors = random_vectors(4000)
+    index.add("library", vectors)
+
+    original = ei.IVF_MIN_VECTORS
+    ei.IVF_MIN_VECTORS = 1000
+    try:
+        targets = [10, 1234, 3999]
+        queries = vectors[targets] + 0.05 * random_vectors(3, seed=3)
+        # Exact scan while the clustering trains in the background
+        exact = index.search(queries, k=1)
+        index.wait_for_rebuild()
+        assert index.stats()["approximate"] and index.stats()["ivf_clusters"] >= 16
+        hits = index.search(queries, k=1)
+        assert [h[0]["score"] for h in hits] == [h[0]["score"] for h in exact]
+
+        # Rows added after training are still found
+        new = random_vectors(1, seed=9)
+        index.add("new", new)
+        assert index.search(new, k=1)[0][0]["media_id"] == "new"
+    finally:
+        ei.IVF_MIN_VECTORS = original
+
+    assert all(h[0]["score"] > 0.99 for h in hits)
+    print("✅ IVF search works!")
+
+def test_compaction_switches_generation():
+    index = EmbeddingIndex(tempfile.mkdtemp())
+    vectors = random_vectors(30)
+    for i in range(3):
+        index.add(f"media-{i}", vectors[i * 10:(i + 1) * 10])
+    reader = EmbeddingIndex(index.directory)
+    reader.search(vectors[:1], k=1)
+    old_matrix = reader._matrix
+
+    index.delete_media("media-0")
+    assert index.compact() == 10
+    stats = index.stats()
+    assert stats["vectors"] == 20 and stats["deleted"] == 0 and stats["generation"] == 1
+
+    # The old mapping stays readable; the reader moves to the new files on its next search
+    assert np.asarray(old_matrix[:30], dtype=np.float32).shape == (30, DIM)
+    assert reader.search(vectors[25:26], k=1)[0][0]["media_id"] == "media-2"
+    assert reader.generation == 1 and reader.get_media_vectors("media-0")[0].shape == (0, DIM)
+    print("✅ Compaction drops deleted rows without touching mapped files!")
+
+def test_rows_without_ids_are_not_truncated():
+    index = EmbeddingIndex(tempfile.mkdtemp())
+    index.add("media-a", random_vectors(4))
+    # A writer crashed after appending vectors but before their ID entries
+    with open(index.vectors_path, "ab") as f:
+        f.write(random_vectors(2, seed=5).astype(np.float16).tobytes())
+    size = os.path.getsize(index.vectors_path)
+    old_path = index.vectors_path
+
+    index.add("media-b", random_vectors(1, seed=6))
+    assert os.path.getsize(old_path) == size  # never shrunk under a reader's mapping
+    assert index.stats()["vectors"] == 5
+    assert index.search(random_vectors(1, seed=6), k=1)[0][0]["media_id"] == "media-b"
+    print("✅ Crashed writes recovered through a new generation!")
+
+def benchmark(count: int = 300_000):
+    """Brute-force top-10 latency at library scale"""
+    index = EmbeddingIndex(tempfile.mkdtemp())
+    index.add("library", np.random.default_rng(0).standard_normal((count, 512)).astype(np.float32))
+    queries = np.random.default_rng(1).standard_normal((1, 512)).astype(np.float32)
+    index.search(queries, k=10)
+
+    started = time.perf_counter()
+    for _ in range(10):
+        index.search(queries, k=10)
+    print(f"{count} vectors: {(time.perf_counter() - started) * 100:.1f}ms per query")
+
+if __name__ == "__main__":
+    test_add_search_delete()
+    test_allowed_media_filters_inside_scan()
+    test_chunked_search_matches_exact()
+    test_ivf_search_finds_near_duplicates()
+    test_compaction_switches_generation()
+    test_rows_without_ids_are_not_truncated()
+    benchmark()
@@ -0,0 +1,194 @@
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+import pytest
+
+ffmpeg = pytest.importorskip("ffmpeg")
+from app.utils import ffmpeg as ffmpeg_utils
+
+SIZE = (8, 6)  # width, height
+FRAME_BYTES = SIZE[0] * SIZE[1] * 3
+has_ffmpeg_binary = shutil.which("ffmpeg") is not None
+
+class FakeProcess:
+    """Stands in for the Popen returned by run_async: stdout serves canned bytes"""
+    def __init__(self, data: bytes, returncode: int):
+        self.stdout = io.BytesIO(data)
+        self.exit_code = returncode
+        self.returncode = None
+        self.killed = False
+
+    def kill(self):
+        self.killed = True
+
+    def communicate(self):
+        self.returncode = self.exit_code
+        return b"", b"decode error" if self.exit_code else b""
+
+class FakeStream:
+    """Records an ffmpeg-python chain; make_output(input kwargs) decides what ffmpeg 'writes'"""
+    def __init__(self, make_output, returncode, kwargs):
+        self.make_output, self.returncode, self.kwargs = make_output, returncode, kwargs
+        self.filters = []
+
+    def filter(self, name, *args, **kwargs):
+        self.filters.append((name, args, kwargs))
+        return self
+
+    def output(self, *args, **kwargs):
+        self.output_kwargs = kwargs
+        return self
+
+    def global_args(self, *args):
+        return self
+
+    def run_async(self, **kwargs):
+        self.process = FakeProcess(self.make_output(self.kwargs), self.returncode)
+        return self.process
+
+    def run(self, **kwargs):
+        if self.returncode:
+            raise ffmpeg.Error("ffmpeg", b"", b"seek failed")
+        return self.make_output(self.kwargs), b""
+
+def fake_ffmpeg(monkeypatch, make_output, returncode=0):
+    """Patch ffmpeg.input; returns the list of streams created (one per ffmpeg process)"""
+    calls = []
+    def fake_input(path, **kwargs):
+        stream = FakeStream(make_output, returncode, kwargs)
+        calls.append(stream)
+        return stream
+    monkeypatch.setattr(ffmpeg_utils.ffmpeg, "input", fake_input)
+    return calls
+
+def numbered_frames(count, partial=0):
+    """count rgb24 frames, each filled with its index, plus a truncated tail"""
+    return b"".join(bytes([i]) * FRAME_BYTES for i in range(count)) + b"\x00" * partial
+
+def test_iter_frames_shape_and_count(monkeypatch):
+    calls = fake_ffmpeg(monkeypatch, lambda kwargs: numbered_frames(5, partial=10))
+    frames = list(ffmpeg_utils.iter_frames("clip.mp4", 0.5, SIZE))
+    print(f"Frames: {len(frames)} of shape {frames[0].shape}")
+    # The truncated tail is not a frame
+    assert len(frames) == 5
+    assert all(frame.shape == (6, 8, 3) and frame.dtype == np.uint8 for frame in frames)
+    assert [int(frame[0, 0, 0]) for frame in frames] == [0, 1, 2, 3, 4]
+    assert calls[0].filters == [("fps", (), {"fps": 0.5}), ("scale", (8, 6), {})]
+    assert calls[0].output_kwargs == {"format": "rawvideo", "pix_fmt": "rgb24"}
+    print("✅ Frames are read from the rawvideo pipe!")
+
+def test_iter_frames_stops_ffmpeg_when_closed_early(monkeypatch):
+    calls = fake_ffmpeg(monkeypatch, lambda kwargs: numbered_frames(5))
+    frames = ffmpeg_utils.iter_frames("clip.mp4", 1.0, SIZE)
+    next(frames)
+    frames.close()
+    assert calls[0].process.killed
+
+def test_iter_frames_raises_on_ffmpeg_failure(monkeypatch):
+    fake_ffmpeg(monkeypatch, lambda kwargs: numbered_frames(1), returncode=1)
+    with pytest.raises(RuntimeError, match="decode error"):
+        list(ffmpeg_utils.iter_frames("broken.mp4", 1.0, SIZE))
+
+def frame_at_seek(kwargs, duration=3.0):
+    """One frame whose pixels encode the seek position in tenths of a second; nothing past the end"""
+    timestamp = float(kwargs["ss"])
+    return b"" if timestamp >= duration else bytes([int(round(timestamp * 10))]) * FRAME_BYTES
+
+def test_read_frame_at_seeks_to_timestamp(monkeypatch):
+    calls = fake_ffmpeg(monkeypatch, frame_at_seek)
+    frame = ffmpeg_utils.read_frame_at("clip.mp4", 1.25, SIZE)
+    assert calls[0].kwargs == {"ss": "1.250"}
+    assert calls[0].output_kwargs["vframes"] == 1
+    assert frame.shape == (6, 8, 3) and int(frame[0, 0, 0]) == 12
+    assert ffmpeg_utils.read_frame_at("clip.mp4", 4.0, SIZE) is None
+
+def test_read_frame_at_reports_ffmpeg_errors(monkeypatch):
+    fake_ffmpeg(monkeypatch, frame_at_seek, returncode=1)
+    with pytest.raises(RuntimeError, match="seek failed"):
+        ffmpeg_utils.read_frame_at("broken.mp4", 1.0, SIZE)
+
+def test_extract_frames_at_keeps_timestamp_order(monkeypatch):
+    calls = fake_ffmpeg(monkeypatch, frame_at_seek)
+    timestamps = [2.5, 0.0, 1.0, 5.0, 0.3]
+    frames = ffmpeg_utils.extract_frames_at("clip.mp4", timestamps, SIZE, max_workers=3)
+    print(f"Seeks: {sorted(c.kwargs['ss'] for c in calls)}")
+    # One seeking process per timestamp, results in request order, None past the end
+    assert len(calls) == len(timestamps)
+    assert [None if f is None else int(f[0, 0, 0]) for f in frames] == [25, 0, 10, None, 3]
+    assert ffmpeg_utils.extract_frames_at("clip.mp4", [], SIZE) == []
+    print("✅ Frames are grabbed at their timestamps!")
+
+PCM = (np.sin(np.linspace(0, 200, 5000)) * 20000).astype(np.int16)
+
+def test_decode_audio_streams_blocks(monkeypatch):
+    monkeypatch.setattr(ffmpeg_utils, "AUDIO_READ_BYTES", 1000)
+    calls = fake_ffmpeg(monkeypatch, lambda kwargs: PCM.tobytes())
+    samples = ffmpeg_utils.decode_audio("speech.mp3")
+    assert calls[0].output_kwargs["ar"] == 16000 and calls[0].output_kwargs["ac"] == 1
+    assert samples.dtype == np.float32 and len(samples) == len(PCM)
+    assert np.allclose(samples, PCM / 32768.0)
+
+def test_decode_audio_cache_is_reused(monkeypatch):
+    from app.services import audio_service
+    monkeypatch.setattr(ffmpeg_utils, "AUDIO_READ_BYTES", 1000)
+    calls = fake_ffmpeg(monkeypatch, lambda kwargs: PCM.tobytes())
+    work_dir = tempfile.mkdtemp()
+
+    decoded = audio_service.decode_pcm("speech.mp3", work_dir)
+    print(f"Decoded: {decoded}")
+    assert os.path.getsize(decoded["path"]) == len(PCM) * 4
+    assert decoded["duration"] == round(len(PCM) / 16000, 2)
+
+    # VAD and Whisper map the cache file; ffmpeg is not run again
+    samples = audio_service.load_samples(decoded["path"])
+    assert isinstance(samples, np.memmap) and np.allclose(samples, PCM / 32768.0)
+    assert len(calls) == 1
+    print("✅ Decoded audio is cached and memory-mapped!")
+
+def test_decode_audio_failure_raises(monkeypatch):
+    fake_ffmpeg(monkeypatch, lambda kwargs: b"", returncode=1)
+    cache_path = os.path.join(tempfile.mkdtemp(), "audio.f32")
+    with pytest.raises(RuntimeError, match="decode error"):
+        ffmpeg_utils.decode_audio("broken.mp3", cache_path=cache_path)
+    # An empty cache maps to no samples
+    assert len(ffmpeg_utils.load_pcm(cache_path)) == 0
+
+def make_clip(seconds=2, fps=10):
+    """Tiny test pattern clip with a sine soundtrack, generated by ffmpeg itself"""
+    path = os.path.join(tempfile.mkdtemp(), "clip.mp4")
+    subprocess.run([
+        "ffmpeg", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc=duration={seconds}:size=64x48:rate={fps}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+        "-pix_fmt", "yuv420p", "-shortest", path
+    ], check=True)
+    return path
+
+@pytest.mark.skipif(not has_ffmpeg_binary, reason="ffmpeg binary not installed")
+def test_iter_frames_on_generated_clip():
+    frames = list(ffmpeg_utils.iter_frames(make_clip(seconds=2), 5, (32, 24)))
+    print(f"Generated clip: {len(frames)} frames")
+    assert 9 <= len(frames) <= 11
+    assert frames[0].shape == (24, 32, 3)
+
+@pytest.mark.skipif(not has_ffmpeg_binary, reason="ffmpeg binary not installed")
+def test_extract_frames_at_on_generated_clip():
+    clip = make_clip(seconds=2)
+    frames = ffmpeg_utils.extract_frames_at(clip, [0.0, 1.0, 5.0], (32, 24))
+    assert frames[0].shape == frames[1].shape == (24, 32, 3)
+    # testsrc changes over time; past the end there is no frame
+    assert not np.array_equal(frames[0], frames[1])
+    assert frames[2] is None
+
+@pytest.mark.skipif(not has_ffmpeg_binary, reason="ffmpeg binary not installed")
+def test_decode_audio_on_generated_clip():
+    cache_path = os.path.join(tempfile.mkdtemp(), "audio.f32")
+    samples = ffmpeg_utils.decode_audio(make_clip(seconds=2), cache_path=cache_path)
+    assert abs(len(samples) - 32000) < 1600
+    assert np.array_equal(samples, ffmpeg_utils.load_pcm(cache_path))
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
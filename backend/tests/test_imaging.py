@@ -0,0 +1,38 @@
+import os
+import tempfile
+import numpy as np
+from PIL import Image
+from app.utils.imaging import DecodedImage, BLIP_INPUT_SIZE
+
+def test_large_jpeg_decoded_at_reduced_scale():
+    path = os.path.join(tempfile.mkdtemp(), "photo.jpg")
+    Image.new("RGB", (4000, 3000), (200, 30, 30)).save(path)
+
+    image = DecodedImage.open(path, max_side=1000)
+    print(f"Decoded {image.width}x{image.height} at {image.image.size}")
+    # Original dimensions are reported, pixels are decoded smaller
+    assert (image.width, image.height) == (4000, 3000)
+    assert max(image.image.size) < 4000
+    assert max(image.image.size) >= 1000
+    print("✅ Reduced decode works!")
+
+def test_variants_are_shared():
+    rgb = np.zeros((720, 1280, 3), dtype=np.uint8)
+    rgb[:, :, 2] = 255  # Blue
+    image = DecodedImage.from_array(rgb)
+
+    # The array is used as-is rather than copied
+    assert image.rgb is rgb
+    assert image.resized(BLIP_INPUT_SIZE) is image.resized(BLIP_INPUT_SIZE)
+    assert image.resized(BLIP_INPUT_SIZE).size == BLIP_INPUT_SIZE
+
+    bgr = image.bgr(640)
+    assert bgr.shape == (360, 640, 3)
+    assert bgr.flags["C_CONTIGUOUS"]
+    assert tuple(bgr[0, 0]) == (255, 0, 0)
+    assert image.bgr(640) is bgr
+    print("✅ Variants cached!")
+
+if __name__ == "__main__":
+    test_large_jpeg_decoded_at_reduced_scale()
+    test_variants_are_shared()
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.db import Base
+from app.models.jobs import Job, JobEvent, MediaWatcher
+from app.services import job_queue
+from app.utils.file_lock import LeaderLock
+
+def new_session_factory():
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'queue.db')}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+def make_stale(db, job_id, seconds=120):
+    db.query(Job).filter(Job.id == job_id).update(
+        {Job.heartbeat_at: datetime.utcnow() - timedelta(seconds=seconds)}, synchronize_session=False)
+    db.commit()
+
+def test_claim_is_exclusive_and_oldest_first():
+    Session = new_session_factory()
+    db = Session()
+    first = job_queue.enqueue_job(db, "m1", "/a.mp4", "/st")
+    job_queue.enqueue_job(db, "m2", "/b.mp4", "/st")
+
+    other = Session()
+    claimed = job_queue.claim_next_job(db, "w1")
+    second = job_queue.claim_next_job(other, "w2")
+    assert claimed.id == first.id and claimed.status == "running" and claimed.attempts == 1
+    assert second.media_id == "m2" and second.worker_id == "w2"
+    assert job_queue.claim_next_job(db, "w3") is None
+    print("✅ Each queued job is claimed by exactly one worker!")
+
+def test_stale_job_is_requeued_then_failed():
+    Session = new_session_factory()
+    db = Session()
+    job = job_queue.enqueue_job(db, "m1", "/a.mp4", "/st")
+    job.max_attempts = 2
+    db.commit()
+
+    job_queue.claim_next_job(db, "w1")
+    # A recent heartbeat keeps the job running
+    assert job_queue.requeue_stale_jobs(db, timeout=60) == 0
+    make_stale(db, job.id)
+    assert job_queue.requeue_stale_jobs(db, timeout=60) == 1
+    db.refresh(job)
+    assert job.status == "queued" and "w1" in job.error
+
+    # The lost worker finishing late must not overwrite the recovered job
+    claimed = job_queue.claim_next_job(db, "w2")
+    assert not job_queue.finish_job(db, claimed, "w1")
+    db.refresh(job)
+    assert job.status == "running" and job.worker_id == "w2"
+
+    make_stale(db, job.id)
+    assert job_queue.requeue_stale_jobs(db, timeout=60) == 1
+    db.refresh(job)
+    assert job.status == "failed" and job.attempts == 2
+    print("✅ Stale jobs requeued until their attempts run out!")
+
+def test_finish_retries_then_fails():
+    Session = new_session_factory()
+    db = Session()
+    job = job_queue.enqueue_job(db, "m1", "/a.mp4", "/st")
+    job.max_attempts = 2
+    db.commit()
+
+    claimed = job_queue.claim_next_job(db, "w1")
+    assert job_queue.finish_job(db, claimed, "w1", "model crashed")
+    db.refresh(job)
+    assert job.status == "queued" and job.error == "model crashed"
+
+    claimed = job_queue.claim_next_job(db, "w1")
+    job_queue.finish_job(db, claimed, "w1", "model crashed again")
+    db.refresh(job)
+    assert job.status == "failed" and job.attempts == 2
+
+    job_queue.retry_job(db, job)
+    claimed = job_queue.claim_next_job(db, "w1")
+    assert claimed.attempts == 1 and claimed.error is None
+    assert job_queue.finish_job(db, claimed, "w1")
+    db.refresh(job)
+    assert job.status == "completed" and job.finished_at is not None
+    print("✅ Failed jobs retried up to max_attempts!")
+
+def test_relay_forwards_new_events(monkeypatch):
+    Session = new_session_factory()
+    db = Session()
+    monkeypatch.setattr(job_queue, "SessionLocal", Session)
+
+    sent = []
+
+    async def broadcast(media_id, message):
+        sent.append((media_id, message["progress"]))
+
+    monkeypatch.setattr(job_queue.manager, "broadcast_to_media", broadcast)
+
+    for progress in (10, 50):
+        job_queue.publish_event("m1", {"type": "progress", "progress": progress})
+    last_id = asyncio.run(job_queue.relay_new_events(0))
+    assert sent == [("m1", 10), ("m1", 50)]
+
+    job_queue.publish_event("m2", {"type": "progress", "progress": 100})
+    asyncio.run(job_queue.relay_new_events(last_id))
+    assert sent[-1] == ("m2", 100) and len(sent) == 3
+    assert db.query(JobEvent).count() == 3
+
+    # Database work (including the watcher announcement) runs off the event loop's thread
+    threads = []
+    poll = job_queue.poll_job_events
+    monkeypatch.setattr(job_queue, "poll_job_events",
+                        lambda *args: threads.append(threading.get_ident()) or poll(*args))
+    asyncio.run(job_queue.relay_new_events(0, server_id="api-1", watched={"m1"}))
+    assert threads and threads[0] != threading.get_ident()
+    assert db.query(MediaWatcher).filter(MediaWatcher.server_id == "api-1").one().media_id == "m1"
+    print("✅ Worker events relayed once, in order!")
+
+def test_workers_see_media_watched_in_any_api_process(monkeypatch):
+    Session = new_session_factory()
+    db = Session()
+    monkeypatch.setattr(job_queue, "SessionLocal", Session)
+    monkeypatch.setattr(job_queue.manager, "watch_checker", job_queue.media_is_watched)
+
+    job_queue.announce_watched_media(db, "api-1", {"m1", "m2"})
+    job_queue.announce_watched_media(db, "api-2", {"m2"})
+    assert job_queue.manager.has_clients("m1") and job_queue.manager.has_clients("m2")
+    assert not job_queue.manager.has_clients("m3")
+
+    # Clients of api-1 disconnected; api-2 still watches m2
+    job_queue.announce_watched_media(db, "api-1", set())
+    assert not job_queue.manager.has_clients("m1") and job_queue.manager.has_clients("m2")
+
+    # Announcements of a process that stopped refreshing them expire
+    db.query(MediaWatcher).update(
+        {MediaWatcher.updated_at: datetime.utcnow() - timedelta(seconds=job_queue.WATCHER_TTL_SEC + 1)})
+    db.commit()
+    assert not job_queue.manager.has_clients("m2")
+    print("✅ Workers know which media have WebSocket clients!")
+
+def test_only_one_process_owns_the_pool():
+    class CountingPool:
+        size = 2
+        starts = 0
+
+        def start(self):
+            self.starts += 1
+
+    lock_path = os.path.join(tempfile.mkdtemp(), "pool.lock")
+    owner, standby = LeaderLock(lock_path), LeaderLock(lock_path)
+    owner_pool, standby_pool = CountingPool(), CountingPool()
+
+    assert job_queue.supervise_pool(owner_pool, owner)
+    assert not job_queue.supervise_pool(standby_pool, standby)
+    assert owner_pool.starts == 1 and standby_pool.starts == 0
+
+    # The standby takes over once the owner is gone
+    owner.release()
+    assert job_queue.supervise_pool(standby_pool, standby) and standby_pool.starts == 1
+    standby.release()
+    print("✅ Worker pool runs in a single process!")
@@ -0,0 +1,52 @@
+import numpy as np
+from app.utils.keyframes import SIGNATURE_SIZE, compute_signatures, hamming, plan_keyframes
+
+rng = np.random.default_rng(0)
+
+def scene_frame(scene_seed, jitter=2):
+    """Thumbnail of a scene plus a little sensor noise"""
+    width, height = SIGNATURE_SIZE
+    base = np.random.default_rng(scene_seed).integers(0, 256, (height, width, 3))
+    noise = rng.integers(-jitter, jitter + 1, base.shape)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+def test_near_duplicates_share_hash():
+    signatures = compute_signatures([scene_frame(1), scene_frame(1), scene_frame(2)])
+    distances = hamming(signatures["hashes"], signatures["hashes"][0])
+    print(f"dHash distances: {distances}")
+    assert distances[1] <= 4 and distances[2] > 16
+    assert np.allclose(signatures["histograms"].sum(axis=1), 1.0)
+
+def test_static_video_gets_one_keyframe():
+    frames = [scene_frame(7) for _ in range(30)]
+    plan = plan_keyframes(frames, [i * 2.0 for i in range(30)], budget=10, frame_interval=2.0)
+    print(f"Static plan: {plan['indices']} covers {plan['spans']}")
+    assert len(plan["indices"]) == 1 and plan["scenes"] == 1
+    assert plan["covered"] == 30 and plan["spans"] == [[[0.0, 60.0]]]
+
+def test_fast_cuts_spread_across_duration():
+    # 40 scenes of 3 frames each over a 120-frame video
+    frames = [scene_frame(100 + i // 3) for i in range(120)]
+    timestamps = [float(i) for i in range(120)]
+    plan = plan_keyframes(frames, timestamps, budget=10, frame_interval=1.0)
+    print(f"Fast-cut keyframes at {plan['timestamps']}")
+    assert plan["scenes"] == 40 and len(plan["indices"]) == 10
+    # One keyframe per tenth of the video, not the first ten scenes
+    assert [int(t // 12) for t in plan["timestamps"]] == list(range(10))
+    assert plan["covered"] == 30  # Only frames of the analyzed scenes inherit
+
+def test_cut_back_to_earlier_scene_inherits():
+    # A A A B B B A A A: the return to scene A reuses its first keyframe
+    frames = [scene_frame(seed) for seed in [1] * 3 + [2] * 3 + [1] * 3]
+    plan = plan_keyframes(frames, [float(i) for i in range(9)], budget=10, frame_interval=1.0)
+    print(f"Cut-back plan: {plan}")
+    assert plan["scenes"] == 3 and len(plan["indices"]) == 2
+    assert plan["covered"] == 9
+    assert [0.0, 3.0] in plan["spans"][0] and [6.0, 9.0] in plan["spans"][0]
+
+if __name__ == "__main__":
+    test_near_duplicates_share_hash()
+    test_static_video_gets_one_keyframe()
+    test_fast_cuts_spread_across_duration()
+    test_cut_back_to_earlier_scene_inherits()
+    print("✅ Keyframe selection works!")
@@ -0,0 +1,88 @@
+from app.services.model_registry import ModelRegistry, estimate_size_bytes
+
+MB = 1024 * 1024
+
+class FakeTensor:
+    def __init__(self, size_bytes):
+        self.size_bytes = size_bytes
+
+    def numel(self):
+        return self.size_bytes
+
+    def element_size(self):
+        return 1
+
+class FakeModel:
+    """Stands in for a torch module of a given size"""
+
+    def __init__(self, size_mb):
+        self.weights = [FakeTensor(int(size_mb * MB))]
+
+    def parameters(self):
+        return iter(self.weights)
+
+    def buffers(self):
+        return iter([])
+
+class FakePipeline:
+    def __init__(self, size_mb):
+        self.model = FakeModel(size_mb)
+
+def counting_loader(size_mb, loads):
+    def load():
+        loads.append(size_mb)
+        return FakeModel(size_mb)
+    return load
+
+def test_size_estimate_follows_wrappers():
+    assert estimate_size_bytes(FakeModel(2)) == 2 * MB
+    assert estimate_size_bytes(FakePipeline(3)) == 3 * MB
+    # (processor, model) pairs like BLIP/CLIP
+    assert estimate_size_bytes((object(), FakeModel(1))) == 1 * MB
+    print("✅ Sizes estimated!")
+
+def test_least_recently_used_model_is_evicted():
+    registry = ModelRegistry(budget_mb=10)
+    loads = []
+    registry.register("a", counting_loader(4, loads))
+    registry.register("b", counting_loader(4, loads))
+    registry.register("c", counting_loader(4, loads))
+
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # b is now least recently used
+    registry.get("c")
+
+    resident = {m["name"] for m in registry.status() if m["resident"]}
+    print(f"Resident: {resident}")
+    assert resident == {"a", "c"}
+    assert registry.resident_bytes() <= 10 * MB
+
+    # Cached models are not reloaded; evicted ones are
+    registry.get("a")
+    registry.get("b")
+    assert loads == [4, 4, 4, 4]
+    status = {m["name"]: m for m in registry.status()}
+    assert status["b"]["evictions"] == 1 and status["b"]["loads"] == 2
+    print("✅ LRU eviction works!")
+
+def test_preload_and_unload():
+    registry = ModelRegistry()
+    reports = []
+    registry.register("a", counting_loader(1, []))
+    registry.reporter = reports.append
+
+    registry.preload(["a", "missing"])  # Unknown names are reported, not raised
+    assert registry.status()[0]["resident"]
+    assert registry.status()[0]["load_seconds"] is not None
+
+    assert registry.unload("a")
+    assert not registry.unload("a")
+    assert not registry.status()[0]["resident"]
+    assert len(reports) == 2
+    print("✅ Preload/unload works!")
+
+if __name__ == "__main__":
+    test_size_estimate_follows_wrappers()
+    test_least_recently_used_model_is_evicted()
+    test_preload_and_unload()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import threading
+from multiprocessing.connection import Listener
+from app.services import model_server
+from app.services.model_server import ModelServerClient, check_authkey, handle_connection, remote_op, parse_address
+
+calls = []
+AUTHKEY = b"test-secret"
+
+@remote_op("test_echo")
+def echo(text: str, repeat: int = 1) -> str:
+    calls.append(os.getpid())
+    if not text:
+        raise ValueError("empty text")
+    return text * repeat
+
+def start_server(address):
+    listener = Listener(address, authkey=AUTHKEY)
+
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                break
+            threading.Thread(target=handle_connection, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return listener
+
+def test_address_parsing():
+    assert parse_address("/tmp/models.sock") == "/tmp/models.sock"
+    assert parse_address("127.0.0.1:7070") == ("127.0.0.1", 7070)
+    assert parse_address("[::1]:7070") == ("::1", 7070)
+    for address in ("0.0.0.0:7070", "10.0.0.5:7070", "models.internal:7070"):
+        try:
+            parse_address(address)
+            assert False, f"Expected ValueError for {address}"
+        except ValueError as e:
+            print(f"Rejected: {e}")
+    print("✅ Addresses parsed!")
+
+def test_authkey_is_required():
+    for authkey in (b"", b"change-me"):
+        try:
+            check_authkey(authkey)
+            assert False, "Expected ValueError"
+        except ValueError as e:
+            print(f"Rejected: {e}")
+
+    # The server refuses to start, and a client refuses to connect
+    try:
+        model_server.serve("/tmp/unused.sock", authkey=b"")
+        assert False, "Expected ValueError"
+    except ValueError:
+        pass
+    finally:
+        model_server._serving = False
+    try:
+        ModelServerClient("/tmp/unused.sock", authkey=b"").call("test_echo", "x")
+        assert False, "Expected ValueError"
+    except ValueError:
+        pass
+    print("✅ Model server needs an explicit secret!")
+
+def test_calls_are_forwarded_to_server():
+    address = os.path.join(tempfile.mkdtemp(), "models.sock")
+    listener = start_server(address)
+    original = (model_server.MODEL_SERVER_ADDRESS, model_server.client)
+
+    try:
+        model_server.MODEL_SERVER_ADDRESS = address
+        model_server.client = ModelServerClient(address, authkey=AUTHKEY)
+
+        # Same call site, served through the socket
+        assert echo("ab", repeat=2) == "abab"
+        assert echo("c") == "c"
+        assert len(model_server.client.idle) == 1  # Connection reused
+
+        # Errors come back as the caller's exception type
+        try:
+            echo("")
+            assert False, "Expected ValueError"
+        except ValueError as e:
+            print(f"Remote error: {e}")
+
+        try:
+            model_server.client.call("missing_op")
+            assert False, "Expected ValueError"
+        except ValueError as e:
+            print(f"Remote error: {e}")
+    finally:
+        model_server.MODEL_SERVER_ADDRESS, model_server.client = original
+        listener.close()
+
+    print("✅ Calls forwarded!")
+
+def test_runs_in_process_without_server():
+    calls.clear()
+    assert echo("x", repeat=3) == "xxx"
+    assert calls == [os.getpid()]
+    print("✅ In-process fallback works!")
+
+if __name__ == "__main__":
+    test_address_parsing()
+    test_authkey_is_required()
+    test_calls_are_forwarded_to_server()
+    test_runs_in_process_without_server()
@@ -0,0 +1,111 @@
+import time
+import numpy as np
+from app.services.model_registry import registry
+from app.services import object_detection_service as ods
+from app.utils.imaging import DecodedImage
+
+class FakeTensor:
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+class FakeBoxes:
+    def __init__(self, rows):
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+        self.xyxy = FakeTensor(rows[:, :4])
+        self.conf = FakeTensor(rows[:, 4])
+        self.cls = FakeTensor(rows[:, 5])
+
+class FakeResult:
+    names = {0: "person", 1: "dog"}
+
+    def __init__(self, image):
+        self.orig_shape = image.shape[:2]
+        # One confident person and one weak dog per image
+        self.boxes = FakeBoxes([[10, 20, 50, 80, 0.9, 0], [0, 0, 5, 5, 0.3, 1]])
+
+class FakeYOLO:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, source, conf, verbose):
+        self.batch_sizes.append(len(source))
+        return [FakeResult(image) for image in source]
+
+def with_fake_yolo(test):
+    def run():
+        fake = FakeYOLO()
+        original = registry.entries["yolo"].loader
+        registry.unload("yolo")
+        registry.register("yolo", lambda: fake)
+        try:
+            test(fake)
+        finally:
+            registry.unload("yolo")
+            registry.register("yolo", original)
+    run.__name__ = test.__name__
+    return run
+
+@with_fake_yolo
+def test_frames_are_detected_in_batches(fake):
+    frames = [np.zeros((360, 640, 3), dtype=np.uint8) for _ in range(20)]
+    results = ods.detect_arrays(frames)
+
+    print(f"Predict batch sizes: {fake.batch_sizes}")
+    assert len(results) == 20
+    assert max(fake.batch_sizes) <= ods.DETECTION_BATCH_SIZE
+    assert len(fake.batch_sizes) < 20
+
+    first = results[0]
+    assert first["total_objects"] == 2
+    assert first["object_counts"] == {"person": 1, "dog": 1}
+    assert first["detections"][0]["bbox"] == {"x": 10, "y": 20, "width": 40, "height": 60}
+    assert first["image_dimensions"] == {"width": 640, "height": 360}
+    print("✅ Batched detection works!")
+
+@with_fake_yolo
+def test_threshold_applies_per_image(fake):
+    frame = np.zeros((10, 10, 3), dtype=np.uint8)
+    results = ods.detect_arrays([frame], confidence_threshold=0.5)
+    assert [d["label"] for d in results[0]["detections"]] == ["person"]
+    assert results[0]["confidence_threshold"] == 0.5
+    print("✅ Threshold applied!")
+
+@with_fake_yolo
+def test_boxes_scaled_to_original_size(fake):
+    # 1280x720 frame is detected on its 640x360 variant
+    frame = DecodedImage.from_array(np.zeros((720, 1280, 3), dtype=np.uint8))
+    result = ods.detect_images([frame])[0]
+
+    assert fake.batch_sizes == [1]
+    assert result["image_dimensions"] == {"width": 1280, "height": 720}
+    assert result["detections"][0]["bbox"] == {"x": 20, "y": 40, "width": 80, "height": 120}
+    print("✅ Boxes rescaled!")
+
+def benchmark(frame_count: int = 64):
+    """Per-frame predict loop vs batched detect_arrays on real YOLO (requires ultralytics)"""
+    frames = [np.random.randint(0, 255, (360, 640, 3), dtype=np.uint8) for _ in range(frame_count)]
+    model = ods.get_yolo_model()
+    model.predict(source=frames[:1], verbose=False)  # Warm up
+
+    started = time.perf_counter()
+    for frame in frames:
+        ods.summarize_result(model.predict(source=frame, conf=0.25, verbose=False)[0], 0.25)
+    per_frame = frame_count / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    ods.detect_arrays(frames)
+    batched = frame_count / (time.perf_counter() - started)
+
+    print(f"Per-frame: {per_frame:.1f} fps, batched (batch {ods.DETECTION_BATCH_SIZE}): {batched:.1f} fps")
+
+if __name__ == "__main__":
+    test_frames_are_detected_in_batches()
+    test_threshold_applies_per_image()
+    test_boxes_scaled_to_original_size()
+    benchmark()
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from app.services.pipeline import Stage, run_stages, stages_to_run, topological_order
+
+def sleepy(value, seconds=0.2):
+    def fn(results):
+        time.sleep(seconds)
+        return value
+    return fn
+
+def test_independent_branches_run_concurrently():
+    stages = [
+        Stage("probe", lambda results: "probe", executor="ffmpeg"),
+        Stage("transcribe", sleepy("transcript"), deps=("probe",), executor="audio"),
+        Stage("caption", sleepy("caption"), deps=("probe",), executor="vision"),
+        Stage("detect", sleepy("detections"), deps=("probe",), executor="detect"),
+        Stage("summarize", lambda results: sorted(results), after=("transcribe", "caption", "detect"), executor="llm"),
+    ]
+
+    started = time.perf_counter()
+    results, errors = asyncio.run(run_stages(stages))
+    elapsed = time.perf_counter() - started
+
+    print(f"Graph finished in {elapsed:.2f}s")
+    assert not errors
+    assert results["summarize"] == ["caption", "detect", "probe", "transcribe"]
+    # Three 0.2s branches overlap instead of taking 0.6s
+    assert elapsed < 0.45
+    print("✅ Branches ran concurrently!")
+
+def test_failed_stage_skips_dependents_only():
+    def broken(results):
+        raise RuntimeError("no audio track")
+
+    stages = [
+        Stage("audio_extract", broken),
+        Stage("transcribe", lambda results: "text", deps=("audio_extract",)),
+        Stage("caption", lambda results: "caption"),
+        Stage("summarize", lambda results: "summary", after=("transcribe", "caption")),
+    ]
+
+    results, errors = asyncio.run(run_stages(stages))
+    assert str(errors["audio_extract"]) == "no audio track"
+    assert "transcribe" in errors
+    assert results["caption"] == "caption"
+    assert results["summarize"] == "summary"
+    print("✅ Failures only skip dependent stages!")
+
+def video_like_graph(calls):
+    def record(name):
+        def fn(results):
+            calls.append(name)
+            return name
+        return fn
+
+    stages = [
+        Stage("probe", record("probe"), checkpoint=True),
+        Stage("audio_extract", record("audio_extract"), deps=("probe",)),
+        Stage("transcribe", record("transcribe"), deps=("audio_extract",), checkpoint=True),
+        Stage("sentiment", record("sentiment"), deps=("transcribe",), checkpoint=True),
+        Stage("frame_extract", record("frame_extract"), deps=("probe",)),
+        Stage("caption", record("caption"), deps=("frame_extract",), checkpoint=True),
+        Stage("detect", record("detect"), deps=("frame_extract",), checkpoint=True),
+    ]
+    stages.append(Stage("summarize", record("summarize"), after=tuple(s.name for s in stages if s.checkpoint), checkpoint=True))
+    return stages
+
+def test_resume_skips_checkpointed_stages():
+    calls = []
+    stages = video_like_graph(calls)
+
+    # Crashed during summarization: only the summary is redone
+    restored = {name: name for name in ("probe", "transcribe", "sentiment", "caption", "detect")}
+    assert stages_to_run(stages, restored) == {"summarize"}
+    results, errors = asyncio.run(run_stages(stages, completed=restored))
+    assert calls == ["summarize"]
+    assert not errors and results["transcribe"] == "transcribe"
+
+    # Crashed after transcription: audio extraction is not needed again
+    restored = {"probe": "probe", "transcribe": "transcribe"}
+    assert stages_to_run(stages, restored) == {"sentiment", "frame_extract", "caption", "detect", "summarize"}
+    print("✅ Resume skips completed stages!")
+
+def test_cycle_is_rejected():
+    stages = [
+        Stage("a", lambda results: 1, deps=("b",)),
+        Stage("b", lambda results: 2, deps=("a",)),
+    ]
+    try:
+        topological_order(stages)
+        assert False, "Expected ValueError"
+    except ValueError as e:
+        print(f"Rejected: {e}")
+
+if __name__ == "__main__":
+    test_independent_branches_run_concurrently()
+    test_failed_stage_skips_dependents_only()
+    test_resume_skips_checkpointed_stages()
+    test_cycle_is_rejected()
@@ -0,0 +1,42 @@
+import pytest
+
+ffmpeg = pytest.importorskip("ffmpeg")
+from app.utils import probe
+
+AUDIO_STREAM = {"codec_type": "audio", "codec_name": "mp3", "sample_rate": "44100", "channels": 2,
+                "disposition": {"default": 1, "attached_pic": 0}}
+VIDEO_STREAM = {"codec_type": "video", "codec_name": "h264", "width": 1280, "height": 720,
+                "avg_frame_rate": "30000/1001", "disposition": {"default": 1, "attached_pic": 0}}
+COVER_ART = {"codec_type": "video", "codec_name": "mjpeg", "width": 600, "height": 600,
+             "avg_frame_rate": "0/0", "disposition": {"default": 0, "attached_pic": 1}}
+
+def probe_with(monkeypatch, streams, duration="12.5"):
+    monkeypatch.setattr(probe.ffmpeg, "probe", lambda path: {
+        "format": {"duration": duration, "format_name": "test", "bit_rate": "128000"},
+        "streams": streams
+    })
+    return probe.probe_streams("media.file")
+
+def test_audio_with_cover_art_is_audio_only(monkeypatch):
+    result = probe_with(monkeypatch, [AUDIO_STREAM, COVER_ART])
+    print(f"Audio with cover art: {result}")
+    assert result["has_audio"] and not result["has_video"]
+    assert "width" not in result and "fps" not in result
+    assert result["audio_codec"] == "mp3" and result["sample_rate"] == 44100
+
+def test_cover_art_listed_first_is_skipped(monkeypatch):
+    result = probe_with(monkeypatch, [COVER_ART, VIDEO_STREAM, AUDIO_STREAM])
+    assert result["has_video"] and result["video_codec"] == "h264"
+    assert (result["width"], result["height"]) == (1280, 720)
+
+def test_video_only(monkeypatch):
+    result = probe_with(monkeypatch, [VIDEO_STREAM])
+    assert result["has_video"] and not result["has_audio"]
+    assert result["fps"] == 29.97 and result["duration"] == 12.5
+    assert "audio_codec" not in result
+
+def test_audio_only(monkeypatch):
+    result = probe_with(monkeypatch, [dict(AUDIO_STREAM, duration="3.0")], duration=None)
+    assert result["has_audio"] and not result["has_video"]
+    # Falls back to the stream duration when the container has none
+    assert result["duration"] == 3.0 and result["channels"] == 2
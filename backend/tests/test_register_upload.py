@@ -0,0 +1,50 @@
+import os
+import tempfile
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.db import Base, Media
+from app.models.storage import StorageArtifact
+
+# upload.py probes files with ffmpeg
+pytest.importorskip("ffmpeg")
+from app.api import upload
+
+def setup_upload(monkeypatch):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    storage = tempfile.mkdtemp()
+    monkeypatch.setattr(upload, "STORAGE_PATH", storage)
+    monkeypatch.setattr(upload, "validate_file", lambda path, max_size: ("audio", os.path.getsize(path)))
+    monkeypatch.setattr(upload, "get_analysis_key", lambda media_type: "key-1")
+    temp_path = os.path.join(storage, "temp_m1")
+    with open(temp_path, "wb") as f:
+        f.write(b"audio bytes")
+    return sessionmaker(bind=engine)(), storage, temp_path
+
+def test_failed_probe_removes_stored_file(monkeypatch):
+    db, storage, temp_path = setup_upload(monkeypatch)
+
+    def broken_probe(path, media_type):
+        raise RuntimeError("ffprobe failed")
+    monkeypatch.setattr(upload, "probe_media", broken_probe)
+
+    with pytest.raises(RuntimeError):
+        upload.register_upload(db, "m1", temp_path, "song.mp3", "hash-1")
+    print(f"Left in storage: {os.listdir(storage)}")
+    assert os.listdir(storage) == []
+    assert db.query(Media).count() == 0 and db.query(StorageArtifact).count() == 0
+
+def test_registered_upload_is_kept(monkeypatch):
+    db, storage, temp_path = setup_upload(monkeypatch)
+    monkeypatch.setattr(upload, "probe_media", lambda path, media_type: {"duration": 1.5})
+    monkeypatch.setattr(upload, "enqueue_job", lambda db, media_id, path, storage_dir: type("Job", (), {"id": "job-1"}))
+
+    result = upload.register_upload(db, "m1", temp_path, "song.mp3", "hash-1")
+    assert result["status"] == "processing"
+    assert os.listdir(storage) == ["m1.mp3"]
+    assert db.query(Media).one().duration == 1.5
+    print("✅ Stored file removed only when registration fails!")
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.db import Base, Media
+from app.services.embedding_index import EmbeddingIndex
+from app.utils.database import get_db
+
+# The search router imports image_service (CLIP)
+pytest.importorskip("torch")
+from app.api import search
+
+DIM = 32
+
+def unit(vector):
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+def make_client(monkeypatch):
+    """Search router over a temp database and index; every query embeds to the same direction"""
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}",
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    rng = np.random.default_rng(0)
+    target = unit(rng.standard_normal(DIM))
+    index = EmbeddingIndex(tempfile.mkdtemp())
+
+    db = Session()
+    # A long video whose keyframes all match best, then images of decreasing similarity
+    db.add(Media(id="video-1", filename="beach.mp4", media_type="video"))
+    keyframes = np.stack([unit(target + 0.05 * rng.standard_normal(DIM)) for _ in range(60)])
+    index.add("video-1", keyframes, timestamps=[float(t) for t in range(60)])
+    for i in range(6):
+        db.add(Media(id=f"image-{i}", filename=f"{i}.jpg", media_type="image"))
+        index.add(f"image-{i}", unit(target + (0.5 + i) * rng.standard_normal(DIM))[None, :])
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(search, "embedding_index", index)
+    monkeypatch.setattr(search, "embed_query", lambda q: target)
+    monkeypatch.setattr(search, "query_cache_stats", lambda: {"hits": 0, "misses": 0})
+
+    app = FastAPI()
+    app.include_router(search.router)
+
+    def override_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+    app.dependency_overrides[get_db] = override_db
+    return TestClient(app)
+
+def test_search_returns_k_media_despite_many_keyframes(monkeypatch):
+    client = make_client(monkeypatch)
+    # 60 keyframes of one video outrank every image; k * ROWS_PER_RESULT rows alone would only find the video
+    response = client.get("/search", params={"q": "a beach", "k": 4})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    print(f"Results: {[(r['media_id'], r['score']) for r in results]}")
+    assert len(results) == 4
+    assert results[0]["media_id"] == "video-1" and len(results[0]["timestamps"]) == search.MAX_TIMESTAMPS
+    print("✅ Search over-fetches past duplicate keyframes!")
+
+def test_search_media_type_filter_returns_k(monkeypatch):
+    client = make_client(monkeypatch)
+    results = client.get("/search", params={"q": "a beach", "k": 5, "media_type": "image"}).json()["results"]
+    assert [r["media_type"] for r in results] == ["image"] * 5
+    assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+
+    assert client.get("/search", params={"q": "a beach", "media_type": "audio"}).json()["results"] == []
+    assert client.get("/search", params={"q": " "}).status_code == 400
+    assert client.get("/search", params={"q": "a beach", "k": 0}).status_code == 400
+    print("✅ media_type filter is applied inside the index!")
+
+def test_search_similar_and_stats(monkeypatch):
+    client = make_client(monkeypatch)
+    results = client.get("/search/similar", params={"media_id": "video-1", "k": 3}).json()["results"]
+    assert len(results) == 3
+    assert "video-1" not in [r["media_id"] for r in results]
+
+    moment = client.get("/search/similar", params={"media_id": "video-1", "k": 2, "timestamp": 10}).json()
+    assert len(moment["results"]) == 2
+    assert client.get("/search/similar", params={"media_id": "missing"}).status_code == 404
+
+    stats = client.get("/search/stats").json()
+    print(f"Stats: {stats}")
+    assert stats["vectors"] == 66 and stats["query_cache"] == {"hits": 0, "misses": 0}
+    print("✅ Similar search and stats work!")
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
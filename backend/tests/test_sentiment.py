@@ -0,0 +1,94 @@
+import time
+from app.services.model_registry import registry
+from app.services import sentiment_service as ss
+
+class FakeSentimentPipeline:
+    """Positive when the text says 'good', counting pipeline calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, batch_size=1, truncation=False):
+        self.calls.append(len(texts))
+        return [
+            {"label": "POSITIVE", "score": 0.9} if "good" in text else {"label": "NEGATIVE", "score": 0.8}
+            for text in texts
+        ]
+
+def with_fake_pipeline(test):
+    fake = FakeSentimentPipeline()
+    original = registry.entries["sentiment"].loader
+    registry.unload("sentiment")
+    registry.register("sentiment", lambda: fake)
+    try:
+        test(fake)
+    finally:
+        registry.unload("sentiment")
+        registry.register("sentiment", original)
+
+def test_timeline_and_duration_weighting():
+    def run(fake):
+        segments = [
+            {"text": " This is good.", "start": 0.0, "end": 2.0},
+            {"text": " Terrible, just terrible.", "start": 2.0, "end": 10.0},
+            {"text": " ", "start": 10.0, "end": 11.0},
+            {"text": " A good ending.", "start": 11.0, "end": 13.0},
+        ]
+        result = ss.analyze_sentiment("", segments)
+        print(f"Sentiment: {result}")
+
+        assert [entry["label"] for entry in result["timeline"]] == ["positive", "negative", "positive"]
+        assert result["timeline"][1] == {"start": 2.0, "end": 10.0, "label": "negative", "score": 0.8}
+        # 4s positive (p=0.9) vs 8s negative (p=0.2): mean p = 0.433
+        assert result["label"] == "negative"
+        assert result["polarity"] == round(2 * (4 * 0.9 + 8 * 0.2) / 12 - 1, 3)
+        assert fake.calls == [3]
+
+    with_fake_pipeline(run)
+
+def test_text_without_segments_uses_windows():
+    def run(fake):
+        text = " ".join(["good"] * 250 + ["bad"] * 150)
+        result = ss.analyze_sentiment(text)
+        # 200 'good' words, then 50 'good' + 150 'bad' words (also contains 'good')
+        assert fake.calls == [2] and result["label"] == "positive"
+        assert result["timeline"] == []
+        assert ss.analyze_sentiment("   ")["label"] == "neutral"
+
+    with_fake_pipeline(run)
+
+def test_thousands_of_segments_are_batched():
+    def run(fake):
+        segments = [
+            {"text": " good" if i % 3 else " bad", "start": float(i), "end": i + 1.0}
+            for i in range(5000)
+        ]
+        started = time.perf_counter()
+        result = ss.analyze_sentiment("", segments)
+        elapsed = time.perf_counter() - started
+        print(f"5000 segments scored in {elapsed * 1000:.1f}ms with {len(fake.calls)} pipeline call(s)")
+        assert len(result["timeline"]) == 5000 and fake.calls == [5000]
+        assert result["label"] == "positive"
+
+    with_fake_pipeline(run)
+
+def test_failure_keeps_result_shape():
+    def run(fake):
+        scored = ss.analyze_sentiment("This is good.")
+        original = ss.score_texts
+        ss.score_texts = lambda texts: 1 / 0
+        try:
+            failed = ss.analyze_sentiment("This is good.")
+        finally:
+            ss.score_texts = original
+        assert failed == {"label": "unknown", "score": 0.0, "polarity": 0.0, "timeline": []}
+        assert set(failed) == set(scored)
+
+    with_fake_pipeline(run)
+
+if __name__ == "__main__":
+    test_timeline_and_duration_weighting()
+    test_text_without_segments_uses_windows()
+    test_thousands_of_segments_are_batched()
+    test_failure_keeps_result_shape()
+    print("✅ Segment-level sentiment works!")
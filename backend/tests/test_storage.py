@@ -0,0 +1,130 @@
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.db import Base, Media
+from app.models.ingest import UploadSession, UploadChunk
+from app.models.jobs import Job
+from app.models.storage import StorageArtifact
+from app.services import storage_service
+from app.services.storage_service import create_scratch, normalize_path, sweep
+from app.utils.file_lock import LeaderLock
+
+def new_session():
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'storage.db')}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+def write(path, data=b"x" * 100, age=0):
+    """Create a file, backdated by age seconds"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if age:
+        old = time.time() - age
+        os.utime(path, (old, old))
+    return path
+
+def test_sweep_adopts_uploads_and_deletes_only_owned_orphans():
+    db = new_session()
+    storage = tempfile.mkdtemp()
+    kept, gone = str(uuid4()), str(uuid4())
+    db.add(Media(id=kept, filename="kept.jpg", media_type="image"))
+    db.commit()
+
+    legacy_upload = write(os.path.join(storage, f"{kept}.jpg"), age=7200)
+    orphan_upload = write(os.path.join(storage, f"{gone}.mp4"), age=7200)
+    failed_temp = write(os.path.join(storage, f"temp_{gone}"), age=7200)
+    fresh_temp = write(os.path.join(storage, f"temp_{uuid4()}"))
+    stale_report = write(os.path.join(storage, "reports", f"{gone}_abc123.pdf"), age=7200)
+    legacy_report = write(os.path.join(storage, f"report_{kept}_20240101_120000.pdf"), age=7200)
+    # Not created by this backend: operator files, lock files, other components' dirs
+    operator_file = write(os.path.join(storage, "backup.tar"), age=7200)
+    operator_report = write(os.path.join(storage, "reports", "notes.txt"), age=7200)
+    lock_files = [write(os.path.join(storage, name), age=7200) for name in (".worker-pool.lock", ".storage-sweeper.lock")]
+    index_files = [write(os.path.join(storage, "index", "clip", name), age=7200) for name in (".lock", ".ivf-build.lock", "vectors.f32")]
+
+    stats = sweep(db, storage, min_age=3600)
+    print(f"Sweep: {stats}")
+    assert stats["adopted"] == 1 and stats["untracked"] == 4
+
+    assert os.path.exists(legacy_upload)
+    artifact = db.query(StorageArtifact).filter(StorageArtifact.path == normalize_path(legacy_upload)).one()
+    assert artifact.category == "media" and artifact.media_id == kept
+    for path in (orphan_upload, failed_temp, stale_report, legacy_report):
+        assert not os.path.exists(path)
+    # Too young to be an orphan (may be an upload in flight)
+    assert os.path.exists(fresh_temp)
+    for path in [operator_file, operator_report] + lock_files + index_files:
+        assert os.path.exists(path), path
+    print("✅ Sweep only deletes files it owns!")
+
+def test_sweep_expires_abandoned_staging():
+    db = new_session()
+    storage = tempfile.mkdtemp()
+    old = datetime.utcnow() - timedelta(seconds=storage_service.STAGING_TTL_SEC + 60)
+    stale_path = write(os.path.join(storage, "uploads", "stale.part"))
+    live_path = write(os.path.join(storage, "uploads", "live.part"))
+    db.add(UploadSession(id="stale", filename="a.mp4", total_size=100, staging_path=stale_path, updated_at=old))
+    db.add(UploadChunk(upload_id="stale", start=0, end=100))
+    db.add(UploadSession(id="live", filename="b.mp4", total_size=100, staging_path=live_path))
+    db.commit()
+
+    stats = sweep(db, storage)
+    assert stats["staging"] == 1
+    assert not os.path.exists(stale_path) and os.path.exists(live_path)
+    assert db.query(UploadSession).filter(UploadSession.id == "stale").one().status == "aborted"
+    assert db.query(UploadChunk).count() == 0
+    assert db.query(UploadSession).filter(UploadSession.id == "live").one().status == "active"
+
+def test_sweep_keeps_scratch_of_active_jobs():
+    db = new_session()
+    storage = tempfile.mkdtemp()
+    running, crashed = str(uuid4()), str(uuid4())
+    for media_id in (running, crashed):
+        db.add(Media(id=media_id, filename=f"{media_id}.mp4", media_type="video"))
+    db.add(Job(id="job-1", media_id=running, file_path="/a.mp4", storage_dir=storage, status="running"))
+    db.add(Job(id="job-2", media_id=crashed, file_path="/b.mp4", storage_dir=storage, status="failed"))
+    db.commit()
+
+    running_dir = create_scratch(db, storage, running, running)
+    crashed_dir = create_scratch(db, storage, crashed, crashed)
+    write(os.path.join(running_dir, "audio.f32"))
+    write(os.path.join(crashed_dir, "audio.f32"))
+
+    stats = sweep(db, storage, min_age=0)
+    assert stats["scratch"] == 1
+    assert os.path.isdir(running_dir) and not os.path.exists(crashed_dir)
+    assert db.query(StorageArtifact).filter(StorageArtifact.media_id == crashed).count() == 0
+    print("✅ Scratch of running jobs survives the sweep!")
+
+def test_only_the_leader_sweeps(monkeypatch):
+    storage = tempfile.mkdtemp()
+    lock_path = os.path.join(storage, ".storage-sweeper.lock")
+    owner, other = LeaderLock(lock_path), LeaderLock(lock_path)
+    assert owner.acquire()
+
+    sweeps = []
+    monkeypatch.setattr(storage_service, "sweep", lambda db: sweeps.append(db))
+
+    async def run_once(leader):
+        task = asyncio.create_task(storage_service.run_sweeper(0.01, leader))
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run_once(other))
+    assert sweeps == [] and other.file is None
+
+    owner.release()
+    asyncio.run(run_once(other))
+    assert sweeps and other.file is not None
+    other.release()
+
+if __name__ == "__main__":
+    test_sweep_adopts_uploads_and_deletes_only_owned_orphans()
+    test_sweep_expires_abandoned_staging()
+    test_sweep_keeps_scratch_of_active_jobs()
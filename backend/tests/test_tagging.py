@@ -0,0 +1,87 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+from app.services import tagging_service
+from app.services.tagging_service import LabelBank
+
+DIM = 512
+
+def fake_text_vector(text):
+    """Deterministic stand-in for CLIP's text tower"""
+    seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+
+class CountingEncoder:
+    def __init__(self):
+        self.encoded = 0
+
+    def __call__(self, texts):
+        self.encoded += len(texts)
+        return [fake_text_vector(text) for text in texts]
+
+def write_vocabulary(directory, labels):
+    path = os.path.join(directory, "tags.txt")
+    with open(path, "w") as f:
+        f.write("# test vocabulary\n" + "\n".join(labels) + "\n")
+    return path
+
+def test_zero_shot_scores_top_k():
+    directory = tempfile.mkdtemp()
+    labels = [f"tag{i}" for i in range(500)] + ["dog", "beach", "Dog"]
+    bank = LabelBank(write_vocabulary(directory, labels), cache_dir=directory, encoder=CountingEncoder())
+
+    image = fake_text_vector("a photo of dog") + 0.8 * fake_text_vector("a photo of beach")
+    tags = bank.score(np.stack([image, fake_text_vector("a photo of tag7")]), k=3, min_score=0)
+    print(f"Tags: {tags}")
+    assert [t["tag"] for t in tags[0][:2]] == ["dog", "beach"]
+    assert tags[1][0]["tag"] == "tag7"
+    assert tags[0][0]["score"] >= tags[0][1]["score"] >= tags[0][2]["score"]
+    assert len(bank.labels) == 502  # Case-insensitive duplicate dropped
+    print("✅ Zero-shot tagging works!")
+
+def test_label_bank_cached_until_vocabulary_changes():
+    directory = tempfile.mkdtemp()
+    path = write_vocabulary(directory, ["cat", "dog"])
+    first = CountingEncoder()
+    LabelBank(path, cache_dir=directory, encoder=first).load()
+    assert first.encoded == 2
+
+    # Another process (or a restart) reuses the bank from disk
+    second = CountingEncoder()
+    bank = LabelBank(path, cache_dir=directory, encoder=second)
+    bank.load()
+    assert second.encoded == 0
+
+    # A different model gets its own bank
+    other_model = CountingEncoder()
+    LabelBank(path, model_name="other-clip", cache_dir=directory, encoder=other_model).load()
+    assert other_model.encoded == 2
+
+    # Editing the vocabulary re-encodes it
+    write_vocabulary(directory, ["cat", "dog", "bird"])
+    os.utime(path, ns=(0, 0))
+    labels, matrix = bank.load()
+    assert labels == ["cat", "dog", "bird"] and matrix.shape == (3, DIM)
+    assert second.encoded == 3
+    print("✅ Label bank caching works!")
+
+def test_video_tags_from_keyframes():
+    directory = tempfile.mkdtemp()
+    original = tagging_service.label_bank
+    tagging_service.label_bank = LabelBank(write_vocabulary(directory, ["cat", "dog", "car"]),
+                                           cache_dir=directory, encoder=CountingEncoder())
+    try:
+        frames = [fake_text_vector("a photo of dog"), fake_text_vector("a photo of dog"), fake_text_vector("a photo of car")]
+        result = tagging_service.tag_video(frames, k=2)
+    finally:
+        tagging_service.label_bank = original
+
+    assert [frame[0]["tag"] for frame in result["frames"]] == ["dog", "dog", "car"]
+    assert result["tags"][0]["tag"] == "dog"
+    print("✅ Video tagging works!")
+
+if __name__ == "__main__":
+    test_zero_shot_scores_top_k()
+    test_label_bank_cached_until_vocabulary_changes()
+    test_video_tags_from_keyframes()
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("ffmpeg")
+from app.services import audio_service
+from app.utils.audio import SAMPLE_RATE
+
+FRAME = SAMPLE_RATE // 100  # 10 ms
+
+def speech_bursts(seconds=80, talk=2.0, pause=1.0):
+    """Noise 'utterances' of talk seconds separated by pauses of silence"""
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    t = 0.5
+    while t + talk < seconds:
+        start, end = int(t * SAMPLE_RATE), int((t + talk) * SAMPLE_RATE)
+        audio[start:end] = rng.normal(0, 0.3, end - start)
+        t += talk + pause
+    return audio
+
+class FakeWhisper:
+    """One segment per utterance in the audio it is given, timestamps relative to it"""
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, verbose=False, initial_prompt=None):
+        self.calls.append((len(audio) / SAMPLE_RATE, initial_prompt))
+        loud = np.abs(audio[:len(audio) // FRAME * FRAME]).reshape(-1, FRAME).max(axis=1) > 0.01
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], loud.astype(int), [0]])))
+        segments = [
+            {"text": " word", "start": round(start * 0.01, 2), "end": round(end * 0.01, 2)}
+            for start, end in zip(edges[::2], edges[1::2])
+        ]
+        return {"text": "".join(seg["text"] for seg in segments), "segments": segments, "language": "en"}
+
+def assert_same_boundaries(result, expected):
+    """Same segments, timestamps equal up to the fake model's 10 ms frames"""
+    found = np.array([(seg["start"], seg["end"]) for seg in result["segments"]])
+    wanted = np.array([(seg["start"], seg["end"]) for seg in expected["segments"]])
+    assert found.shape == wanted.shape
+    assert np.allclose(found, wanted, atol=0.02)
+
+def transcribe(monkeypatch, watched):
+    model = FakeWhisper()
+    monkeypatch.setattr(audio_service, "get_whisper_model", lambda: model)
+    streamed = []
+    result = audio_service.transcribe_samples(speech_bursts(), streamed.extend, watched)
+    return result, streamed, model.calls
+
+def test_unwatched_transcription_is_one_pass(monkeypatch):
+    result, streamed, calls = transcribe(monkeypatch, lambda: False)
+    # Nobody is connected: one Whisper pass, segments still reported (and stored) once
+    assert len(calls) == 1 and calls[0][1] is None
+    assert streamed == result["segments"] and len(streamed) == 26
+
+def test_windowed_boundaries_match_one_pass(monkeypatch):
+    one_pass, _, _ = transcribe(monkeypatch, lambda: False)
+    windowed, streamed, calls = transcribe(monkeypatch, lambda: True)
+    print(f"Windows: {[round(c[0], 1) for c in calls]}")
+    assert len(calls) > 1 and all(length <= audio_service.STREAM_WINDOW_SEC * 1.3 for length, _ in calls)
+    # Windows are cut in pauses, so no utterance is split and boundaries agree
+    assert_same_boundaries(windowed, one_pass)
+    assert windowed["transcript"] == one_pass["transcript"]
+    assert streamed == windowed["segments"]
+    print("✅ Windowed and one-pass transcripts have the same boundaries!")
+
+def test_windowing_stops_when_client_leaves(monkeypatch):
+    answers = iter([True, False])
+    one_pass, _, _ = transcribe(monkeypatch, lambda: False)
+    result, _, calls = transcribe(monkeypatch, lambda: next(answers))
+    # One window while the client watched, then the rest in one prompted pass
+    assert len(calls) == 2 and calls[1][1]
+    assert_same_boundaries(result, one_pass)
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,109 @@
+import hashlib
+import io
+import os
+import tempfile
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.testclient import TestClient
+from app.utils.upload_stream import (
+    UploadSizeLimitMiddleware, copy_stream, merge_ranges, missing_ranges, too_large_message
+)
+
+def test_copy_stream_hashes_and_counts():
+    payload = os.urandom(3 * 1024 + 17)
+    dest = os.path.join(tempfile.mkdtemp(), "upload.bin")
+
+    size, digest = copy_stream(io.BytesIO(payload), dest, max_size=1024 * 1024, chunk_size=1024)
+
+    assert size == len(payload)
+    assert digest == hashlib.sha256(payload).hexdigest()
+    with open(dest, "rb") as f:
+        assert f.read() == payload
+    print("✅ Streamed copy matches source!")
+
+def test_copy_stream_rejects_oversized_early():
+    class CountingReader(io.BytesIO):
+        reads = 0
+
+        def read(self, size=-1):
+            CountingReader.reads += 1
+            return super().read(size)
+
+    source = CountingReader(b"x" * 10 * 1024)
+    dest = os.path.join(tempfile.mkdtemp(), "upload.bin")
+
+    try:
+        copy_stream(source, dest, max_size=2 * 1024, chunk_size=1024)
+        assert False, "Expected ValueError"
+    except ValueError as e:
+        print(f"Rejected: {e}")
+
+    # Stops right after crossing the limit instead of reading the whole body
+    assert CountingReader.reads == 3
+    assert not os.path.exists(dest)
+    print("✅ Oversized upload rejected early!")
+
+def test_middleware_rejects_before_reading_body():
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, limits={"/upload": 1024}, max_file_size=1000)
+    bodies = []
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        bodies.append(await request.body())
+        return {"size": len(bodies[-1])}
+
+    @app.post("/other")
+    async def other(request: Request):
+        return {"size": len(await request.body())}
+
+    client = TestClient(app)
+    assert client.post("/upload", content=b"x" * 1000).json() == {"size": 1000}
+    assert client.post("/other", content=b"x" * 4096).status_code == 200
+
+    # Declared too large: refused before the endpoint runs
+    response = client.post("/upload", content=b"x" * 4096)
+    # The message reports the per-file limit, not the body limit with multipart overhead
+    assert response.status_code == 413 and response.json()["detail"] == too_large_message(1000)
+
+    # No Content-Length (chunked): cut off once the received bytes pass the limit
+    def chunks():
+        for _ in range(8):
+            yield b"x" * 512
+    response = client.post("/upload", content=chunks())
+    assert response.status_code == 413
+    assert len(bodies) == 1
+    print("✅ Oversized request bodies rejected with 413!")
+
+def test_rejection_carries_cors_headers():
+    app = FastAPI()
+    # Same order as main.py: the size limit is added first so CORS wraps it
+    app.add_middleware(UploadSizeLimitMiddleware, limits={"/upload": 1024})
+    app.add_middleware(CORSMiddleware, allow_origins=["http://localhost:5173"],
+                       allow_methods=["*"], allow_headers=["*"])
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        return {"size": len(await request.body())}
+
+    client = TestClient(app)
+    response = client.post("/upload", content=b"x" * 4096, headers={"Origin": "http://localhost:5173"})
+    # Without CORS headers the browser hides the 413 from the frontend
+    assert response.status_code == 413
+    assert response.headers["access-control-allow-origin"] == "http://localhost:5173"
+    print("✅ 413 responses are readable cross-origin!")
+
+def test_range_tracking():
+    # Parallel chunks can arrive out of order and overlap on retry
+    received = [(8, 12), (0, 4), (4, 6), (10, 16)]
+
+    assert merge_ranges(received) == [(0, 6), (8, 16)]
+    assert missing_ranges(received, 20) == [(6, 8), (16, 20)]
+    assert missing_ranges(received + [(6, 8), (16, 20)], 20) == []
+    print("✅ Range tracking works!")
+
+if __name__ == "__main__":
+    test_copy_stream_hashes_and_counts()
+    test_copy_stream_rejects_oversized_early()
+    test_middleware_rejects_before_reading_body()
+    test_range_tracking()
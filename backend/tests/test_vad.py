@@ -0,0 +1,55 @@
+import numpy as np
+from app.utils.audio import SAMPLE_RATE, detect_speech, join_speech, to_original_time
+
+rng = np.random.default_rng(0)
+
+def seconds(n):
+    return np.arange(int(n * SAMPLE_RATE)) / SAMPLE_RATE
+
+def room_noise(n):
+    return rng.normal(0, 0.001, int(n * SAMPLE_RATE))
+
+def voice(n, pitch=140):
+    """Harmonic 'vowels' switched on and off at a syllable rate of 4 Hz"""
+    t = seconds(n)
+    harmonics = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(3, 12))
+    syllables = (np.sin(2 * np.pi * 4 * t) > 0).astype(float)
+    return 0.2 * harmonics * syllables + room_noise(n)
+
+def music(n):
+    """A sustained chord"""
+    t = seconds(n)
+    return 0.1 * sum(np.sin(2 * np.pi * f * t) for f in (440, 554, 659)) + room_noise(n)
+
+def test_finds_speech_between_silence_and_music():
+    audio = np.concatenate([room_noise(5), voice(4), music(6), room_noise(3), voice(2)]).astype(np.float32)
+    speech = detect_speech(audio)
+    print(f"Speech: {speech}")
+
+    assert len(speech["intervals"]) == 2
+    (s1, e1), (s2, e2) = speech["intervals"]
+    assert 4.5 <= s1 <= 5.1 and 8.8 <= e1 <= 9.8
+    assert 17.8 <= s2 <= 18.1 and e2 == 20.0
+    assert 0.25 <= speech["speech_ratio"] <= 0.4
+    assert speech["duration"] == 20.0
+
+def test_no_speech():
+    audio = np.concatenate([room_noise(3), music(5), rng.normal(0, 0.05, 3 * SAMPLE_RATE)]).astype(np.float32)
+    speech = detect_speech(audio)
+    print(f"Silence/music/noise: {speech}")
+    assert speech["intervals"] == [] and speech["speech_ratio"] == 0.0
+
+def test_joined_speech_maps_back():
+    audio = np.zeros(20 * SAMPLE_RATE, dtype=np.float32)
+    joined, timeline = join_speech(audio, [[2.0, 4.0], [10.0, 11.5]])
+    # 2s + 0.3s gap + 1.5s
+    assert len(joined) == int(3.8 * SAMPLE_RATE)
+    assert to_original_time(1.0, timeline) == 3.0
+    assert to_original_time(2.1, timeline) == 4.0  # inside the gap
+    assert abs(to_original_time(3.0, timeline) - 10.7) < 1e-9
+
+if __name__ == "__main__":
+    test_finds_speech_between_silence_and_music()
+    test_no_speech()
+    test_joined_speech_maps_back()
+    print("✅ Voice activity detection works!")